@@ -0,0 +1,113 @@
+"""
+Microbenchmark for building error objects out of failed bulk results
+
+Compares the previous implementation, which formatted every field name per error and
+serialized payloads with json.dumps, with the current one, with and without orjson
+
+    python -m benchmarks.error_objects [--rows 300000]
+"""
+
+import argparse
+import json
+import time
+
+from kicksaw_integration_app_client import KicksawSalesforce, SFBulkType
+from kicksaw_integration_app_client.utils import dumps, orjson
+
+
+def legacy_error_objects(results, object_name, operation, upsert_key):
+    for payload, record in results:
+        if record["success"]:
+            continue
+        for error in record["errors"]:
+            yield {
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}": KicksawSalesforce.execution_object_id,
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OPERATION}": operation,
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.SALESFORCE_OBJECT}": object_name,
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE}": error[
+                    "statusCode"
+                ],
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_MESSAGE}": error[
+                    "message"
+                ],
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY}": upsert_key,
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}": payload.get(
+                    upsert_key
+                ),
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}": json.dumps(
+                    payload
+                ),
+            }
+
+
+def make_results(rows: int):
+    """
+    A load where every third row failed
+    """
+    data = [
+        {
+            "External_Id__c": f"EXT-{index:08d}",
+            "Name": f"Account {index}, Inc",
+            "NumberOfEmployees": index % 5000,
+            "Active__c": index % 2 == 0,
+            "Description": "Imported from the ERP " * 4,
+            "ParentId": None,
+        }
+        for index in range(rows)
+    ]
+    failure = {
+        "success": False,
+        "errors": [{"statusCode": "FIELD_INTEGRITY_EXCEPTION", "message": "Bad"}],
+    }
+    success = {"success": True, "errors": []}
+    response = [failure if index % 3 == 0 else success for index in range(rows)]
+    return data, response
+
+
+def measure(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=300_000)
+    args = parser.parse_args()
+
+    KicksawSalesforce.NAMESPACE = "kicksaw__"
+    KicksawSalesforce.execution_object_id = "a0B000000000001AAA"
+    data, response = make_results(args.rows)
+    bulk_type = SFBulkType("Account", "", {}, None)
+
+    def legacy():
+        for _ in legacy_error_objects(
+            zip(data, response), "Account", "upsert", "External_Id__c"
+        ):
+            pass
+
+    def current():
+        for _ in bulk_type._iter_error_objects(
+            zip(data, response), "upsert", "External_Id__c"
+        ):
+            pass
+
+    timings = {"legacy": measure(legacy)}
+    KicksawSalesforce._serialize = staticmethod(json.dumps)
+    timings["precomputed fields, json"] = measure(current)
+    if orjson is not None:
+        KicksawSalesforce._serialize = staticmethod(dumps)
+        timings["precomputed fields, orjson"] = measure(current)
+
+    errors = len(range(0, args.rows, 3))
+    baseline = timings["legacy"]
+    print(f"{errors} error objects out of {args.rows} rows")
+    for name, seconds in timings.items():
+        print(
+            f"{name:<28} {seconds:7.3f}s  {errors / seconds:>10,.0f} errors/s"
+            f"  {baseline / seconds:4.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
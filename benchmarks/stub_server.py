@@ -0,0 +1,515 @@
+"""
+A local stand-in for the Salesforce endpoints the client uses, for benchmarking
+without an org: Bulk 1.0 and Bulk 2.0 ingest jobs, Bulk 2.0 query jobs, sObject
+and Composite writes
+
+Every response can be delayed to simulate latency, a share of the rows of bulk jobs
+fails, and Bulk 2.0 queries return generated rows
+
+    python -m benchmarks.stub_server [--port 8000] [--latency 0.05] [--failure-rate 0.1]
+
+Settings can also be changed while the server runs, with a POST of the settings
+as JSON to /stub/settings
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# objects of the integration app, whose rows never fail
+APP_OBJECTS = ("IntegrationError__c", "IntegrationLog__c", "IntegrationExecution__c")
+
+NULL_VALUE = "#N/A"
+
+
+class Settings:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        rows_per_second: float = None,
+        query_rows: int = 100000,
+    ):
+        # seconds every response is delayed by
+        self.latency = latency
+        # share of the rows of bulk jobs on other than the app's objects that fail
+        self.failure_rate = failure_rate
+        # how fast bulk jobs are processed, None to complete them right away
+        self.rows_per_second = rows_per_second
+        # rows of every Bulk 2.0 query job
+        self.query_rows = query_rows
+
+    def update(self, values: dict):
+        for name, value in values.items():
+            assert hasattr(self, name), f"Unknown setting {name}"
+            setattr(self, name, value)
+
+
+def fails(index: int, failure_rate: float) -> bool:
+    """
+    Whether the row at index fails, spreading failures evenly over the rows
+    """
+    return int((index + 1) * failure_rate) > int(index * failure_rate)
+
+
+class StubSalesforce:
+    """
+    What the stub keeps of the jobs it ran: their rows' outcomes, not the rows
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.jobs = dict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}{next(self._ids):015d}"
+
+    def failure_rate(self, object_name: str) -> float:
+        if object_name.endswith(APP_OBJECTS):
+            return 0.0
+        return self.settings.failure_rate
+
+    def state(self, job: dict, rows: int, done_state: str, waiting_state: str) -> str:
+        rate = self.settings.rows_per_second
+        if rate and time.monotonic() < job["started"] + rows / rate:
+            return waiting_state
+        return done_state
+
+    # Bulk 1.0
+
+    def create_bulk_job(self, body: dict) -> dict:
+        job = {
+            "id": self.new_id("750"),
+            "object": body["object"],
+            "operation": body["operation"],
+            "state": "Open",
+            "batches": dict(),
+            "rows": 0,
+            "started": time.monotonic(),
+        }
+        self.jobs[job["id"]] = job
+        return _public(job)
+
+    def add_batch(self, job_id: str, records: list) -> dict:
+        job = self.jobs[job_id]
+        failure_rate = self.failure_rate(job["object"])
+        with self._lock:
+            offset = job["rows"]
+            job["rows"] += len(records)
+        batch = {
+            "id": self.new_id("751"),
+            "jobId": job_id,
+            "size": len(records),
+            "failed": [
+                fails(offset + index, failure_rate) for index in range(len(records))
+            ],
+            "started": time.monotonic(),
+        }
+        job["batches"][batch["id"]] = batch
+        return self.batch_info(batch)
+
+    def batch_info(self, batch: dict) -> dict:
+        state = self.state(batch, batch["size"], "Completed", "InProgress")
+        return {
+            "id": batch["id"],
+            "jobId": batch["jobId"],
+            "state": state,
+            "numberRecordsProcessed": batch["size"] if state == "Completed" else 0,
+            "numberRecordsFailed": sum(batch["failed"]),
+        }
+
+    def batch_results(self, job_id: str, batch_id: str) -> list:
+        failure = {
+            "success": False,
+            "created": False,
+            "id": None,
+            "errors": [
+                {
+                    "statusCode": "FIELD_CUSTOM_VALIDATION_EXCEPTION",
+                    "message": "Rejected by the stub",
+                    "fields": [],
+                }
+            ],
+        }
+        return [
+            failure
+            if failed
+            else {
+                "success": True,
+                "created": True,
+                "id": self.new_id("001"),
+                "errors": [],
+            }
+            for failed in self.jobs[job_id]["batches"][batch_id]["failed"]
+        ]
+
+    # Bulk 2.0
+
+    def create_ingest_job(self, body: dict) -> dict:
+        job = {
+            "id": self.new_id("750"),
+            "object": body["object"],
+            "operation": body["operation"],
+            "state": "Open",
+            "rows": 0,
+            "failed_rows": list(),
+            "header": None,
+            "started": time.monotonic(),
+        }
+        self.jobs[job["id"]] = job
+        return _public(job)
+
+    def upload(self, job_id: str, payload: bytes):
+        job = self.jobs[job_id]
+        failure_rate = self.failure_rate(job["object"])
+        reader = csv.reader(io.StringIO(payload.decode("utf-8")))
+        job["header"] = next(reader)
+        for index, row in enumerate(reader):
+            if fails(index, failure_rate):
+                job["failed_rows"].append(row)
+            job["rows"] += 1
+
+    def close_ingest_job(self, job_id: str) -> dict:
+        job = self.jobs[job_id]
+        job["state"] = "UploadComplete"
+        job["started"] = time.monotonic()
+        return _public(job)
+
+    def ingest_job_info(self, job_id: str) -> dict:
+        job = self.jobs[job_id]
+        state = self.state(job, job["rows"], "JobComplete", "InProgress")
+        return {
+            "id": job_id,
+            "object": job["object"],
+            "operation": job["operation"],
+            "state": state,
+            "numberRecordsProcessed": job["rows"] if state == "JobComplete" else 0,
+            "numberRecordsFailed": len(job["failed_rows"]),
+        }
+
+    def failed_results(self, job_id: str) -> bytes:
+        job = self.jobs[job_id]
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(["sf__Id", "sf__Error", *job["header"]])
+        for row in job["failed_rows"]:
+            writer.writerow(
+                [
+                    "",
+                    "FIELD_CUSTOM_VALIDATION_EXCEPTION:Rejected by the stub:--",
+                    *row,
+                ]
+            )
+        return output.getvalue().encode("utf-8")
+
+    def create_query_job(self, body: dict) -> dict:
+        job = {
+            "id": self.new_id("750"),
+            "query": body["query"],
+            "rows": self.settings.query_rows,
+            "started": time.monotonic(),
+        }
+        self.jobs[job["id"]] = job
+        return {
+            "id": job["id"],
+            "operation": body["operation"],
+            "state": "UploadComplete",
+        }
+
+    def query_job_info(self, job_id: str) -> dict:
+        job = self.jobs[job_id]
+        state = self.state(job, job["rows"], "JobComplete", "InProgress")
+        return {
+            "id": job_id,
+            "state": state,
+            "numberRecordsProcessed": job["rows"] if state == "JobComplete" else 0,
+        }
+
+    def results_page(self, job_id: str, locator: str, max_records: int):
+        """
+        A page of generated rows, quoted like Salesforce quotes them,
+        and the locator of the next page
+        """
+        rows = self.jobs[job_id]["rows"]
+        start = int(locator or 0)
+        stop = min(start + max_records, rows)
+        lines = ['"Id","Name","External_Id__c","Description"\n']
+        for index in range(start, stop):
+            # every tenth description spans lines and holds quotes and commas
+            description = (
+                'A "quoted",\nmulti-line description'
+                if index % 10 == 0
+                else "Imported from the ERP"
+            )
+            lines.append(
+                f'"001{index:015d}","Account {index}","EXT-{index:08d}","{description.replace(chr(34), chr(34) * 2)}"\n'
+            )
+        return "".join(lines).encode("utf-8"), str(stop) if stop < rows else "null"
+
+
+def _public(job: dict) -> dict:
+    return {"id": job["id"], "object": job["object"], "state": job["state"]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, which Nagle's algorithm would delay
+    disable_nagle_algorithm = True
+
+    # set on the handler class by serve
+    salesforce: StubSalesforce = None
+
+    ROUTES = [
+        ("POST", r"/stub/settings", "settings"),
+        ("POST", r"/services/async/[^/]+/job", "create_bulk_job"),
+        ("POST", r"/services/async/[^/]+/job/(\w+)", "close_bulk_job"),
+        ("POST", r"/services/async/[^/]+/job/(\w+)/batch", "add_batch"),
+        ("GET", r"/services/async/[^/]+/job/(\w+)/batch", "batch_list"),
+        ("GET", r"/services/async/[^/]+/job/(\w+)/batch/(\w+)", "batch_info"),
+        ("GET", r"/services/async/[^/]+/job/(\w+)/batch/(\w+)/result", "batch_results"),
+        ("POST", r"/services/data/[^/]+/jobs/ingest", "create_ingest_job"),
+        ("PUT", r"/services/data/[^/]+/jobs/ingest/(\w+)/batches", "upload"),
+        ("PATCH", r"/services/data/[^/]+/jobs/ingest/(\w+)", "close_ingest_job"),
+        ("GET", r"/services/data/[^/]+/jobs/ingest", "ingest_job_list"),
+        ("GET", r"/services/data/[^/]+/jobs/ingest/(\w+)", "ingest_job_info"),
+        ("GET", r"/services/data/[^/]+/jobs/ingest/(\w+)/failedResults/?", "failed"),
+        ("POST", r"/services/data/[^/]+/jobs/query", "create_query_job"),
+        ("GET", r"/services/data/[^/]+/jobs/query", "query_job_list"),
+        ("GET", r"/services/data/[^/]+/jobs/query/(\w+)", "query_job_info"),
+        ("GET", r"/services/data/[^/]+/jobs/query/(\w+)/results", "results"),
+        ("POST", r"/services/data/[^/]+/composite", "composite"),
+        ("POST", r"/services/data/[^/]+/composite/sobjects", "composite_sobjects"),
+        ("GET", r"/services/data/[^/]+/query/?", "query"),
+        ("POST", r"/services/data/[^/]+/sobjects/(\w+)/?", "create_record"),
+        ("PATCH", r"/services/data/[^/]+/sobjects/(\w+)/(\w+)", "update_record"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        self.query_params = {
+            name: values[0] for name, values in parse_qs(url.query).items()
+        }
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        time.sleep(self.salesforce.settings.latency)
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                getattr(self, f"_{name}")(*match.groups())
+                return
+        self._send(404, [{"errorCode": "NOT_FOUND", "message": self.path}])
+
+    def _json(self):
+        return json.loads(self.body)
+
+    def _send(
+        self, status: int, body=None, content_type="application/json", headers=None
+    ):
+        if body is None:
+            data = b""
+        elif isinstance(body, bytes):
+            data = body
+        else:
+            data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _settings(self):
+        self.salesforce.settings.update(self._json())
+        self._send(200, vars(self.salesforce.settings))
+
+    def _create_bulk_job(self):
+        self._send(201, self.salesforce.create_bulk_job(self._json()))
+
+    def _close_bulk_job(self, job_id):
+        job = self.salesforce.jobs[job_id]
+        job["state"] = "Closed"
+        self._send(200, _public(job))
+
+    def _add_batch(self, job_id):
+        self._send(201, self.salesforce.add_batch(job_id, self._json()))
+
+    def _batch_list(self, job_id):
+        batches = self.salesforce.jobs[job_id]["batches"].values()
+        self._send(
+            200, {"batchInfo": [self.salesforce.batch_info(batch) for batch in batches]}
+        )
+
+    def _batch_info(self, job_id, batch_id):
+        batch = self.salesforce.jobs[job_id]["batches"][batch_id]
+        self._send(200, self.salesforce.batch_info(batch))
+
+    def _batch_results(self, job_id, batch_id):
+        self._send(200, self.salesforce.batch_results(job_id, batch_id))
+
+    def _create_ingest_job(self):
+        self._send(200, self.salesforce.create_ingest_job(self._json()))
+
+    def _upload(self, job_id):
+        self.salesforce.upload(job_id, self.body)
+        self._send(201)
+
+    def _close_ingest_job(self, job_id):
+        self._send(200, self.salesforce.close_ingest_job(job_id))
+
+    def _ingest_job_list(self):
+        jobs = [
+            self.salesforce.ingest_job_info(job_id)
+            for job_id, job in list(self.salesforce.jobs.items())
+            if "failed_rows" in job
+        ]
+        self._send(200, {"done": True, "records": jobs})
+
+    def _ingest_job_info(self, job_id):
+        self._send(200, self.salesforce.ingest_job_info(job_id))
+
+    def _failed(self, job_id):
+        self._send(200, self.salesforce.failed_results(job_id), "text/csv")
+
+    def _create_query_job(self):
+        self._send(200, self.salesforce.create_query_job(self._json()))
+
+    def _query_job_list(self):
+        jobs = [
+            self.salesforce.query_job_info(job_id)
+            for job_id, job in list(self.salesforce.jobs.items())
+            if "query" in job
+        ]
+        self._send(200, {"done": True, "records": jobs})
+
+    def _query_job_info(self, job_id):
+        self._send(200, self.salesforce.query_job_info(job_id))
+
+    def _results(self, job_id):
+        page, locator = self.salesforce.results_page(
+            job_id,
+            self.query_params.get("locator"),
+            int(self.query_params.get("maxRecords", 10000)),
+        )
+        self._send(
+            200,
+            page,
+            "text/csv",
+            {
+                "Sforce-Locator": locator,
+                "Sforce-NumberOfRecords": str(page.count(b"\n")),
+            },
+        )
+
+    def _composite(self):
+        results = list()
+        for subrequest in self._json()["compositeRequest"]:
+            if subrequest["method"] == "GET":
+                status, body = 200, self._query_result()
+            elif subrequest["method"] == "POST":
+                status, body = 201, self._created()
+            else:
+                status, body = 204, None
+            results.append(
+                {
+                    "body": body,
+                    "httpHeaders": {},
+                    "httpStatusCode": status,
+                    "referenceId": subrequest["referenceId"],
+                }
+            )
+        self._send(200, {"compositeResponse": results})
+
+    def _composite_sobjects(self):
+        self._send(200, [self._created() for _ in self._json()["records"]])
+
+    def _query(self):
+        self._send(200, self._query_result())
+
+    def _create_record(self, object_name):
+        self._send(201, self._created())
+
+    def _update_record(self, object_name, record_id):
+        self._send(204)
+
+    def _created(self) -> dict:
+        return {"id": self.salesforce.new_id("a00"), "success": True, "errors": []}
+
+    def _query_result(self) -> dict:
+        record_id = self.salesforce.new_id("a00")
+        return {
+            "totalSize": 1,
+            "done": True,
+            "records": [{"attributes": {}, "Id": record_id}],
+        }
+
+
+def serve(port: int = 0, settings: Settings = None) -> ThreadingHTTPServer:
+    """
+    Start serving on a background thread and return the server,
+    whose server_port is the port it listens on
+    """
+    handler = type(
+        "Handler",
+        (StubHandler,),
+        {"salesforce": StubSalesforce(settings or Settings())},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rows-per-second", type=float, default=None)
+    parser.add_argument("--query-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    server = serve(
+        args.port,
+        Settings(
+            args.latency, args.failure_rate, args.rows_per_second, args.query_rows
+        ),
+    )
+    # the suite waits for this line before sending requests
+    print(f"Listening on port {server.server_port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
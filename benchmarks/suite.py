@@ -0,0 +1,307 @@
+"""
+Benchmarks of the client's hot paths against the local stub server
+
+Runs bulk upserts with 0%, 10% and 100% of the rows failing, error object uploads,
+log storms and Bulk 2.0 queries, and reports their throughput, peak memory and the
+number of API calls they made
+
+    python -m benchmarks.suite [--rows 10000 100000] [--latency 0.01] [--case query]
+
+Peak memory is traced with tracemalloc, which slows allocation-heavy code down.
+--no-memory leaves it off for more accurate timings. --json writes the results to
+a file, e.g. to compare them with the ones of the last release
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from kicksaw_integration_app_client import (
+    Instrumentation,
+    KicksawSalesforce,
+    LocalArtifactStore,
+    LogLevel,
+)
+
+CONNECTION_OBJECT = {
+    "username": "benchmark",
+    "password": "benchmark",
+    "security_token": "benchmark",
+    "domain": "benchmark",
+}
+EXECUTION_ID = "a0B000000000001AAA"
+
+FAILURE_RATES = (0.0, 0.1, 1.0)
+
+
+class StubAdapter(HTTPAdapter):
+    """
+    Sends the client's https requests to the plain http port of the stub
+    """
+
+    def send(self, request, **kwargs):
+        request.url = "http://" + request.url[len("https://") :]
+        return super().send(request, **kwargs)
+
+
+class StubServer:
+    """
+    The stub server, in a process of its own so its work doesn't show up
+    in the client's timings and memory
+    """
+
+    def __init__(self, latency: float, rows_per_second: float = None):
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.stub_server",
+            "--port",
+            "0",
+            "--latency",
+            str(latency),
+        ]
+        if rows_per_second:
+            command += ["--rows-per-second", str(rows_per_second)]
+        self.process = subprocess.Popen(
+            command,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.port = int(self.process.stdout.readline().rsplit(" ", 1)[1])
+
+    def configure(self, **settings):
+        requests.post(
+            f"http://127.0.0.1:{self.port}/stub/settings", json=settings
+        ).raise_for_status()
+
+    def connect(self, **options) -> KicksawSalesforce:
+        """
+        A client of an existing execution on the stub, logged in without a login
+        request and with instrumentation counting its API calls
+        """
+        instance = f"127.0.0.1:{self.port}"
+        KicksawSalesforce.SESSION_CACHE.set(
+            tuple(sorted(CONNECTION_OBJECT.items())), ("benchmark", instance)
+        )
+        salesforce = KicksawSalesforce(
+            CONNECTION_OBJECT,
+            "",
+            {},
+            execution_object_id=EXECUTION_ID,
+            use_cache=True,
+            **options,
+        )
+        salesforce.session.mount(f"https://{instance}", StubAdapter())
+        salesforce.enable_instrumentation(Instrumentation(), summary=False)
+        return salesforce
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def make_records(rows: int):
+    return [
+        {
+            "External_Id__c": f"EXT-{index:08d}",
+            "Name": f"Account {index}, Inc",
+            "NumberOfEmployees": index % 5000,
+            "Active__c": index % 2 == 0,
+            "Description": "Imported from the ERP " * 4,
+            "ParentId": None,
+        }
+        for index in range(rows)
+    ]
+
+
+def bulk_upsert(server, rows, api, failure_rate):
+    server.configure(failure_rate=failure_rate)
+    salesforce = server.connect()
+    data = make_records(rows)
+    handler = salesforce.bulk if api == "bulk" else salesforce.bulk2
+
+    def run():
+        handler.Account.upsert(data, "External_Id__c")
+
+    return salesforce, run
+
+
+def error_objects(server, rows, aggregated):
+    salesforce = server.connect()
+    if aggregated:
+        salesforce.enable_error_aggregation(
+            LocalArtifactStore(tempfile.mkdtemp(prefix="kicksaw-benchmark-"))
+        )
+    data = make_records(rows)
+    failure = {
+        "success": False,
+        "created": False,
+        "id": None,
+        "errors": [{"statusCode": "FIELD_INTEGRITY_EXCEPTION", "message": "Bad"}],
+    }
+    response = [failure] * rows
+    bulk_type = salesforce.bulk.Account
+
+    def run():
+        bulk_type._process_errors(data, response, "upsert", "External_Id__c")
+
+    return salesforce, run
+
+
+def log_storm(server, rows, mode):
+    salesforce = server.connect(batch_writes=mode == "batched")
+    if mode == "buffered":
+        salesforce.enable_log_buffering()
+
+    def run():
+        for index in range(rows):
+            salesforce.log(f"Processed record {index}", LogLevel.INFO)
+        salesforce.flush_logs()
+        salesforce.flush_batch()
+
+    return salesforce, run
+
+
+def query(server, rows, output):
+    server.configure(query_rows=rows)
+    salesforce = server.connect()
+
+    def run():
+        results = salesforce.bulk_v2_query(
+            "Select Id, Name, External_Id__c, Description From Account",
+            output=output,
+        )
+        if output == "records":
+            count = sum(1 for _ in results)
+        else:
+            count = sum(len(page["Id"]) for page in results)
+        assert count == rows, f"{count} rows instead of {rows}"
+
+    return salesforce, run
+
+
+def cases(rows_counts, log_count):
+    """
+    (name, variant, rows, setup) of every benchmark,
+    where setup(server) returns the client and the function to time
+    """
+    outputs = ["records", "columns"]
+    with contextlib.suppress(ImportError):
+        import pyarrow  # noqa: F401
+
+        outputs.append("arrow")
+
+    for rows in rows_counts:
+        for api in ("bulk", "bulk2"):
+            for rate in FAILURE_RATES:
+                yield "bulk_upsert", f"{api}, {rate:.0%} failing", rows, (
+                    lambda server, rows=rows, api=api, rate=rate: bulk_upsert(
+                        server, rows, api, rate
+                    )
+                )
+        for aggregated in (False, True):
+            yield "error_objects", "aggregated" if aggregated else "one per row", rows, (
+                lambda server, rows=rows, aggregated=aggregated: error_objects(
+                    server, rows, aggregated
+                )
+            )
+        for output in outputs:
+            yield "query", output, rows, (
+                lambda server, rows=rows, output=output: query(server, rows, output)
+            )
+    for mode in ("unbuffered", "buffered", "batched"):
+        yield "log_storm", mode, log_count, (
+            lambda server, mode=mode: log_storm(server, log_count, mode)
+        )
+
+
+def measure(server, setup, trace_memory: bool) -> dict:
+    salesforce, run = setup(server)
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        run()
+        seconds = time.perf_counter() - start
+    finally:
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        tracemalloc.stop()
+    counters = salesforce._instrumentation.summary()["counters"]
+    return {
+        "seconds": seconds,
+        "peak_mib": peak / 2**20 if peak is not None else None,
+        "api_calls": counters.get("api_calls", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000],
+        help="row counts of the bulk, error and query cases, e.g. 10000 1000000",
+    )
+    parser.add_argument("--logs", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--rows-per-second",
+        type=float,
+        default=None,
+        help="how fast the stub processes bulk jobs, right away by default",
+    )
+    parser.add_argument(
+        "--case",
+        action="append",
+        choices=["bulk_upsert", "error_objects", "log_storm", "query"],
+        help="only run these cases",
+    )
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    KicksawSalesforce.NAMESPACE = ""
+    server = StubServer(args.latency, args.rows_per_second)
+    results = list()
+    try:
+        print(
+            f"{'case':<14} {'variant':<22} {'rows':>9} {'seconds':>8} "
+            f"{'rows/s':>11} {'peak MiB':>9} {'API calls':>10}"
+        )
+        for name, variant, rows, setup in cases(args.rows, args.logs):
+            if args.case and name not in args.case:
+                continue
+            result = measure(server, setup, not args.no_memory)
+            result.update(case=name, variant=variant, rows=rows)
+            results.append(result)
+            peak = (
+                f"{result['peak_mib']:9.1f}" if result["peak_mib"] is not None else "-"
+            )
+            print(
+                f"{name:<14} {variant:<22} {rows:>9,} {result['seconds']:8.3f} "
+                f"{rows / result['seconds']:>11,.0f} {peak:>9} {result['api_calls']:>10,}"
+            )
+    finally:
+        server.close()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"latency": args.latency, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
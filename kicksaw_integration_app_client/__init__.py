@@ -1,7 +1,25 @@
+import abc
+import atexit
+import concurrent.futures
+import functools
+import gzip
+import itertools
 import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
 
+from contextlib import contextmanager, nullcontext
 from enum import Enum
-from typing import TypedDict, Union
+from typing import Any, Callable, Dict, Iterator, List, Tuple, TypedDict, Union
+
+from simple_salesforce import Salesforce, SalesforceLogin
+from simple_salesforce.exceptions import SalesforceAuthenticationFailed
 
 from kicksaw_integration_utils.salesforce_client import (
     SfClient,
@@ -9,6 +27,52 @@ from kicksaw_integration_utils.salesforce_client import (
     SFBulkType as BaseSFBulkType,
 )
 
+from kicksaw_integration_app_client.artifacts import (
+    ArtifactStore,
+    LocalArtifactStore,
+    S3ArtifactStore,
+)
+from kicksaw_integration_app_client.bulk2 import (
+    SFBulk2Handler as BaseSFBulk2Handler,
+    SFBulk2Type as BaseSFBulk2Type,
+)
+from kicksaw_integration_app_client.cache import DescribeCache, TTLCache
+from kicksaw_integration_app_client.checkpoints import (
+    BulkCheckpoints,
+    CheckpointStore,
+    ExecutionPayloadStore,
+    LocalCheckpointStore,
+)
+from kicksaw_integration_app_client.composite import CompositeBatch
+from kicksaw_integration_app_client.governor import Governor, govern
+from kicksaw_integration_app_client.instrumentation import (
+    Instrumentation,
+    InstrumentationHook,
+    LoggingHook,
+)
+from kicksaw_integration_app_client.polling import BulkBatches, Bulk2Jobs, JobPoller
+from kicksaw_integration_app_client.purge import PurgeReport, purge_records
+from kicksaw_integration_app_client.spool import ErrorSpool
+from kicksaw_integration_app_client.preflight import (
+    BATCH_SIZE,
+    failed_result,
+    find_doomed_rows,
+)
+from kicksaw_integration_app_client.tables import (
+    TableRecords,
+    as_records,
+    iter_rows,
+    select,
+)
+from kicksaw_integration_app_client.utils import chunked, chunked_by_size, dumps
+
+logger = logging.getLogger(__name__)
+
+# ObjectPayload__c is a long text area of this many characters
+MAX_PAYLOAD_LENGTH = 131072
+# ends payloads cut short to fit
+TRUNCATION_MARKER = "...[truncated]"
+
 
 class ConnectionObject(TypedDict):
     username: str
@@ -17,78 +81,832 @@ class ConnectionObject(TypedDict):
     domain: str
 
 
+def salesforce_login(connection_object: ConnectionObject) -> Tuple[str, str]:
+    """
+    simple-salesforce's SOAP login with the config and retries of SfClient,
+    returning the session id and the instance
+    """
+    config = {
+        "username": connection_object["username"],
+        "password": connection_object["password"],
+        "security_token": connection_object["security_token"],
+    }
+    domain = connection_object.get("domain")
+    if domain and domain.lower() != "na":
+        config["domain"] = domain
+
+    max_login_attempts = 5
+    for login_attempts in range(1, max_login_attempts + 1):
+        try:
+            return SalesforceLogin(**config)
+        except SalesforceAuthenticationFailed as reason:
+            if (
+                reason.code != "SERVER_UNAVAILABLE"
+                or login_attempts == max_login_attempts
+            ):
+                raise reason
+            time.sleep(2**login_attempts)
+
+
 class LogLevel(Enum):
     ERROR = "ERROR"
     WARNING = "WARNING"
     INFO = "INFO"
     DEBUG = "DEBUG"
 
+    @staticmethod
+    def from_logging_level(levelno: int) -> "LogLevel":
+        """
+        Map a standard library logging level onto the closest LogLevel
+        """
+        if levelno >= logging.ERROR:
+            return LogLevel.ERROR
+        if levelno >= logging.WARNING:
+            return LogLevel.WARNING
+        if levelno >= logging.INFO:
+            return LogLevel.INFO
+        return LogLevel.DEBUG
+
+
+class LogBuffer:
+    """
+    Collects log records in memory and hands them off in one go once
+    the buffer holds max_size records or its oldest record is older
+    than max_age seconds
+
+    The age is only checked when a record is added, there's no timer, so a record
+    followed by a long bulk job waits for the next record or an explicit flush
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[List[dict]], None],
+        max_size: int = 200,
+        max_age: float = 30.0,
+    ):
+        assert max_size > 0, "max_size must be positive"
+        self._flush_callback = flush_callback
+        self.max_size = max_size
+        self.max_age = max_age
+        self._records = list()
+        self._oldest = None
+        self._lock = threading.Lock()
+        _log_buffers.add(self)
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, record: dict):
+        with self._lock:
+            if not self._records:
+                self._oldest = time.monotonic()
+            self._records.append(record)
+            full = len(self._records) >= self.max_size
+            stale = time.monotonic() - self._oldest >= self.max_age
+        if full or stale:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the records off, putting them back in front of the
+        buffer if that fails
+        """
+        with self._lock:
+            records, self._records = self._records, list()
+            oldest, self._oldest = self._oldest, None
+        if not records:
+            return
+        try:
+            self._flush_callback(records)
+        except Exception:
+            with self._lock:
+                self._records[:0] = records
+                self._oldest = oldest
+            raise
+
+
+# buffers still holding records when the interpreter exits get flushed
+_log_buffers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_log_buffers():
+    for log_buffer in list(_log_buffers):
+        try:
+            log_buffer.flush()
+        except Exception:
+            logger.exception("Lost %s buffered log records at exit", len(log_buffer))
+
+
+class IntegrationLogHandler(logging.Handler):
+    """
+    Routes standard library logging calls into KicksawSalesforce.log,
+    so they land in the same (optionally buffered) stream of log records
+    """
+
+    def __init__(self, salesforce: "KicksawSalesforce", level=logging.NOTSET):
+        super().__init__(level)
+        self.salesforce = salesforce
+        self._local = threading.local()
+
+    def emit(self, record: logging.LogRecord):
+        # the HTTP stack logs too, don't feed its messages back into Salesforce
+        if getattr(self._local, "emitting", False):
+            return
+        self._local.emitting = True
+        try:
+            self.salesforce.log(
+                self.format(record),
+                LogLevel.from_logging_level(record.levelno),
+                associated_entity=getattr(record, "associated_entity", None),
+            )
+        except Exception:
+            self.handleError(record)
+        finally:
+            self._local.emitting = False
+
+
+class BackgroundWorker:
+    """
+    Runs submitted calls on a thread pool and keeps track of them
+    until someone waits for their completion
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = list()
+        self._lock = threading.Lock()
+
+    def submit(self, function: Callable, *args, **kwargs):
+        future = self._executor.submit(function, *args, **kwargs)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def wait(self):
+        """
+        Block until every submitted call finished, re-raising the first failure
+        """
+        with self._lock:
+            futures, self._futures = self._futures, list()
+        concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self.wait()
+        self._executor.shutdown()
+
+
+def _timed(name: str) -> Callable:
+    """
+    Time every call of a method as a span, through the _span of its instance
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._span(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class BulkErrorReporter(abc.ABC):
+    """
+    Turns failed bulk results into IntegrationError__c records
+
+    Shared by the Bulk 1.0 and Bulk 2.0 types, which only differ
+    in how they insert the error objects
+    """
+
+    # upper bound on the number of error objects held in memory at once, None for none
+    ERROR_CHUNK_SIZE = 10000
+    # upper bound on the serialized size of a chunk, None if the API splits by size
+    ERROR_CHUNK_BYTES = None
+
+    @property
+    def _client(self):
+        """
+        Where the execution id and namespace come from: the client this type
+        was created by, or the class-level defaults when used standalone
+        """
+        return self.salesforce or KicksawSalesforce
+
+    def _flush_pending_writes(self):
+        """
+        Send batched writes first, error objects need the actual execution id
+        """
+        if self.salesforce:
+            self.salesforce.flush_batch()
+
+    def _span(self, name: str, **attributes):
+        """
+        Time a block in the client's instrumentation, if it has any
+        """
+        if not self.salesforce:
+            return nullcontext()
+        return self.salesforce._span(name, object=self.object_name, **attributes)
+
+    def _count(self, name: str, value: int = 1, **attributes):
+        if self.salesforce:
+            self.salesforce._count(name, value, object=self.object_name, **attributes)
+
+    def _bulk_job(self):
+        """
+        Hold a bulk job slot of the client's governor, if it has one
+        """
+        if not self.salesforce:
+            return nullcontext()
+        return self.salesforce._bulk_job()
+
+    def _report_errors(self, process_errors: Callable, *args):
+        """
+        Run process_errors right away, or on the client's background worker if it has one
+        """
+        error_worker = self.salesforce._error_worker if self.salesforce else None
+        if error_worker:
+            error_worker.submit(process_errors, *args)
+        else:
+            process_errors(*args)
+
+    def _checkpoint(self, api, operation, data, external_id_field):
+        """
+        The checkpoint of this operation, if the client keeps them
+        """
+        checkpoints = self.salesforce._bulk_checkpoints if self.salesforce else None
+        if checkpoints is None or operation in ("query", "queryAll"):
+            return None
+        return checkpoints.get(
+            api, self.object_name, operation, external_id_field, data
+        )
+
+    @_timed("preflight")
+    def _preflight(
+        self, operation, data, external_id_field, checkpoint, batch_size=BATCH_SIZE
+    ):
+        """
+        With preflight checks, push errors for the rows that would fail right away
+        and return the positions of the other rows along with the failed rows'
+        results. The positions are None when every row passed
+        """
+        if (
+            not self.salesforce
+            or not self.salesforce._preflight_checks
+            or operation not in ("insert", "update", "upsert")
+        ):
+            return None, dict()
+
+        describe = self.salesforce.describe_object(self.object_name)
+        doomed = find_doomed_rows(
+            data, operation, external_id_field, describe, batch_size
+        )
+        if not doomed:
+            return None, dict()
+
+        failed = sorted(doomed)
+        self._count("failed_rows", len(failed), operation="preflight")
+        failures = {index: failed_result(doomed[index]) for index in failed}
+        results = list(zip(iter_rows(data, failed), map(failures.get, failed)))
+        self._report_errors(
+            self._push_errors,
+            results,
+            "preflight",
+            external_id_field,
+            checkpoint.stage("preflight") if checkpoint else None,
+        )
+        return [index for index in range(len(data)) if index not in failures], failures
+
+    def _push_errors(self, results, operation, external_id_field, checkpoint=None):
+        """
+        Build error objects lazily from (payload, result) pairs and push them
+        in chunks as soon as a chunk fills, so memory use depends on the chunk size
+        rather than the number of failures
+
+        With a checkpoint, the chunks an earlier attempt pushed are skipped.
+        With an error spool, chunks are spooled and drained from there. They
+        only count as pushed once drained, as a retry may run without this
+        spool, e.g. on another Lambda container. Chunks an earlier attempt left
+        in this spool aren't spooled again
+        """
+        spool = self.salesforce._error_spool if self.salesforce else None
+        execution_id = self._client.execution_object_id
+        chunks = self._error_chunks(results, operation, external_id_field)
+        start = checkpoint.error_chunks if checkpoint is not None else 0
+        # once a drain fails, the rest is only spooled
+        drained = True
+        for index, chunk in enumerate(itertools.islice(chunks, start, None), start):
+            if spool is None:
+                self._insert_errors(chunk)
+            else:
+                tag = checkpoint.error_chunk_tag(index) if checkpoint else None
+                if tag is None or not spool.holds(execution_id, tag):
+                    spool.append(execution_id, chunk, tag)
+                if drained:
+                    self.salesforce.drain_errors()
+                    drained = not spool.segments(execution_id)
+            self._count("error_objects", len(chunk), operation=operation)
+            if checkpoint is not None and drained:
+                checkpoint.count_error_chunk()
+
+    def _error_chunks(self, results, operation, external_id_field):
+        """
+        Chunks of at most ERROR_CHUNK_SIZE error objects and ERROR_CHUNK_BYTES
+        of JSON, so every chunk fits into a single batch
+        """
+        error_objects = self._error_objects(results, operation, external_id_field)
+        if self.ERROR_CHUNK_BYTES is None:
+            return chunked(error_objects, self.ERROR_CHUNK_SIZE)
+
+        serialize = self._client._serialize
+        return chunked_by_size(
+            error_objects,
+            self.ERROR_CHUNK_SIZE,
+            self.ERROR_CHUNK_BYTES,
+            # the separator in the JSON array of the batch adds two more
+            lambda error_object: len(serialize(error_object)) + 2,
+        )
+
+    def _error_objects(self, results, operation, external_id_field):
+        """
+        Error objects to push, or their summaries when the client aggregates errors
+        """
+        error_objects = self._iter_error_objects(results, operation, external_id_field)
+        artifacts = getattr(self._client, "_error_artifacts", None)
+        if artifacts is None:
+            return error_objects
+        name = f"{self._client.execution_object_id}-{self.object_name}-{operation}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        return self._summarize_errors(
+            error_objects, artifacts, name, self._client._error_sample_size
+        )
+
+    def _summarize_errors(self, error_objects, artifacts, name, sample_size):
+        """
+        Collapse error objects sharing object, operation, error code and message
+        into one summary each, whose payload holds the number of errors, sample
+        upsert key values and where the artifact with every error object went
+        """
+        fields = _error_fields(self._client.NAMESPACE)
+        group_fields = fields[1:5]
+        upsert_key_value_field, object_payload_field = fields[6:8]
 
-class SFBulkType(BaseSFBulkType):
+        groups = dict()
+        with tempfile.NamedTemporaryFile(suffix=".jsonl.gz", delete=False) as file:
+            with gzip.open(file, "wt", encoding="utf-8") as artifact:
+                for error_object in error_objects:
+                    artifact.write(self._client._serialize(error_object) + "\n")
+                    key = tuple(error_object[field] for field in group_fields)
+                    if key not in groups:
+                        groups[key] = {
+                            "summary": dict(error_object),
+                            "count": 0,
+                            "sample_keys": list(),
+                        }
+                    group = groups[key]
+                    group["count"] += 1
+                    key_value = error_object[upsert_key_value_field]
+                    if (
+                        key_value is not None
+                        and len(group["sample_keys"]) < sample_size
+                    ):
+                        group["sample_keys"].append(key_value)
+
+        if not groups:
+            os.remove(file.name)
+            return []
+        uri = artifacts.save(file.name, name)
+
+        summaries = list()
+        for group in groups.values():
+            summary, sample_keys = group["summary"], group["sample_keys"]
+            summary[upsert_key_value_field] = sample_keys[0] if sample_keys else None
+            summary[object_payload_field] = json.dumps(
+                {"count": group["count"], "sample_keys": sample_keys, "artifact": uri}
+            )
+            summaries.append(summary)
+        return summaries
+
+    @abc.abstractmethod
+    def _insert_errors(self, error_objects: List[dict]):
+        """
+        Insert one chunk of error objects into Salesforce
+        """
+
+    def _iter_error_objects(self, results, operation, external_id_field):
+        """
+        Lazily yield one error object per error of every failed record
+        """
+        object_name = self.object_name
+        upsert_key = external_id_field
+        execution_object_id = self._client.execution_object_id
+        serialize = self._client._serialize
+        payload_fields = self._client._error_payload_fields
+        max_length = self._client._error_payload_length
+        (
+            execution_field,
+            operation_field,
+            object_field,
+            error_code_field,
+            error_message_field,
+            upsert_key_field,
+            upsert_key_value_field,
+            object_payload_field,
+        ) = _error_fields(self._client.NAMESPACE)
+
+        for payload, record in results:
+            if record["success"]:
+                continue
+            error_payload = payload
+            if payload_fields is not None:
+                error_payload = {
+                    field: payload[field]
+                    for field in payload_fields
+                    if field in payload
+                }
+            serialized = serialize(error_payload)
+            if len(serialized) > max_length:
+                serialized = (
+                    serialized[: max_length - len(TRUNCATION_MARKER)]
+                    + TRUNCATION_MARKER
+                )
+
+            for error in record["errors"]:
+                yield {
+                    execution_field: execution_object_id,
+                    operation_field: operation,
+                    object_field: object_name,
+                    error_code_field: error["statusCode"],
+                    error_message_field: error["message"],
+                    upsert_key_field: upsert_key,
+                    # TODO: Add test for bulk inserts where upsert key is None
+                    upsert_key_value_field: payload.get(upsert_key),
+                    object_payload_field: serialized,
+                }
+
+
+@functools.lru_cache(maxsize=None)
+def _error_fields(namespace: str) -> Tuple[str, ...]:
+    """
+    Namespaced field names of an error object, in the order the object lists them
+    """
+    return tuple(
+        f"{namespace}{field}"
+        for field in (
+            KicksawSalesforce.EXECUTION,
+            KicksawSalesforce.OPERATION,
+            KicksawSalesforce.SALESFORCE_OBJECT,
+            KicksawSalesforce.ERROR_CODE,
+            KicksawSalesforce.ERROR_MESSAGE,
+            KicksawSalesforce.UPSERT_KEY,
+            KicksawSalesforce.UPSERT_KEY_VALUE,
+            KicksawSalesforce.OBJECT_PAYLOAD,
+        )
+    )
+
+
+class SFBulkType(BulkErrorReporter, BaseSFBulkType):
+    # Bulk API 1.0 rejects batches of more than 10,000,000 characters
+    ERROR_CHUNK_BYTES = 10_000_000
+
+    def __init__(
+        self,
+        object_name,
+        bulk_url,
+        headers,
+        session,
+        salesforce=None,
+        job_checkpoint=None,
+    ):
+        self.salesforce = salesforce
+        # records the job this type runs, see _create_job
+        self._job_checkpoint = job_checkpoint
+        self._job_reattached = False
+        self._batches_added = 0
+        super().__init__(object_name, bulk_url, headers, session)
+
+    @_timed("bulk.operation")
     def _bulk_operation(self, operation, data, external_id_field=None, **kwargs):
-        response = super()._bulk_operation(
-            operation, data, external_id_field=external_id_field, **kwargs
+        """
+        data is a list of dicts, or a pandas DataFrame or Arrow table whose rows
+        are only turned into dicts one batch at a time
+        """
+        data = as_records(data)
+        # the data of a query is its SOQL
+        if operation not in ("query", "queryAll"):
+            self._count("rows", len(data), operation=operation)
+        self._flush_pending_writes()
+        checkpoint = self._checkpoint("bulk", operation, data, external_id_field)
+        valid, failures = self._preflight(
+            operation,
+            data,
+            external_id_field,
+            checkpoint,
+            kwargs.get("batch_size", BATCH_SIZE),
         )
-        self._process_errors(
+        if valid is None:
+            return self._checked_bulk_operation(
+                operation,
+                data,
+                checkpoint,
+                external_id_field=external_id_field,
+                **kwargs,
+            )
+
+        # stitch the results of the uploaded rows and the failed ones together
+        response = [failures.get(index) for index in range(len(data))]
+        if valid:
+            uploaded = self._checked_bulk_operation(
+                operation,
+                select(data, valid),
+                checkpoint,
+                external_id_field=external_id_field,
+                **kwargs,
+            )
+            for index, result in zip(valid, uploaded):
+                response[index] = result
+        return response
+
+    def _checked_bulk_operation(
+        self, operation, data, checkpoint, external_id_field=None, **kwargs
+    ):
+        """
+        Run the operation on the rows that passed preflight and report their errors
+        """
+        jobs = self.salesforce._count_bulk_jobs(len(data)) if self.salesforce else 1
+        if jobs > 1 and operation not in ("query", "queryAll"):
+            response = self._parallel_bulk_operation(
+                jobs,
+                operation,
+                data,
+                checkpoint,
+                external_id_field=external_id_field,
+                **kwargs,
+            )
+        elif checkpoint is not None:
+            (job_checkpoint,) = checkpoint.jobs(1)
+            response = self._run_job(
+                operation,
+                data,
+                job_checkpoint,
+                external_id_field=external_id_field,
+                **kwargs,
+            )
+        else:
+            with self._bulk_job():
+                response = super()._bulk_operation(
+                    operation, data, external_id_field=external_id_field, **kwargs
+                )
+        # query results are records, not row results
+        if operation in ("query", "queryAll"):
+            return response
+        self._report_errors(
+            self._process_errors,
             data,
             response,
             operation,
             external_id_field,
-            kwargs.get("batch_size", 10000),
+            checkpoint,
         )
         return response
 
-    def _process_errors(self, data, response, operation, external_id_field, batch_size):
+    def _parallel_bulk_operation(
+        self, jobs, operation, data, checkpoint=None, **kwargs
+    ):
         """
-        Parse the results of a bulk upload call and push error objects into Salesforce
+        Split data into contiguous slices, run one bulk job per slice concurrently
+        and stitch the results back together in the order of data
         """
-        object_name = self.object_name
-        upsert_key = external_id_field
+        slice_size = math.ceil(len(data) / jobs)
+        slices = [
+            data[start : start + slice_size]
+            for start in range(0, len(data), slice_size)
+        ]
+        job_checkpoints = (
+            checkpoint.jobs(len(slices)) if checkpoint else [None] * len(slices)
+        )
+
+        def run_job(data_slice, job_checkpoint):
+            return self._run_job(operation, data_slice, job_checkpoint, **kwargs)
 
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(slices)) as pool:
+            results = pool.map(run_job, slices, job_checkpoints)
+            return [record for result in results for record in result]
+
+    def _run_job(self, operation, data, job_checkpoint, **kwargs):
+        """
+        Run the plain operation on a type of its own, so retry counters and
+        checkpoints of concurrent jobs don't interfere. Errors are reported
+        by the caller, for all of its jobs at once
+        """
+        bulk_type = SFBulkType(
+            self.object_name,
+            self.bulk_url,
+            self.headers,
+            self.session,
+            salesforce=self.salesforce,
+            job_checkpoint=job_checkpoint,
+        )
+        with self._bulk_job():
+            return BaseSFBulkType._bulk_operation(bulk_type, operation, data, **kwargs)
+
+    @_timed("bulk.create_job")
+    def _create_job(self, operation, *args, **kwargs):
+        """
+        Reattach to the job of an earlier attempt, if the checkpoint has one
+        """
+        job_checkpoint = self._job_checkpoint
+        if job_checkpoint is None or operation in ("query", "queryAll"):
+            return super()._create_job(operation, *args, **kwargs)
+        # only once, a job created again after an error starts over
+        if job_checkpoint.id and not self._job_reattached:
+            self._job_reattached = True
+            return {"id": job_checkpoint.id}
+
+        job = super()._create_job(operation, *args, **kwargs)
+        job_checkpoint.start(job["id"])
+        self._job_reattached = True
+        self._batches_added = 0
+        return job
+
+    @_timed("bulk.add_batch")
+    def _add_batch(self, job_id, data, operation):
+        """
+        Batches are added in the order of the data, so the ones an earlier
+        attempt added are reused by their position
+        """
+        if isinstance(data, TableRecords):
+            data = list(data)
+        job_checkpoint = self._job_checkpoint
+        if job_checkpoint is None or operation in ("query", "queryAll"):
+            return super()._add_batch(job_id, data, operation)
+
+        index = self._batches_added
+        self._batches_added += 1
+        if index < len(job_checkpoint.batches):
+            return {"id": job_checkpoint.batches[index], "jobId": job_id}
+        batch = super()._add_batch(job_id, data, operation)
+        job_checkpoint.add_batch(batch["id"])
+        return batch
+
+    @_timed("bulk.close_job")
+    def _close_job(self, job_id):
+        job_checkpoint = self._job_checkpoint
+        if job_checkpoint is None or job_checkpoint.id != job_id:
+            return super()._close_job(job_id)
+        if job_checkpoint.closed:
+            return {"id": job_id}
+        response = super()._close_job(job_id)
+        job_checkpoint.close()
+        return response
+
+    @_timed("bulk.wait")
+    def _get_batch(self, job_id, batch_id):
+        """
+        Wait for the batch through the client's job poller,
+        so only finished batches are returned
+        """
+        if not self.salesforce:
+            return super()._get_batch(job_id, batch_id)
+        # at most simple-salesforce's default pause between checks
+        return self.salesforce._job_poller.wait("bulk", (job_id, batch_id), wait=5)
+
+    def _get_batch_results(self, job_id, batch_id, operation):
+        # results are only requested once the generator is consumed
+        with self._span("bulk.results"):
+            yield from super()._get_batch_results(job_id, batch_id, operation)
+
+    @_timed("errors.process")
+    def _process_errors(
+        self, data, response, operation, external_id_field, checkpoint=None
+    ):
+        """
+        Parse the results of a bulk upload call and push error objects into Salesforce
+        """
         assert len(data) == len(
             response
         ), f"{len(data)} (data) and {len(response)} (response) have different lengths!"
-        assert (
-            KicksawSalesforce.execution_object_id
-        ), f"KicksawSalesforce.execution_object_id is not set"
-
-        error_objects = list()
-        for payload, record in zip(data, response):
-            if not record["success"]:
-                for error in record["errors"]:
-                    error_object = {
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}": KicksawSalesforce.execution_object_id,
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OPERATION}": operation,
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.SALESFORCE_OBJECT}": object_name,
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE}": error[
-                            "statusCode"
-                        ],
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_MESSAGE}": error[
-                            "message"
-                        ],
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY}": upsert_key,
-                        # TODO: Add test for bulk inserts where upsert key is None
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}": payload.get(
-                            upsert_key
-                        ),
-                        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}": json.dumps(
-                            payload
-                        ),
-                    }
-                    error_objects.append(error_object)
+        assert self._client.execution_object_id, f"execution_object_id is not set"
+
+        # only failed rows are read back from data
+        failed = [
+            index for index, result in enumerate(response) if not result["success"]
+        ]
+        self._count("failed_rows", len(failed), operation=operation)
+        results = zip(iter_rows(data, failed), (response[index] for index in failed))
+        self._push_errors(results, operation, external_id_field, checkpoint)
 
+    @_timed("errors.insert")
+    def _insert_errors(self, error_objects):
         # Push error details to Salesforce
+        namespace = self._client.NAMESPACE
         error_client = BaseSFBulkType(
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}",
+            f"{namespace}{KicksawSalesforce.ERROR}",
             self.bulk_url,
             self.headers,
             self.session,
         )
-        if error_objects:
-            error_client.insert(error_objects, batch_size=batch_size)
+        # error chunks are sized to fit into one batch
+        with self._bulk_job():
+            error_client.insert(error_objects, batch_size=len(error_objects))
+
+
+class SFBulk2Type(BulkErrorReporter, BaseSFBulk2Type):
+    # every chunk of error objects becomes an ingest job of its own, which takes
+    # up to MAX_UPLOAD_SIZE of CSV, so chunks are only limited by size.
+    # Error objects are measured as JSON, which is longer than their CSV rows
+    ERROR_CHUNK_SIZE = None
+    ERROR_CHUNK_BYTES = BaseSFBulk2Type.MAX_UPLOAD_SIZE
+
+    def __init__(self, object_name, base_url, headers, session, salesforce=None):
+        self.salesforce = salesforce
+        super().__init__(object_name, base_url, headers, session)
+
+    @_timed("bulk2.operation")
+    def _ingest(self, operation, data, external_id_field=None, **kwargs):
+        data = as_records(data)
+        self._count("rows", len(data), operation=operation)
+        self._flush_pending_writes()
+        checkpoint = self._checkpoint("bulk2", operation, data, external_id_field)
+        valid, _ = self._preflight(operation, data, external_id_field, checkpoint)
+        if valid is not None:
+            if not valid:
+                return list()
+            data = select(data, valid)
+        if checkpoint is not None:
+            kwargs.update(
+                job_ids=checkpoint.job_ids,
+                checkpoint=lambda state: checkpoint.set_job_ids(state["job_ids"]),
+            )
+        # the jobs run one after another
+        with self._bulk_job():
+            jobs = super()._ingest(
+                operation, data, external_id_field=external_id_field, **kwargs
+            )
+        self._report_errors(
+            self._process_errors, jobs, operation, external_id_field, checkpoint
+        )
+        return jobs
+
+    @_timed("bulk2.create_job")
+    def _create_job(self, operation, external_id_field):
+        return super()._create_job(operation, external_id_field)
+
+    @_timed("bulk2.upload")
+    def _upload(self, job_id, payload):
+        super()._upload(job_id, payload)
+
+    @_timed("bulk2.close_job")
+    def _close_job(self, job_id):
+        super()._close_job(job_id)
+
+    @_timed("bulk2.wait")
+    def _wait_for_job(self, job_id, wait, size=None):
+        if not self.salesforce:
+            return super()._wait_for_job(job_id, wait, size)
+        return self.salesforce._job_poller.wait("bulk2", self._url(job_id), size, wait)
+
+    @_timed("errors.process")
+    def _process_errors(self, jobs, operation, external_id_field, checkpoint=None):
+        """
+        Stream the failed results of the given jobs into error objects in Salesforce
+        """
+        assert self._client.execution_object_id, f"execution_object_id is not set"
+        self._count(
+            "failed_rows",
+            sum(job.get("numberRecordsFailed") or 0 for job in jobs),
+            operation=operation,
+        )
+
+        results = (
+            (payload, {"success": False, "errors": [error]})
+            for job in jobs
+            if job.get("numberRecordsFailed")
+            for payload, error in self.iter_failed_results(job["id"])
+        )
+        self._push_errors(results, operation, external_id_field, checkpoint)
+
+    @_timed("errors.insert")
+    def _insert_errors(self, error_objects):
+        namespace = self._client.NAMESPACE
+        error_client = BaseSFBulk2Type(
+            f"{namespace}{KicksawSalesforce.ERROR}",
+            self.base_url,
+            self.headers,
+            self.session,
+        )
+        with self._bulk_job():
+            error_client.insert(error_objects)
 
 
 class SFBulkHandler(BaseSFBulkHandler):
+    def __init__(
+        self, session_id, bulk_url, proxies=None, session=None, salesforce=None
+    ):
+        self.salesforce = salesforce
+        super().__init__(session_id, bulk_url, proxies, session)
+
     def __getattr__(self, name):
         """
         Source code from this library's SFBulkType
@@ -98,9 +916,45 @@ class SFBulkHandler(BaseSFBulkHandler):
             bulk_url=self.bulk_url,
             headers=self.headers,
             session=self.session,
+            salesforce=self.salesforce,
         )
 
 
+class SFBulk2Handler(BaseSFBulk2Handler):
+    def __init__(
+        self, session_id, base_url, proxies=None, session=None, salesforce=None
+    ):
+        self.salesforce = salesforce
+        super().__init__(session_id, base_url, proxies, session)
+
+    def __getattr__(self, name):
+        """
+        Source code from this library's SFBulk2Type
+        """
+        return SFBulk2Type(
+            object_name=name,
+            base_url=self.base_url,
+            headers=self.headers,
+            session=self.session,
+            salesforce=self.salesforce,
+        )
+
+    def _span(self, name: str, **attributes):
+        if not self.salesforce:
+            return nullcontext()
+        return self.salesforce._span(name, **attributes)
+
+    @_timed("bulk2.query.wait")
+    def _wait_for_job(self, url, wait):
+        if not self.salesforce:
+            return super()._wait_for_job(url, wait)
+        return self.salesforce._job_poller.wait("bulk2", url, wait=wait)
+
+    @_timed("bulk2.query.page")
+    def _get_results_page(self, url, locator, max_records, stream):
+        return super()._get_results_page(url, locator, max_records, stream)
+
+
 class KicksawSalesforce(SfClient):
     """
     Salesforce client to use when the integration is using
@@ -110,10 +964,48 @@ class KicksawSalesforce(SfClient):
     Orchestrator client from this library
     """
 
+    # defaults only, every client keeps its own execution id and may
+    # override the namespace, so clients can run side by side in one process
     execution_object_id = None
 
     NAMESPACE = ""
 
+    # serializes the payloads of failed records, see set_payload_serializer
+    _serialize = staticmethod(dumps)
+
+    # see limit_error_payloads
+    _error_payload_fields = None
+    _error_payload_length = MAX_PAYLOAD_LENGTH
+
+    # see enable_error_aggregation
+    _error_artifacts = None
+    _error_sample_size = 5
+
+    # see enable_error_spool
+    _error_spool = None
+
+    # see enable_governor
+    _governor = None
+
+    # see enable_instrumentation
+    _instrumentation = None
+    _instrumentation_summary = False
+
+    # Salesforce expires sessions after 15 minutes of inactivity at the earliest,
+    # revoked ones are replaced as soon as Salesforce rejects them
+    SESSION_CACHE = TTLCache(ttl=15 * 60)
+    # key of the client's session in SESSION_CACHE, see _login
+    _session_key = None
+    _job_poller = None
+    INTEGRATION_CACHE = TTLCache(ttl=60 * 60)
+    # replace with DescribeCache(path=...) to keep describes on disk as well
+    DESCRIBE_CACHE = DescribeCache(ttl=60 * 60, max_size=128)
+
+    # sObject Collections accept at most this many records per request
+    COMPOSITE_BATCH_SIZE = 200
+    # beyond this many records a single bulk job is cheaper than composite calls
+    BULK_INSERT_THRESHOLD = 2000
+
     # Integration object
     INTEGRATION = "Integration__c"
     LAMBDA_NAME = "LambdaName__c"
@@ -153,38 +1045,137 @@ class KicksawSalesforce(SfClient):
         payload: dict,
         execution_object_id: str = None,
         create_missing_integration: bool = False,
+        use_cache: bool = False,
+        batch_writes: bool = False,
+        namespace: str = None,
     ):
         """
         In addition to instantiating the simple-salesforce client,
         we also decide whether or not to create an execution object
         based on whether or not we've provided an id for this execution
+
+        With use_cache, the login session and the integration's id are kept
+        in process-level caches, so warm Lambda containers skip both round trips
+
+        With batch_writes, execution and log writes are collected into Composite API
+        requests for the whole lifetime of the client, see batch
+
+        namespace overrides KicksawSalesforce.NAMESPACE for this client only
         """
+        if namespace is not None:
+            self.NAMESPACE = namespace
         self._integration_name = integration_name
         self._execution_payload = payload
         self._create_missing_integration = create_missing_integration
-        super().__init__(**connection_object)
+        self._use_cache = use_cache
+        self._log_buffer = None
+        self._error_worker = None
+        self._parallel_bulk_jobs = 1
+        self._min_bulk_job_size = None
+        self._bulk_checkpoints = None
+        self._preflight_checks = False
+        self._describes = dict()
+        self._batch = CompositeBatch(self)
+        self._batching = batch_writes
+        self._login(connection_object)
+        self._job_poller = JobPoller(
+            {
+                "bulk": BulkBatches(self.bulk_url, self.bulk.headers, self.session),
+                "bulk2": Bulk2Jobs(self.bulk2.headers, self.session),
+            }
+        )
         self._prepare_execution(execution_object_id)
 
+    def _login(self, connection_object: ConnectionObject):
+        if not self._use_cache:
+            super().__init__(**connection_object)
+            return
+
+        key = tuple(sorted(connection_object.items()))
+        self._session_key = key
+        cached = KicksawSalesforce.SESSION_CACHE.get(key)
+        if cached:
+            session_id, instance = cached
+            Salesforce.__init__(self, session_id=session_id, instance=instance)
+            # lets simple-salesforce log in again if the session was revoked
+            self._salesforce_login_partial = functools.partial(
+                salesforce_login, connection_object
+            )
+        else:
+            super().__init__(**connection_object)
+            KicksawSalesforce.SESSION_CACHE.set(
+                key, (self.session_id, self.sf_instance)
+            )
+
+    def _refresh_session(self):
+        """
+        Called by simple-salesforce to log in again when Salesforce rejects the
+        session as INVALID_SESSION_ID, e.g. a cached session that was revoked.
+        Replaces the cached session and the session of the job poller's checks
+        """
+        if self._session_key is not None:
+            KicksawSalesforce.SESSION_CACHE.pop(self._session_key)
+        super()._refresh_session()
+        if self._session_key is not None:
+            KicksawSalesforce.SESSION_CACHE.set(
+                self._session_key, (self.session_id, self.sf_instance)
+            )
+        if self._job_poller is not None:
+            self._job_poller.kinds["bulk"].headers.update(self.bulk.headers)
+            self._job_poller.kinds["bulk2"].headers.update(self.bulk2.headers)
+
+    @staticmethod
+    def clear_caches():
+        """
+        Forget cached login sessions, integration ids and describes,
+        e.g. after a session was revoked
+        """
+        KicksawSalesforce.SESSION_CACHE.clear()
+        KicksawSalesforce.INTEGRATION_CACHE.clear()
+        KicksawSalesforce.DESCRIBE_CACHE.clear()
+
     @staticmethod
     def instantiate_from_id(
-        connection_object: ConnectionObject, execution_object_id: str
+        connection_object: ConnectionObject,
+        execution_object_id: str,
+        use_cache: bool = False,
+        namespace: str = None,
     ):
         # this stuff just isn't needed once the execution object is created
         name = ""
         payload = {}
         return KicksawSalesforce(
-            connection_object, name, payload, execution_object_id=execution_object_id
+            connection_object,
+            name,
+            payload,
+            execution_object_id=execution_object_id,
+            use_cache=use_cache,
+            namespace=namespace,
         )
 
     def _prepare_execution(self, execution_object_id: str):
         if not execution_object_id:
             execution_object_id = self._create_execution_object()
-        KicksawSalesforce.execution_object_id = execution_object_id
+        self.execution_object_id = execution_object_id
 
     def _get_integration_by_name(self):
-        results = self.query(
-            f"Select Id From {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.INTEGRATION} Where Name = '{self._integration_name}'"
+        if not self._use_cache:
+            return self._query_integration_by_name()
+
+        key = (
+            self.sf_instance,
+            self.NAMESPACE,
+            self._integration_name,
+        )
+        return KicksawSalesforce.INTEGRATION_CACHE.get_or_set(
+            key, self._query_integration_by_name
         )
+
+    def _integration_query(self):
+        return f"Select Id From {self.NAMESPACE}{KicksawSalesforce.INTEGRATION} Where Name = '{self._integration_name}'"
+
+    def _query_integration_by_name(self):
+        results = self.query(self._integration_query())
         if not results["totalSize"] == 1 and self._create_missing_integration:
             response = self.create_integration(self, self._integration_name, None)
             # mock the shape of the object returned by the query
@@ -192,7 +1183,7 @@ class KicksawSalesforce(SfClient):
         else:
             assert (
                 results["totalSize"] == 1
-            ), f"No {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.INTEGRATION} named {self._integration_name}"
+            ), f"No {self.NAMESPACE}{KicksawSalesforce.INTEGRATION} named {self._integration_name}"
 
         return results["records"][0]
 
@@ -204,34 +1195,83 @@ class KicksawSalesforce(SfClient):
         Adds the payload for the first step of the step function
         as a field on the execution object
         """
-        record = self._get_integration_by_name()
-        record_id = record["Id"]
+        if self._batching and not (self._use_cache or self._create_missing_integration):
+            # look the integration up in the same composite request
+            reference_id = self._batch.query(self._integration_query())
+            record_id = f"@{{{reference_id}.records[0].Id}}"
+        else:
+            record = self._get_integration_by_name()
+            record_id = record["Id"]
 
         execution = {
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_INTEGRATION}": record_id,
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}": json.dumps(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION_INTEGRATION}": record_id,
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}": json.dumps(
                 self._execution_payload
             ),
         }
-        response = getattr(
-            self, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"
-        ).create(execution)
-        return response["id"]
+        return self._create_record(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}", execution
+        )
 
     def update_execution_object_payload(self, payload: Union[dict, list]):
+        self._execution_payload = payload
         data = {
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}": json.dumps(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}": json.dumps(
                 payload
             ),
         }
-        getattr(
-            self, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"
-        ).update(KicksawSalesforce.execution_object_id, data)
+        self._update_record(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}",
+            self.execution_object_id,
+            data,
+        )
 
     def get_execution_object(self):
-        return getattr(
-            self, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"
-        ).get(self.execution_object_id)
+        self.flush_batch()
+        return getattr(self, f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}").get(
+            self.execution_object_id
+        )
+
+    def _create_record(self, object_name: str, data: dict) -> str:
+        """
+        Create a record, or queue it while batching, returning its id
+        or a reference to it
+        """
+        if self._batching:
+            return self._batch.create(object_name, data)
+        return getattr(self, object_name).create(data)["id"]
+
+    def _update_record(self, object_name: str, record_id: str, data: dict):
+        if self._batching:
+            self._batch.update(object_name, record_id, data)
+        else:
+            getattr(self, object_name).update(record_id, data)
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect execution and log writes into Composite API requests of up to
+        25 writes each, which are sent when the outermost batch exits
+
+        Writes depending on a record created in the same batch, e.g. logs on the
+        execution object, point to it with a reference id, so
+        execution_object_id holds a reference until the batch was sent
+        """
+        batching, self._batching = self._batching, True
+        try:
+            yield self._batch
+        finally:
+            self._batching = batching
+            if not batching:
+                self.flush_batch()
+
+    def flush_batch(self):
+        """
+        Send every batched write, resolving a referenced execution_object_id
+        """
+        self._batch.flush()
+        if self.execution_object_id:
+            self.execution_object_id = self._batch.resolve(self.execution_object_id)
 
     def __getattr__(self, name: str):
         """
@@ -241,24 +1281,105 @@ class KicksawSalesforce(SfClient):
         if name == "bulk":
             # Deal with bulk API functions
             return SFBulkHandler(
-                self.session_id, self.bulk_url, self.proxies, self.session
+                self.session_id,
+                self.bulk_url,
+                self.proxies,
+                self.session,
+                salesforce=self,
+            )
+        if name == "bulk2":
+            # Bulk API 2.0 functions, with the same error handling as bulk
+            return SFBulk2Handler(
+                self.session_id,
+                self.base_url,
+                self.proxies,
+                self.session,
+                salesforce=self,
             )
         return super().__getattr__(name)
 
+    def bulk_v2_query(
+        self, query: str = None, output: str = "records", **kwargs
+    ) -> Iterator[Any]:
+        """
+        Stream the records of a Bulk API 2.0 query
+
+        Accepts the same arguments as SFBulk2Handler.query, including the
+        job_id, locator and checkpoint arguments used to resume a query
+
+        With output "columns", "arrow" or "pandas", every result page is yielded
+        as a whole, see SFBulk2Handler.query_batches
+        """
+        if output == "records":
+            return self.bulk2.query(query, **kwargs)
+        return self.bulk2.query_batches(query, output=output, **kwargs)
+
+    def bulk_v2_query_to_file(self, path: str, query: str = None, **kwargs):
+        """
+        Write the results of a Bulk API 2.0 query to a local CSV or Parquet file,
+        see SFBulk2Handler.query_to_file
+        """
+        self.bulk2.query_to_file(path, query, **kwargs)
+
+    def describe_object(self, object_name: str) -> dict:
+        """
+        The describe metadata of an object, fetched once per client, or with
+        use_cache once per org and namespace in KicksawSalesforce.DESCRIBE_CACHE
+        """
+        if self._use_cache:
+            key = (self.sf_instance, self.NAMESPACE, object_name)
+            return KicksawSalesforce.DESCRIBE_CACHE.get_or_fetch(
+                key, getattr(self, object_name).describe
+            )
+        if object_name not in self._describes:
+            self._describes[object_name] = getattr(self, object_name).describe()
+        return self._describes[object_name]
+
+    def describe_fields(self, object_name: str) -> Dict[str, dict]:
+        """
+        The describes of an object's fields, e.g. their type and length, by name
+        """
+        return {
+            field["name"]: field
+            for field in self.describe_object(object_name)["fields"]
+        }
+
+    def purge_errors(self, retention: str = "LAST_N_MONTHS:4", **kwargs) -> PurgeReport:
+        """
+        Delete the integration errors created before retention
+
+        Accepts the same keyword arguments as purge_records
+        """
+        # a plain handler, failed deletes shouldn't turn into integration errors
+        bulk2 = BaseSFBulk2Handler(
+            self.session_id, self.base_url, self.proxies, self.session
+        )
+        return purge_records(
+            bulk2,
+            f"{self.NAMESPACE}{KicksawSalesforce.ERROR}",
+            retention,
+            **kwargs,
+        )
+
     @staticmethod
     def create_integration(salesforce: SfClient, name: str, lambda_name: str):
         """
         Call to create the parent integration object
 
         Needs to be static because an instance of this class depends on an integration
-        already existing
+        already existing. Uses the namespace of salesforce if it's a KicksawSalesforce
         """
+        namespace = (
+            salesforce.NAMESPACE
+            if isinstance(salesforce, KicksawSalesforce)
+            else KicksawSalesforce.NAMESPACE
+        )
         data = {
             "Name": name,
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LAMBDA_NAME}": lambda_name,
+            f"{namespace}{KicksawSalesforce.LAMBDA_NAME}": lambda_name,
         }
         return getattr(
-            salesforce, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.INTEGRATION}"
+            salesforce, f"{namespace}{KicksawSalesforce.INTEGRATION}"
         ).create(data)
 
     def log(
@@ -272,49 +1393,315 @@ class KicksawSalesforce(SfClient):
         Used for recording custom messages
         """
         data = {
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION}": self.execution_object_id,
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_MESSAGE}": log,
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_LEVEL}": level.value,
+            f"{self.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION}": self.execution_object_id,
+            f"{self.NAMESPACE}{KicksawSalesforce.LOG_MESSAGE}": log,
+            f"{self.NAMESPACE}{KicksawSalesforce.LOG_LEVEL}": level.value,
         }
 
         if status_code:
-            data[
-                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.STATUS_CODE}"
-            ] = status_code
+            data[f"{self.NAMESPACE}{KicksawSalesforce.STATUS_CODE}"] = status_code
         if associated_entity:
             data[
-                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ASSOCIATED_ENTITY}"
+                f"{self.NAMESPACE}{KicksawSalesforce.ASSOCIATED_ENTITY}"
             ] = associated_entity
 
-        getattr(self, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG}").create(
-            data
+        self._count("logs", level=level.value)
+        if (
+            self._log_buffer is None
+            and self._governor is not None
+            and self._governor.tight
+        ):
+            # logs can wait, push them in batches while API requests are scarce
+            self.enable_log_buffering()
+        if self._log_buffer is not None:
+            self._log_buffer.add(data)
+            return
+
+        with self._span("log"):
+            self._create_record(f"{self.NAMESPACE}{KicksawSalesforce.LOG}", data)
+
+    def enable_log_buffering(self, max_size: int = 200, max_age: float = 30.0):
+        """
+        Hold log records in memory instead of creating them one request at a time
+
+        Buffered records are pushed when the buffer holds max_size records,
+        when its oldest record is older than max_age seconds, when the execution
+        completes or fails, and at interpreter exit. The age is only checked on
+        the next call to log, call flush_logs before long-running work
+        """
+        if self._log_buffer is not None:
+            self._log_buffer.flush()
+        self._log_buffer = LogBuffer(self._push_logs, max_size, max_age)
+
+    def enable_background_error_upload(self, max_workers: int = 1):
+        """
+        Push the errors of bulk operations to Salesforce from a background thread,
+        so bulk calls return as soon as their own job is done
+
+        Don't mutate data passed to bulk operations until flush_errors was called
+        """
+        if self._error_worker is None:
+            self._error_worker = BackgroundWorker(max_workers)
+
+    def enable_error_aggregation(
+        self, artifacts: ArtifactStore = None, sample_size: int = 5
+    ):
+        """
+        Write one summary error object per object, operation, error code and message
+        instead of one error object per failed record
+
+        Summaries hold the number of errors and up to sample_size upsert key values.
+        Every error object goes to a gzipped JSON lines artifact in artifacts,
+        a LocalArtifactStore by default
+        """
+        self._error_artifacts = artifacts or LocalArtifactStore()
+        self._error_sample_size = sample_size
+
+    def limit_error_payloads(
+        self, fields: List[str] = None, max_length: int = MAX_PAYLOAD_LENGTH
+    ):
+        """
+        Store only the given fields of failed records on their error objects,
+        and cut payloads longer than max_length characters short
+        """
+        assert max_length > len(TRUNCATION_MARKER), "max_length is too short"
+        self._error_payload_fields = fields
+        self._error_payload_length = max_length
+
+    def set_payload_serializer(self, serializer: Callable[[dict], str]):
+        """
+        Swap the function turning payloads of failed records into the JSON stored
+        on their error objects, json.dumps sped up with orjson by default
+        """
+        self._serialize = serializer
+
+    def enable_error_spool(
+        self, directory: str = None, max_attempts: int = 5, backoff: float = 1.0
+    ):
+        """
+        Write the error objects of bulk operations to compressed files in
+        directory, the system's temporary directory by default, before pushing
+        them, so they survive Salesforce being unavailable or throttling the client
+
+        Pushes failing with REQUEST_LIMIT_EXCEEDED, server errors or timeouts are
+        retried max_attempts times, with an exponential backoff starting at
+        backoff seconds. After that, the errors stay spooled and the next
+        drain_errors on the execution, e.g. in a retried step, pushes them
+        """
+        self._error_spool = ErrorSpool(directory, max_attempts, backoff)
+
+    @_timed("errors.drain")
+    def drain_errors(self) -> int:
+        """
+        Push the spooled error objects of the execution, returning how many
+        were pushed. complete_execution and handle_exception call it too
+        """
+        if self._error_spool is None:
+            return 0
+        # the spool is kept by the actual execution id
+        self.flush_batch()
+        return self._error_spool.drain(
+            self.execution_object_id,
+            self._insert_error_chunk,
+            SFBulkType.ERROR_CHUNK_SIZE,
+            SFBulkType.ERROR_CHUNK_BYTES,
         )
 
+    def _insert_error_chunk(self, error_objects: List[dict]):
+        bulk = self.bulk
+        with self._bulk_job():
+            BaseSFBulkType(
+                f"{self.NAMESPACE}{KicksawSalesforce.ERROR}",
+                bulk.bulk_url,
+                bulk.headers,
+                bulk.session,
+            ).insert(error_objects, batch_size=len(error_objects))
+
+    def enable_bulk_checkpoints(self, store: CheckpointStore = None):
+        """
+        Record the jobs, batches and pushed error chunks of every bulk operation,
+        by default in the execution payload. Repeating an operation with the
+        same data on the same execution, e.g. in a retried step, reattaches to
+        its jobs and skips the error chunks that were already pushed
+        """
+        self._bulk_checkpoints = BulkCheckpoints(
+            store or ExecutionPayloadStore(self), self
+        )
+
+    def enable_preflight(self):
+        """
+        Check the rows of bulk inserts, updates and upserts against the object's
+        describe metadata before uploading them. Rows sharing an upsert key, missing
+        a required field or holding a string longer than its field are left out of
+        the upload and get errors with the operation "preflight" instead. Rows
+        sharing an upsert key only count if they'd be in the same batch
+        """
+        self._preflight_checks = True
+
+    def enable_instrumentation(
+        self,
+        instrumentation: Instrumentation = None,
+        hooks: List[InstrumentationHook] = None,
+        summary: bool = True,
+    ):
+        """
+        Time every HTTP request and bulk phase, and count rows, failed rows,
+        error objects, logs and API calls, in instrumentation, a new
+        Instrumentation by default. hooks see every span and count as it happens
+
+        With summary, complete_execution adds the totals to the response
+        payload under "instrumentation"
+        """
+        response_hooks = self.session.hooks["response"]
+        if self._instrumentation is not None:
+            response_hooks.remove(self._instrumentation.response_hook)
+        self._instrumentation = instrumentation or Instrumentation()
+        for hook in hooks or ():
+            self._instrumentation.add_hook(hook)
+        self._instrumentation_summary = summary
+        response_hooks.append(self._instrumentation.response_hook)
+
+    def _span(self, name: str, **attributes):
+        if self._instrumentation is None:
+            return nullcontext()
+        return self._instrumentation.span(name, **attributes)
+
+    def _count(self, name: str, value: int = 1, **attributes):
+        if self._instrumentation is not None:
+            self._instrumentation.count(name, value, **attributes)
+
+    def enable_governor(self, governor: Governor = None, check_limits: bool = False):
+        """
+        Send every request of the client, bulk jobs and queries included, through
+        governor, a new Governor by default, which keeps them within its rate,
+        concurrency and bulk job limits and tracks the org's API usage
+
+        While the API budget is tight, logs are buffered and pushed in batches.
+        With check_limits, the org's API usage is read from the limits resource
+        right away instead of from the next response reporting it
+        """
+        self._governor = governor or Governor()
+        govern(self.session, self._governor)
+        if check_limits:
+            self._governor.check_limits(self)
+
+    def _bulk_job(self):
+        if self._governor is None:
+            return nullcontext()
+        return self._governor.bulk_job()
+
+    def enable_parallel_bulk_jobs(self, jobs: int = 4, min_job_size: int = 10000):
+        """
+        Split large bulk operations into up to `jobs` bulk jobs that run concurrently
+
+        Every job gets at least min_job_size records, so smaller loads keep running
+        as one job. Results are returned in the order of the submitted data
+        """
+        assert jobs > 0, "jobs must be positive"
+        assert min_job_size > 0, "min_job_size must be positive"
+        self._parallel_bulk_jobs = jobs
+        self._min_bulk_job_size = min_job_size
+
+    def _count_bulk_jobs(self, records: int) -> int:
+        if self._parallel_bulk_jobs == 1:
+            return 1
+        return max(1, min(self._parallel_bulk_jobs, records // self._min_bulk_job_size))
+
+    def flush_errors(self):
+        """
+        Wait for every pending background error upload to finish
+        """
+        if self._error_worker is not None:
+            self._error_worker.wait()
+
+    def flush_logs(self):
+        """
+        Push any buffered log records to Salesforce
+        """
+        if self._log_buffer is not None:
+            self._log_buffer.flush()
+
+    @_timed("logs.push")
+    def _push_logs(self, records: List[dict]):
+        # records buffered while batching may reference the execution object
+        self.flush_batch()
+        if self._batch.results:
+            records = json.loads(self._batch.resolve(json.dumps(records)))
+        self._insert_records(f"{self.NAMESPACE}{KicksawSalesforce.LOG}", records)
+
+    def _insert_records(self, object_name: str, records: List[dict]):
+        """
+        Insert records with as few calls as possible: sObject Collections
+        for small sets, a single bulk job for large ones
+        """
+        if len(records) > KicksawSalesforce.BULK_INSERT_THRESHOLD:
+            bulk = self.bulk
+            with self._bulk_job():
+                BaseSFBulkType(
+                    object_name, bulk.bulk_url, bulk.headers, bulk.session
+                ).insert(records)
+            return
+
+        size = KicksawSalesforce.COMPOSITE_BATCH_SIZE
+        for start in range(0, len(records), size):
+            body = {
+                "allOrNone": False,
+                "records": [
+                    {"attributes": {"type": object_name}, **record}
+                    for record in records[start : start + size]
+                ],
+            }
+            self.restful("composite/sobjects", method="POST", data=json.dumps(body))
+
     def handle_exception(self, message: str):
         """
         After this is called, caller should thow Exception
+
+        The execution is marked failed even if pushing pending errors fails,
+        in which case that failure is raised
         """
-        data = {
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}": False,
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_MESSAGE}": message,
-        }
-        getattr(
-            self, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"
-        ).update(KicksawSalesforce.execution_object_id, data)
+        try:
+            try:
+                self.flush_errors()
+                self.drain_errors()
+            finally:
+                self.flush_logs()
+        finally:
+            # mark the execution failed even if pushing its errors failed,
+            # the push's exception is re-raised afterwards
+            data = {
+                f"{self.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}": False,
+                f"{self.NAMESPACE}{KicksawSalesforce.ERROR_MESSAGE}": message,
+            }
+            self._update_record(
+                f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}",
+                self.execution_object_id,
+                data,
+            )
+            self.flush_batch()
 
     def complete_execution(self, response_payload: dict = None):
         """
         Call at the very end of the integration. This method should be the last line of code called
         """
-        data = {
-            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}": True
-        }
+        self.flush_errors()
+        self.drain_errors()
+        self.flush_logs()
+        data = {f"{self.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}": True}
 
+        if self._instrumentation_summary:
+            response_payload = {
+                **(response_payload or {}),
+                "instrumentation": self._instrumentation.summary(),
+            }
         if response_payload:
-            data[
-                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.RESPONSE_PAYLOAD}"
-            ] = json.dumps(response_payload)
+            data[f"{self.NAMESPACE}{KicksawSalesforce.RESPONSE_PAYLOAD}"] = json.dumps(
+                response_payload
+            )
 
-        getattr(
-            self, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"
-        ).update(KicksawSalesforce.execution_object_id, data)
+        self._update_record(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}",
+            self.execution_object_id,
+            data,
+        )
+        self.flush_batch()
@@ -0,0 +1,966 @@
+"""
+asyncio counterparts of KicksawSalesforce and its bulk handlers
+
+Needs httpx (`pip install kicksaw-integration-app-client[async]`). Every request of
+a client goes through one pooled httpx.AsyncClient, which can be shared between clients,
+so a single event loop can drive many bulk jobs and status polls without a thread
+blocked per job
+"""
+
+import asyncio
+import json
+import logging
+
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from simple_salesforce.api import DEFAULT_API_VERSION
+from simple_salesforce.exceptions import SalesforceExpiredSession
+from simple_salesforce.util import exception_handler
+
+from kicksaw_integration_app_client import (
+    BulkErrorReporter,
+    ConnectionObject,
+    MAX_PAYLOAD_LENGTH,
+    KicksawSalesforce,
+    LogLevel,
+    SFBulkType,
+    SFBulk2Type,
+    salesforce_login,
+)
+from kicksaw_integration_app_client.bulk2 import (
+    CHUNK_SIZE,
+    SFBulk2Type as BaseSFBulk2Type,
+    failed_result,
+    iter_csv_records,
+    poll_intervals,
+)
+from kicksaw_integration_app_client.polling import BULK_BATCH_DONE_STATES
+from kicksaw_integration_app_client.utils import chunked, dumps
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# connection pool of clients created by this module
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+def create_http_client(**kwargs) -> "httpx.AsyncClient":
+    """
+    A pooled httpx.AsyncClient, e.g. to share between several AsyncKicksawSalesforce
+    """
+    if httpx is None:
+        raise ImportError(
+            "The asyncio client needs httpx, "
+            "run `pip install kicksaw-integration-app-client[async]`"
+        )
+    kwargs.setdefault(
+        "limits",
+        httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    )
+    kwargs.setdefault("timeout", 60)
+    return httpx.AsyncClient(**kwargs)
+
+
+async def call_salesforce(
+    client: "httpx.AsyncClient",
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    name: str = "",
+    **kwargs,
+) -> "httpx.Response":
+    """
+    Async simple_salesforce.util.call_salesforce, raising the same exceptions
+    """
+    response = await client.request(method, url, headers=dict(headers), **kwargs)
+    if response.status_code >= 300:
+        exception_handler(response, name)
+    return response
+
+
+async def wait_for_job(
+    client: "httpx.AsyncClient", headers: Dict[str, str], url: str, wait: float
+) -> dict:
+    """
+    Poll a Bulk 2.0 job until it completes and return its final state
+    """
+    for interval in poll_intervals(wait):
+        response = await call_salesforce(client, "GET", url, headers)
+        job = response.json()
+        state = job["state"]
+        if state == "JobComplete":
+            logger.debug("Job '%s' finished with state '%s'", job["id"], state)
+            return job
+        if state in ("Failed", "Aborted"):
+            raise RuntimeError(
+                f"Job '{job['id']}' failed with state '{state}': {job.get('errorMessage')}"
+            )
+        await asyncio.sleep(interval)
+
+
+async def stream_salesforce(
+    client: "httpx.AsyncClient",
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    name: str = "",
+    **kwargs,
+) -> AsyncIterator[bytes]:
+    """
+    Like call_salesforce, but yields the body in chunks as it arrives
+    """
+    async with client.stream(method, url, headers=dict(headers), **kwargs) as response:
+        if response.status_code >= 300:
+            await response.aread()
+            exception_handler(response, name)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            yield chunk
+
+
+def _complete_records_length(data: bytes) -> int:
+    """
+    Length of the complete CSV records at the start of data, which end at the
+    last line break preceded by an even number of quotes
+    """
+    length = 0
+    quotes = 0
+    start = 0
+    while True:
+        line_break = data.find(b"\n", start)
+        if line_break == -1:
+            return length
+        quotes += data.count(b'"', start, line_break)
+        if quotes % 2 == 0:
+            length = line_break + 1
+        start = line_break + 1
+
+
+async def aiter_csv_records(
+    chunks: AsyncIterable[bytes],
+) -> AsyncIterator[Dict[str, str]]:
+    """
+    Async iter_csv_records, parsing the complete records of every chunk
+    as soon as it arrives
+    """
+    header = None
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        length = _complete_records_length(pending)
+        if not length:
+            continue
+        records, pending = pending[:length], pending[length:]
+        if header is None:
+            header_length = records.index(b"\n") + 1
+            header, records = records[:header_length], records[header_length:]
+        for record in iter_csv_records([header, records]):
+            yield record
+    if pending:
+        for record in iter_csv_records([header or b"", pending]):
+            yield record
+
+
+async def _chunked_by_size(
+    iterable: AsyncIterable,
+    size: Optional[int],
+    max_bytes: int,
+    measure: Callable[[Any], int],
+) -> AsyncIterator[list]:
+    """
+    Async utils.chunked_by_size
+    """
+    chunk = list()
+    chunk_bytes = 0
+    async for item in iterable:
+        item_bytes = measure(item)
+        if chunk and (
+            (size is not None and len(chunk) >= size)
+            or chunk_bytes + item_bytes > max_bytes
+        ):
+            yield chunk
+            chunk = list()
+            chunk_bytes = 0
+        chunk.append(item)
+        chunk_bytes += item_bytes
+    if chunk:
+        yield chunk
+
+
+class AsyncBulkErrorReporter(BulkErrorReporter):
+    """
+    BulkErrorReporter with awaitable pushes
+    """
+
+    async def _push_errors(
+        self,
+        results: Union[Iterable[Tuple[dict, dict]], AsyncIterable[Tuple[dict, dict]]],
+        operation,
+        external_id_field,
+    ):
+        """
+        Push the error objects of (payload, result) pairs in chunks, as soon as
+        a chunk fills when the pairs come from an async iterable
+        """
+        if not hasattr(results, "__aiter__"):
+            for chunk in self._error_chunks(results, operation, external_id_field):
+                await self._insert_errors(chunk)
+            return
+
+        async for chunk in self._async_error_chunks(
+            results, operation, external_id_field
+        ):
+            await self._insert_errors(chunk)
+
+    def _async_error_chunks(self, results, operation, external_id_field):
+        """
+        _error_chunks of an async iterable of (payload, result) pairs
+        """
+
+        async def error_objects():
+            async for result in results:
+                for error_object in self._iter_error_objects(
+                    (result,), operation, external_id_field
+                ):
+                    yield error_object
+
+        if self.ERROR_CHUNK_BYTES is None:
+            return _chunked_by_size(
+                error_objects(), self.ERROR_CHUNK_SIZE, 0, lambda error_object: 0
+            )
+
+        serialize = self._client._serialize
+        return _chunked_by_size(
+            error_objects(),
+            self.ERROR_CHUNK_SIZE,
+            self.ERROR_CHUNK_BYTES,
+            # the separator in the JSON array of the batch adds two more
+            lambda error_object: len(serialize(error_object)) + 2,
+        )
+
+
+class AsyncSFBulkType(AsyncBulkErrorReporter):
+    """
+    Bulk API 1.0 operations, whose batches are polled concurrently
+    """
+
+    ERROR_CHUNK_BYTES = SFBulkType.ERROR_CHUNK_BYTES
+
+    def __init__(
+        self,
+        object_name: str,
+        bulk_url: str,
+        headers: Dict[str, str],
+        client: "httpx.AsyncClient",
+        salesforce: "AsyncKicksawSalesforce" = None,
+    ):
+        self.object_name = object_name
+        self.bulk_url = bulk_url
+        self.headers = headers
+        self.client = client
+        self.salesforce = salesforce
+
+    # wait is the longest pause between two batch status checks in seconds
+
+    async def insert(self, data: List[dict], batch_size: int = 10000, wait: float = 5):
+        return await self._bulk_operation(
+            "insert", data, batch_size=batch_size, wait=wait
+        )
+
+    async def upsert(
+        self,
+        data: List[dict],
+        external_id_field: str,
+        batch_size: int = 10000,
+        wait: float = 5,
+    ):
+        return await self._bulk_operation(
+            "upsert",
+            data,
+            external_id_field=external_id_field,
+            batch_size=batch_size,
+            wait=wait,
+        )
+
+    async def update(self, data: List[dict], batch_size: int = 10000, wait: float = 5):
+        return await self._bulk_operation(
+            "update", data, batch_size=batch_size, wait=wait
+        )
+
+    async def delete(self, data: List[dict], batch_size: int = 10000, wait: float = 5):
+        return await self._bulk_operation(
+            "delete", data, batch_size=batch_size, wait=wait
+        )
+
+    async def hard_delete(
+        self, data: List[dict], batch_size: int = 10000, wait: float = 5
+    ):
+        return await self._bulk_operation(
+            "hardDelete", data, batch_size=batch_size, wait=wait
+        )
+
+    async def _bulk_operation(
+        self,
+        operation: str,
+        data: List[dict],
+        external_id_field: Optional[str] = None,
+        batch_size: int = 10000,
+        wait: float = 5,
+    ) -> List[dict]:
+        if not data:
+            raise ValueError(f"data should not be empty for {operation}")
+        batch_size = min(batch_size, len(data), 10000)
+
+        job = await self._request(
+            "POST", "job", self._job_payload(operation, external_id_field)
+        )
+        batches = await asyncio.gather(
+            *(
+                self._request("POST", f"job/{job['id']}/batch", batch)
+                for batch in chunked(data, batch_size)
+            )
+        )
+        await self._request("POST", f"job/{job['id']}", {"state": "Closed"})
+        results = await asyncio.gather(
+            *(self._batch_results(job["id"], batch["id"], wait) for batch in batches)
+        )
+        response = [record for result in results for record in result]
+
+        if self.salesforce:
+            await self._process_errors(data, response, operation, external_id_field)
+        return response
+
+    def _job_payload(self, operation: str, external_id_field: Optional[str]) -> dict:
+        payload = {
+            "operation": operation,
+            "object": self.object_name,
+            "concurrencyMode": "Parallel",
+            "contentType": "JSON",
+        }
+        if operation == "upsert":
+            payload["externalIdFieldName"] = external_id_field
+        return payload
+
+    async def _request(self, method: str, path: str, payload=None):
+        response = await call_salesforce(
+            self.client,
+            method,
+            f"{self.bulk_url}{path}",
+            self.headers,
+            content=None if payload is None else json.dumps(payload),
+        )
+        return response.json()
+
+    async def _batch_results(self, job_id: str, batch_id: str, wait: float):
+        for interval in poll_intervals(wait):
+            batch = await self._request("GET", f"job/{job_id}/batch/{batch_id}")
+            if batch["state"] in BULK_BATCH_DONE_STATES:
+                break
+            await asyncio.sleep(interval)
+        return await self._request("GET", f"job/{job_id}/batch/{batch_id}/result")
+
+    async def _process_errors(self, data, response, operation, external_id_field):
+        assert len(data) == len(
+            response
+        ), f"{len(data)} (data) and {len(response)} (response) have different lengths!"
+        assert self._client.execution_object_id, f"execution_object_id is not set"
+
+        await self._push_errors(zip(data, response), operation, external_id_field)
+
+    async def _insert_errors(self, error_objects):
+        error_client = AsyncSFBulkType(
+            f"{self._client.NAMESPACE}{KicksawSalesforce.ERROR}",
+            self.bulk_url,
+            self.headers,
+            self.client,
+        )
+        await error_client.insert(error_objects, batch_size=len(error_objects))
+
+
+class AsyncSFBulk2Type(AsyncBulkErrorReporter):
+    """
+    Bulk API 2.0 ingest operations, serialized just like SFBulk2Type does
+    """
+
+    MAX_UPLOAD_SIZE = BaseSFBulk2Type.MAX_UPLOAD_SIZE
+    ERROR_CHUNK_SIZE = SFBulk2Type.ERROR_CHUNK_SIZE
+    ERROR_CHUNK_BYTES = SFBulk2Type.ERROR_CHUNK_BYTES
+
+    _csv_payloads = BaseSFBulk2Type._csv_payloads
+    _url = BaseSFBulk2Type._url
+
+    def __init__(
+        self,
+        object_name: str,
+        base_url: str,
+        headers: Dict[str, str],
+        client: "httpx.AsyncClient",
+        salesforce: "AsyncKicksawSalesforce" = None,
+    ):
+        self.object_name = object_name
+        self.base_url = base_url
+        self.headers = headers
+        self.client = client
+        self.salesforce = salesforce
+
+    async def insert(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return await self._ingest("insert", data, wait=wait)
+
+    async def upsert(
+        self, data: List[dict], external_id_field: str, wait: float = 5
+    ) -> List[dict]:
+        return await self._ingest(
+            "upsert", data, external_id_field=external_id_field, wait=wait
+        )
+
+    async def update(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return await self._ingest("update", data, wait=wait)
+
+    async def delete(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return await self._ingest("delete", data, wait=wait)
+
+    async def hard_delete(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return await self._ingest("hardDelete", data, wait=wait)
+
+    async def _ingest(
+        self,
+        operation: str,
+        data: List[dict],
+        external_id_field: Optional[str] = None,
+        wait: float = 5,
+    ) -> List[dict]:
+        """
+        Run one ingest job per CSV payload, concurrently, and return their final states
+        """
+        if not data:
+            raise ValueError(f"data should not be empty for {operation}")
+
+        jobs = await asyncio.gather(
+            *(
+                self._run_job(operation, payload, external_id_field, wait)
+                for payload in self._csv_payloads(data)
+            )
+        )
+        if self.salesforce:
+            await self._process_errors(jobs, operation, external_id_field)
+        return list(jobs)
+
+    async def _run_job(
+        self,
+        operation: str,
+        payload: bytes,
+        external_id_field: Optional[str],
+        wait: float,
+    ) -> dict:
+        job = {
+            "object": self.object_name,
+            "operation": operation,
+            "contentType": "CSV",
+            "lineEnding": "LF",
+        }
+        if operation == "upsert":
+            job["externalIdFieldName"] = external_id_field
+
+        response = await call_salesforce(
+            self.client, "POST", self._url(), self.headers, content=json.dumps(job)
+        )
+        job_id = response.json()["id"]
+        await call_salesforce(
+            self.client,
+            "PUT",
+            self._url(job_id, "batches"),
+            {**self.headers, "Content-Type": "text/csv"},
+            content=payload,
+        )
+        await call_salesforce(
+            self.client,
+            "PATCH",
+            self._url(job_id),
+            self.headers,
+            content=json.dumps({"state": "UploadComplete"}),
+        )
+        return await wait_for_job(self.client, self.headers, self._url(job_id), wait)
+
+    async def iter_failed_results(
+        self, job_id: str
+    ) -> AsyncIterator[Tuple[dict, dict]]:
+        """
+        The failed rows of a job as (payload, error) pairs, see SFBulk2Type
+        """
+        chunks = stream_salesforce(
+            self.client, "GET", self._url(job_id, "failedResults/"), self.headers
+        )
+        async for row in aiter_csv_records(chunks):
+            yield failed_result(row)
+
+    async def _process_errors(self, jobs, operation, external_id_field):
+        """
+        Stream the failed results of the given jobs into error objects in Salesforce
+        """
+        assert self._client.execution_object_id, f"execution_object_id is not set"
+
+        results = (
+            (payload, {"success": False, "errors": [error]})
+            for job in jobs
+            if job.get("numberRecordsFailed")
+            async for payload, error in self.iter_failed_results(job["id"])
+        )
+        await self._push_errors(results, operation, external_id_field)
+
+    async def _insert_errors(self, error_objects):
+        error_client = AsyncSFBulk2Type(
+            f"{self._client.NAMESPACE}{KicksawSalesforce.ERROR}",
+            self.base_url,
+            self.headers,
+            self.client,
+        )
+        await error_client.insert(error_objects)
+
+
+class AsyncSFBulkHandler:
+    """
+    Bulk API 1.0 request handler, allows for `await sf.bulk.Contact.insert(...)`
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        bulk_url: str,
+        client: "httpx.AsyncClient",
+        salesforce: "AsyncKicksawSalesforce" = None,
+    ):
+        self.session_id = session_id
+        self.bulk_url = bulk_url
+        self.client = client
+        self.salesforce = salesforce
+        self.headers = {
+            "Content-Type": "application/json",
+            "X-SFDC-Session": self.session_id,
+            "X-PrettyPrint": "1",
+        }
+
+    def __getattr__(self, name: str) -> AsyncSFBulkType:
+        return AsyncSFBulkType(
+            object_name=name,
+            bulk_url=self.bulk_url,
+            headers=self.headers,
+            client=self.client,
+            salesforce=self.salesforce,
+        )
+
+
+class AsyncSFBulk2Handler:
+    """
+    Bulk API 2.0 request handler, allows for `await sf.bulk2.Contact.insert(...)`
+    and `async for record in sf.bulk2.query(...)`
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        base_url: str,
+        client: "httpx.AsyncClient",
+        salesforce: "AsyncKicksawSalesforce" = None,
+    ):
+        self.session_id = session_id
+        self.base_url = base_url
+        self.client = client
+        self.salesforce = salesforce
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.session_id}",
+        }
+
+    def __getattr__(self, name: str) -> AsyncSFBulk2Type:
+        return AsyncSFBulk2Type(
+            object_name=name,
+            base_url=self.base_url,
+            headers=self.headers,
+            client=self.client,
+            salesforce=self.salesforce,
+        )
+
+    async def query(
+        self,
+        query: Optional[str] = None,
+        max_records: int = 10000,
+        job_id: Optional[str] = None,
+        locator: Optional[str] = None,
+        include_deleted: bool = False,
+        checkpoint: Optional[Callable[[dict], None]] = None,
+        wait: float = 30,
+    ) -> AsyncIterator[Dict[str, str]]:
+        """
+        Query Salesforce using the Bulk 2.0 API
+
+        Takes the same arguments as SFBulk2Handler.query, except for prefetch:
+        other tasks keep running while a page downloads anyway
+        """
+        assert (query is not None) ^ (
+            job_id is not None
+        ), "Either query or job_id must be specified, but not both"
+
+        url = "/".join([self.base_url.rstrip("/"), "jobs", "query"])
+
+        if job_id is None:
+            response = await call_salesforce(
+                self.client,
+                "POST",
+                url,
+                self.headers,
+                content=json.dumps(
+                    {
+                        "query": query,
+                        "operation": "queryAll" if include_deleted else "query",
+                    }
+                ),
+            )
+            job_id = response.json()["id"]
+            if checkpoint:
+                checkpoint({"job_id": job_id, "locator": None, "done": False})
+
+        await wait_for_job(self.client, self.headers, f"{url}/{job_id}", wait)
+
+        while True:
+            response = await call_salesforce(
+                self.client,
+                "GET",
+                f"{url}/{job_id}/results",
+                self.headers,
+                params={
+                    "maxRecords": max_records,
+                    **({"locator": locator} if locator else {}),
+                },
+            )
+            locator = response.headers["Sforce-Locator"]
+            for record in iter_csv_records([response.content]):
+                yield record
+
+            done = locator == "null"
+            if checkpoint:
+                checkpoint({"job_id": job_id, "locator": locator, "done": done})
+            if done:
+                return
+
+
+class AsyncKicksawSalesforce:
+    """
+    asyncio counterpart of KicksawSalesforce
+
+    Create one with `await AsyncKicksawSalesforce.connect(...)`, which takes the same
+    arguments as KicksawSalesforce, and close it with `await salesforce.aclose()`
+    or by using it as an async context manager
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        instance: str,
+        client: "httpx.AsyncClient" = None,
+        sf_version: str = DEFAULT_API_VERSION,
+        namespace: str = None,
+    ):
+        """
+        Pass client to share one connection pool between several clients,
+        it isn't closed along with this client then
+        """
+        self.sf_version = sf_version
+        self._set_session(session_id, instance)
+        # set by connect, to log in again when Salesforce rejects the session
+        self._connection_object = None
+        self._use_cache = False
+        self._refresh_lock = asyncio.Lock()
+        self._owns_client = client is None
+        self.client = client or create_http_client()
+        self._namespace = namespace
+        self._serialize = dumps
+        self._error_payload_fields = None
+        self._error_payload_length = MAX_PAYLOAD_LENGTH
+        self.execution_object_id = None
+
+    @property
+    def NAMESPACE(self) -> str:
+        if self._namespace is None:
+            return KicksawSalesforce.NAMESPACE
+        return self._namespace
+
+    @classmethod
+    async def connect(
+        cls,
+        connection_object: ConnectionObject,
+        integration_name: str,
+        payload: dict,
+        execution_object_id: str = None,
+        create_missing_integration: bool = False,
+        use_cache: bool = False,
+        namespace: str = None,
+        client: "httpx.AsyncClient" = None,
+    ) -> "AsyncKicksawSalesforce":
+        """
+        Log in and create an execution object, unless execution_object_id is given
+
+        With use_cache, login sessions and integration ids are shared
+        with KicksawSalesforce's caches
+        """
+        session_id, instance = await _login(connection_object, use_cache)
+        salesforce = cls(session_id, instance, client=client, namespace=namespace)
+        salesforce._connection_object = connection_object
+        salesforce._use_cache = use_cache
+        try:
+            if not execution_object_id:
+                execution_object_id = await salesforce._create_execution_object(
+                    integration_name, payload, create_missing_integration, use_cache
+                )
+        except BaseException:
+            await salesforce.aclose()
+            raise
+        salesforce.execution_object_id = execution_object_id
+        return salesforce
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _set_session(self, session_id: str, instance: str):
+        self.session_id = session_id
+        self.sf_instance = instance
+        self.base_url = f"https://{instance}/services/data/v{self.sf_version}/"
+        self.bulk_url = f"https://{instance}/services/async/{self.sf_version}/"
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_id}",
+            "X-PrettyPrint": "1",
+        }
+
+    async def _refresh_session(self, expired_session_id: str):
+        """
+        Log in again after Salesforce rejected expired_session_id, e.g. a cached
+        session that was revoked, replacing it in the session cache
+        """
+        async with self._refresh_lock:
+            if self.session_id != expired_session_id:
+                # another request already replaced it
+                return
+            if self._use_cache:
+                KicksawSalesforce.SESSION_CACHE.pop(
+                    _session_key(self._connection_object)
+                )
+            session_id, instance = await _login(
+                self._connection_object, self._use_cache
+            )
+            self._set_session(session_id, instance)
+
+    async def restful(self, path: str, method: str = "GET", **kwargs):
+        session_id = self.session_id
+        try:
+            response = await call_salesforce(
+                self.client, method, f"{self.base_url}{path}", self.headers, **kwargs
+            )
+        except SalesforceExpiredSession:
+            if self._connection_object is None:
+                raise
+            await self._refresh_session(session_id)
+            response = await call_salesforce(
+                self.client, method, f"{self.base_url}{path}", self.headers, **kwargs
+            )
+        return response.json() if response.content else None
+
+    async def query(self, query: str) -> dict:
+        return await self.restful("query/", params={"q": query})
+
+    async def create(self, object_name: str, data: dict) -> dict:
+        return await self.restful(
+            f"sobjects/{object_name}/", "POST", content=json.dumps(data)
+        )
+
+    async def update(self, object_name: str, record_id: str, data: dict):
+        await self.restful(
+            f"sobjects/{object_name}/{record_id}", "PATCH", content=json.dumps(data)
+        )
+
+    async def get(self, object_name: str, record_id: str) -> dict:
+        return await self.restful(f"sobjects/{object_name}/{record_id}")
+
+    @property
+    def bulk(self) -> AsyncSFBulkHandler:
+        return AsyncSFBulkHandler(
+            self.session_id, self.bulk_url, self.client, salesforce=self
+        )
+
+    @property
+    def bulk2(self) -> AsyncSFBulk2Handler:
+        return AsyncSFBulk2Handler(
+            self.session_id, self.base_url, self.client, salesforce=self
+        )
+
+    def bulk_v2_query(self, query: str = None, **kwargs) -> AsyncIterator[dict]:
+        """
+        Stream the records of a Bulk API 2.0 query, see AsyncSFBulk2Handler.query
+        """
+        return self.bulk2.query(query, **kwargs)
+
+    async def _get_integration_id(
+        self, integration_name: str, create_missing_integration: bool, use_cache: bool
+    ) -> str:
+        key = (self.sf_instance, self.NAMESPACE, integration_name)
+        cached = KicksawSalesforce.INTEGRATION_CACHE.get(key) if use_cache else None
+        if cached:
+            return cached["Id"]
+
+        integration = f"{self.NAMESPACE}{KicksawSalesforce.INTEGRATION}"
+        results = await self.query(
+            f"Select Id From {integration} Where Name = '{integration_name}'"
+        )
+        if not results["totalSize"] == 1 and create_missing_integration:
+            response = await self.create(
+                integration,
+                {
+                    "Name": integration_name,
+                    f"{self.NAMESPACE}{KicksawSalesforce.LAMBDA_NAME}": None,
+                },
+            )
+            record = {"Id": response["id"]}
+        else:
+            assert (
+                results["totalSize"] == 1
+            ), f"No {integration} named {integration_name}"
+            record = results["records"][0]
+
+        if use_cache:
+            KicksawSalesforce.INTEGRATION_CACHE.set(key, record)
+        return record["Id"]
+
+    async def _create_execution_object(
+        self,
+        integration_name: str,
+        payload: dict,
+        create_missing_integration: bool,
+        use_cache: bool,
+    ) -> str:
+        integration_id = await self._get_integration_id(
+            integration_name, create_missing_integration, use_cache
+        )
+        execution = {
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION_INTEGRATION}": integration_id,
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}": json.dumps(
+                payload
+            ),
+        }
+        response = await self.create(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}", execution
+        )
+        return response["id"]
+
+    async def update_execution_object_payload(self, payload: Union[dict, list]):
+        data = {
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}": json.dumps(
+                payload
+            ),
+        }
+        await self.update(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}",
+            self.execution_object_id,
+            data,
+        )
+
+    async def get_execution_object(self) -> dict:
+        return await self.get(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}", self.execution_object_id
+        )
+
+    async def log(
+        self,
+        log: str,
+        level: LogLevel,
+        status_code: int = None,
+        associated_entity: str = None,
+    ):
+        """
+        Used for recording custom messages
+        """
+        data = {
+            f"{self.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION}": self.execution_object_id,
+            f"{self.NAMESPACE}{KicksawSalesforce.LOG_MESSAGE}": log,
+            f"{self.NAMESPACE}{KicksawSalesforce.LOG_LEVEL}": level.value,
+        }
+        if status_code:
+            data[f"{self.NAMESPACE}{KicksawSalesforce.STATUS_CODE}"] = status_code
+        if associated_entity:
+            data[
+                f"{self.NAMESPACE}{KicksawSalesforce.ASSOCIATED_ENTITY}"
+            ] = associated_entity
+
+        await self.create(f"{self.NAMESPACE}{KicksawSalesforce.LOG}", data)
+
+    async def handle_exception(self, message: str):
+        """
+        After this is called, caller should throw Exception
+        """
+        data = {
+            f"{self.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}": False,
+            f"{self.NAMESPACE}{KicksawSalesforce.ERROR_MESSAGE}": message,
+        }
+        await self.update(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}",
+            self.execution_object_id,
+            data,
+        )
+
+    async def complete_execution(self, response_payload: dict = None):
+        """
+        Call at the very end of the integration
+        """
+        data = {f"{self.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}": True}
+        if response_payload:
+            data[f"{self.NAMESPACE}{KicksawSalesforce.RESPONSE_PAYLOAD}"] = json.dumps(
+                response_payload
+            )
+        await self.update(
+            f"{self.NAMESPACE}{KicksawSalesforce.EXECUTION}",
+            self.execution_object_id,
+            data,
+        )
+
+
+def _session_key(connection_object: ConnectionObject) -> tuple:
+    return tuple(sorted(connection_object.items()))
+
+
+async def _login(connection_object: ConnectionObject, use_cache: bool) -> tuple:
+    """
+    salesforce_login, run on the default executor
+    """
+    key = _session_key(connection_object)
+    cached = KicksawSalesforce.SESSION_CACHE.get(key) if use_cache else None
+    if cached:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(None, salesforce_login, connection_object)
+    if use_cache:
+        KicksawSalesforce.SESSION_CACHE.set(key, session)
+    return session
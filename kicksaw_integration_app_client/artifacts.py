@@ -0,0 +1,59 @@
+"""
+Where detail files, e.g. of aggregated integration errors, are kept
+
+A store takes a finished local file and returns the uri it can be found at
+"""
+
+import os
+import shutil
+import tempfile
+
+from typing import Protocol
+
+
+class ArtifactStore(Protocol):
+    def save(self, path: str, name: str) -> str:
+        """
+        Take over the file at path, returning where it was stored
+        """
+
+
+class LocalArtifactStore:
+    """
+    Keeps artifacts in a local directory, the system's temporary one by default
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "kicksaw-integration-artifacts"
+        )
+
+    def save(self, path: str, name: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        destination = os.path.join(self.directory, name)
+        shutil.move(path, destination)
+        return destination
+
+
+class S3ArtifactStore:
+    """
+    Uploads artifacts to S3, or any S3-compatible storage through a boto3 client
+    created with its endpoint_url
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client
+
+    def save(self, path: str, name: str) -> str:
+        key = f"{self.prefix}{name}"
+        try:
+            self.client.upload_file(path, self.bucket, key)
+        finally:
+            os.remove(path)
+        return f"s3://{self.bucket}/{key}"
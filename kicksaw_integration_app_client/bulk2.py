@@ -0,0 +1,771 @@
+"""
+Classes for interacting with the Salesforce Bulk API 2.0
+
+These mirror simple-salesforce's SFBulkHandler and SFBulkType, so that
+`salesforce.bulk2.Account.upsert(...)` reads like its Bulk 1.0 counterpart
+and `salesforce.bulk2.query(...)` streams the results of a query job
+"""
+
+import codecs
+import csv
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+from simple_salesforce.util import call_salesforce
+
+from kicksaw_integration_app_client.tables import TableRecords, as_records
+
+logger = logging.getLogger(__name__)
+
+# Bulk 2.0 reads this value as "set the field to null"
+NULL_VALUE = "#N/A"
+
+# csv only accepts NUL characters from Python 3.11 on
+CSV_REJECTS_NUL = sys.version_info < (3, 11)
+NUL_PLACEHOLDER = "\uffff"
+
+# bytes read at a time from streamed responses
+CHUNK_SIZE = 1 << 16
+
+
+class SFBulk2Handler:
+    """
+    Bulk API 2.0 request handler, allows for `sf.bulk2.Contact.insert(...)`
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        base_url: str,
+        proxies: Optional[dict] = None,
+        session: Optional[requests.Session] = None,
+    ):
+        self.session_id = session_id
+        self.session = session or requests.Session()
+        self.base_url = base_url
+        # don't wipe out original proxies with None
+        if not session and proxies is not None:
+            self.session.proxies = proxies
+
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.session_id}",
+        }
+
+    def __getattr__(self, name: str) -> "SFBulk2Type":
+        return SFBulk2Type(
+            object_name=name,
+            base_url=self.base_url,
+            headers=self.headers,
+            session=self.session,
+        )
+
+    def query(
+        self,
+        query: Optional[str] = None,
+        max_records: int = 10000,
+        job_id: Optional[str] = None,
+        locator: Optional[str] = None,
+        include_deleted: bool = False,
+        checkpoint: Optional[Callable[[dict], None]] = None,
+        wait: float = 30,
+        prefetch: int = 0,
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Query Salesforce using the Bulk 2.0 API.
+
+        Result pages are streamed and parsed as they arrive, so only the row
+        being processed is held in memory.
+
+        Parameters
+        ----------
+        query : str, optional
+            SOQL query. Must be specified if job_id is not specified, by default None.
+        max_records : int, optional
+            Maximum number of records to return per page, by default 10000.
+        job_id : str, optional
+            Job ID. Use this parameter to resume a previously scheduled query.
+            Must be specified if query is not specified, by default None.
+        locator : str, optional
+            Locator of the first page to read, taken from a checkpoint,
+            by default None which starts with the first page.
+        include_deleted : bool, optional
+            Run the query as queryAll, by default False.
+        checkpoint : callable, optional
+            Called with {"job_id": ..., "locator": ..., "done": ...} once the job is
+            scheduled and after every fully consumed page. Passing job_id and locator
+            back in resumes the query right after the last consumed page.
+        wait : float, optional
+            Longest pause between two job status checks in seconds, by default 30.
+        prefetch : int, optional
+            Number of result pages to download ahead of the consumer on a background
+            thread, by default 0 which fetches every page once the previous one
+            has been consumed. Memory use grows by up to this many pages.
+
+        Yields
+        ------
+        dict[str, str]
+            Single record.
+
+        """
+        for chunks in self._query_pages(
+            query,
+            max_records=max_records,
+            job_id=job_id,
+            locator=locator,
+            include_deleted=include_deleted,
+            checkpoint=checkpoint,
+            wait=wait,
+            prefetch=prefetch,
+        ):
+            yield from iter_csv_records(chunks)
+
+    def query_batches(
+        self, query: Optional[str] = None, output: str = "columns", **kwargs
+    ) -> Iterator[Any]:
+        """
+        Query Salesforce using the Bulk 2.0 API, yielding every result page
+        as a whole instead of one record at a time
+
+        output is the type of the pages: "columns" for a dict of column name to
+        a list of its values, "arrow" for a pyarrow Table, or "pandas" for a
+        DataFrame. Values are strings just like in the records of query, and the
+        pyarrow and pandas pages are parsed by those libraries.
+
+        Accepts the same keyword arguments as query.
+        """
+        parse = {
+            "columns": csv_columns,
+            "arrow": csv_arrow_table,
+            "pandas": csv_data_frame,
+        }[output]
+        for chunks in self._query_pages(query, **kwargs):
+            yield parse(chunks)
+
+    def query_to_file(
+        self, path: str, query: Optional[str] = None, file_format: str = None, **kwargs
+    ):
+        """
+        Query Salesforce using the Bulk 2.0 API and write the results to a local
+        CSV or Parquet file, without turning them into Python objects
+
+        file_format is "csv" or "parquet", by default taken from the extension of
+        path. Parquet files need pyarrow and hold every column as strings.
+        A new query replaces the file. Resuming a query with job_id and locator
+        adds the remaining pages to the CSV file written so far, Parquet files
+        can't be added to and are only written by new queries.
+
+        Accepts the same keyword arguments as query.
+        """
+        file_format = file_format or path.rsplit(".", 1)[-1].lower()
+        assert file_format in ("csv", "parquet"), f"Unknown file format {file_format}"
+        resuming = kwargs.get("job_id") is not None
+        assert not (
+            resuming and file_format == "parquet"
+        ), "Parquet exports can't be resumed, run the query again instead"
+        pages = self._query_pages(query, **kwargs)
+        if file_format == "parquet":
+            write_parquet(path, map(csv_arrow_table, pages))
+            return
+
+        with open(path, "ab" if resuming else "wb") as file:
+            for chunks in pages:
+                # every page starts with the header, the file needs it once
+                if file.tell():
+                    chunks = skip_header(chunks)
+                for chunk in chunks:
+                    file.write(chunk)
+
+    def _query_pages(
+        self,
+        query: Optional[str] = None,
+        max_records: int = 10000,
+        job_id: Optional[str] = None,
+        locator: Optional[str] = None,
+        include_deleted: bool = False,
+        checkpoint: Optional[Callable[[dict], None]] = None,
+        wait: float = 30,
+        prefetch: int = 0,
+    ) -> Iterator[Iterable[bytes]]:
+        """
+        Run or resume a query job and yield the CSV of every result page in
+        chunks of bytes, calling checkpoint once a page was consumed
+        """
+        assert (query is not None) ^ (
+            job_id is not None
+        ), "Either query or job_id must be specified, but not both"
+
+        url = "/".join([self.base_url.rstrip("/"), "jobs", "query"])
+
+        # Schedule query if job_id is not specified
+        if job_id is None:
+            logger.debug(
+                "Scheduling query '%s'",
+                query[:20] + " ... " + query[-20:] if len(query) > 40 else query,
+            )
+            job_id = call_salesforce(
+                url=url,
+                method="POST",
+                session=self.session,
+                headers=self.headers,
+                data=json.dumps(
+                    {
+                        "query": query,
+                        "operation": "queryAll" if include_deleted else "query",
+                    }
+                ),
+                timeout=30,
+            ).json()["id"]
+            logger.debug("Query scheduled as job '%s'", job_id)
+            if checkpoint:
+                checkpoint({"job_id": job_id, "locator": None, "done": False})
+
+        self._wait_for_job(f"{url}/{job_id}", wait)
+
+        # Iterate over query results
+        results_url = f"{url}/{job_id}/results"
+        if prefetch:
+            pages = self._prefetch_pages(results_url, locator, max_records, prefetch)
+        else:
+            pages = self._iter_pages(results_url, locator, max_records)
+        for chunks, locator in pages:
+            yield chunks
+
+            done = locator == "null"
+            if checkpoint:
+                checkpoint({"job_id": job_id, "locator": locator, "done": done})
+            if done:
+                logger.debug("Reached end of results")
+                break
+
+    def _wait_for_job(self, url: str, wait: float) -> dict:
+        return wait_for_job(self.session, self.headers, url, wait)
+
+    def _get_results_page(
+        self, url: str, locator: Optional[str], max_records: int, stream: bool
+    ) -> requests.Response:
+        if locator is None:
+            logger.debug("Fetching first chunk")
+        else:
+            logger.debug("Fetching chunk with locator '%s'", locator)
+        return call_salesforce(
+            url=url,
+            method="GET",
+            session=self.session,
+            headers=self.headers,
+            params={"locator": locator, "maxRecords": max_records},
+            timeout=60,
+            stream=stream,
+        )
+
+    def _iter_pages(
+        self, url: str, locator: Optional[str], max_records: int
+    ) -> Iterator[Tuple[Iterable[bytes], str]]:
+        """
+        Fetch result pages one after another, streaming each page's body
+        """
+        while True:
+            response = self._get_results_page(url, locator, max_records, stream=True)
+            locator = response.headers["Sforce-Locator"]
+            yield response.iter_content(CHUNK_SIZE), locator
+            if locator == "null":
+                return
+
+    def _prefetch_pages(
+        self, url: str, locator: Optional[str], max_records: int, prefetch: int
+    ) -> Iterator[Tuple[Iterable[bytes], str]]:
+        """
+        Download result pages on a background thread while the consumer works
+        through the current one, keeping at most `prefetch` pages buffered
+        """
+        pages = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(locator):
+            try:
+                while locator != "null":
+                    response = self._get_results_page(
+                        url, locator, max_records, stream=False
+                    )
+                    locator = response.headers["Sforce-Locator"]
+                    if not put(([response.content], locator)):
+                        return
+            except Exception as exception:
+                put((exception, None))
+
+        fetcher = threading.Thread(target=fetch, args=(locator,), daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                chunks, locator = pages.get()
+                if isinstance(chunks, Exception):
+                    raise chunks
+                yield chunks, locator
+                if locator == "null":
+                    return
+        finally:
+            stop.set()
+
+
+class SFBulk2Type:
+    """
+    Interface to the Bulk API 2.0 ingest functions
+
+    Data is uploaded as CSV in a single request per job and batched server-side.
+    Every operation returns the final state of the jobs it ran
+    """
+
+    # Bulk 2.0 accepts up to 150MB of base64 encoded CSV per job,
+    # which leaves roughly 100MB of raw CSV
+    MAX_UPLOAD_SIZE = 100_000_000
+
+    def __init__(
+        self,
+        object_name: str,
+        base_url: str,
+        headers: Dict[str, str],
+        session: requests.Session,
+    ):
+        self.object_name = object_name
+        self.base_url = base_url
+        self.headers = headers
+        self.session = session
+
+    # wait is the longest pause between two job status checks in seconds
+
+    def insert(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return self._ingest("insert", data, wait=wait)
+
+    def upsert(
+        self, data: List[dict], external_id_field: str, wait: float = 5
+    ) -> List[dict]:
+        return self._ingest(
+            "upsert", data, external_id_field=external_id_field, wait=wait
+        )
+
+    def update(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return self._ingest("update", data, wait=wait)
+
+    def delete(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return self._ingest("delete", data, wait=wait)
+
+    def hard_delete(self, data: List[dict], wait: float = 5) -> List[dict]:
+        return self._ingest("hardDelete", data, wait=wait)
+
+    def _ingest(
+        self,
+        operation: str,
+        data: List[dict],
+        external_id_field: Optional[str] = None,
+        wait: float = 5,
+        job_ids: Optional[List[str]] = None,
+        checkpoint: Optional[Callable[[dict], None]] = None,
+    ) -> List[dict]:
+        """
+        Run as many ingest jobs as the upload size limit requires,
+        one after another, and return their final states
+
+        job_ids are the jobs an earlier attempt uploaded the same data to, which are
+        waited for instead of uploading their part again. checkpoint is called with
+        {"job_ids": ...} after every uploaded job
+
+        data is a list of dicts, or a pandas DataFrame or Arrow table
+        """
+        data = as_records(data)
+        if not data:
+            raise ValueError(f"data should not be empty for {operation}")
+
+        job_ids = list(job_ids or ())
+        jobs = list()
+        for index, payload in enumerate(self._csv_payloads(data)):
+            # one line per row after the header, or more if values span lines
+            size = payload.count(b"\n") - 1
+            if index < len(job_ids):
+                logger.debug("Reattaching to job '%s'", job_ids[index])
+                jobs.append(self._wait_for_job(job_ids[index], wait, size))
+                continue
+
+            job = self._create_job(operation, external_id_field)
+            self._upload(job["id"], payload)
+            self._close_job(job["id"])
+            job_ids.append(job["id"])
+            if checkpoint:
+                checkpoint({"job_ids": job_ids})
+            jobs.append(self._wait_for_job(job["id"], wait, size))
+        return jobs
+
+    def _url(self, *parts: str) -> str:
+        return "/".join([self.base_url.rstrip("/"), "jobs", "ingest", *parts])
+
+    def _create_job(self, operation: str, external_id_field: Optional[str]) -> dict:
+        payload = {
+            "object": self.object_name,
+            "operation": operation,
+            "contentType": "CSV",
+            "lineEnding": "LF",
+        }
+        if operation == "upsert":
+            payload["externalIdFieldName"] = external_id_field
+
+        response = call_salesforce(
+            url=self._url(),
+            method="POST",
+            session=self.session,
+            headers=self.headers,
+            data=json.dumps(payload),
+        )
+        job = response.json()
+        logger.debug(
+            "Created %s job '%s' on %s", operation, job["id"], self.object_name
+        )
+        return job
+
+    def _upload(self, job_id: str, payload: bytes):
+        call_salesforce(
+            url=self._url(job_id, "batches"),
+            method="PUT",
+            session=self.session,
+            headers={**self.headers, "Content-Type": "text/csv"},
+            data=payload,
+        )
+
+    def _close_job(self, job_id: str):
+        call_salesforce(
+            url=self._url(job_id),
+            method="PATCH",
+            session=self.session,
+            headers=self.headers,
+            data=json.dumps({"state": "UploadComplete"}),
+        )
+
+    def _get_job(self, job_id: str) -> dict:
+        return call_salesforce(
+            url=self._url(job_id),
+            method="GET",
+            session=self.session,
+            headers=self.headers,
+        ).json()
+
+    def _wait_for_job(
+        self, job_id: str, wait: float, size: Optional[int] = None
+    ) -> dict:
+        """
+        size is the approximate number of rows of the job
+        """
+        return wait_for_job(self.session, self.headers, self._url(job_id), wait)
+
+    def iter_failed_results(self, job_id: str) -> Iterator[Tuple[dict, dict]]:
+        """
+        Stream the failed rows of a job as (payload, error) pairs
+
+        The payload holds the uploaded columns of the row, with empty columns
+        left out and NULL_VALUE turned back into None. The error mirrors the
+        error dicts of Bulk 1.0 results: statusCode, message and fields
+        """
+        response = call_salesforce(
+            url=self._url(job_id, "failedResults/"),
+            method="GET",
+            session=self.session,
+            headers=self.headers,
+            stream=True,
+        )
+        for row in iter_csv_records(response.iter_content(CHUNK_SIZE)):
+            yield failed_result(row)
+
+    def _csv_payloads(self, data: List[dict]) -> Iterator[bytes]:
+        """
+        Serialize data into CSV documents no larger than MAX_UPLOAD_SIZE
+        """
+        if isinstance(data, TableRecords):
+            # every column of a table is set, missing values to null
+            columns = data.column_names
+            row_values = (
+                [_format_value(value) for value in values]
+                for values in data.iter_tuples()
+            )
+        else:
+            columns = list(
+                dict.fromkeys(key for record in data for key in _flatten(record))
+            )
+            row_values = (
+                [
+                    _format_value(flat[column]) if column in flat else ""
+                    for column in columns
+                ]
+                for flat in map(_flatten, data)
+            )
+
+        line = io.StringIO()
+        line_writer = csv.writer(line, lineterminator="\n")
+
+        def format_row(row: list) -> str:
+            line.seek(0)
+            line.truncate()
+            line_writer.writerow(row)
+            return line.getvalue()
+
+        header = format_row(columns)
+        rows = list()
+        size = len(header)
+        for values in row_values:
+            row = format_row(values)
+            if rows and size + len(row) > self.MAX_UPLOAD_SIZE:
+                yield "".join([header, *rows]).encode("utf-8")
+                rows = list()
+                size = len(header)
+            rows.append(row)
+            size += len(row)
+        yield "".join([header, *rows]).encode("utf-8")
+
+
+def poll_intervals(
+    maximum: float, initial: float = 0.5, factor: float = 2
+) -> Iterator[float]:
+    """
+    Exponentially growing pauses between status checks, capped at maximum,
+    so short jobs are picked up quickly and long ones aren't polled needlessly
+    """
+    interval = min(initial, maximum)
+    while True:
+        yield interval
+        interval = min(interval * factor, maximum)
+
+
+def wait_for_job(
+    session: requests.Session, headers: Dict[str, str], url: str, wait: float
+) -> dict:
+    """
+    Poll a Bulk 2.0 job until it completes and return its final state
+    """
+    for interval in poll_intervals(wait):
+        job = call_salesforce(
+            url=url, method="GET", session=session, headers=headers, timeout=30
+        ).json()
+        state = job["state"]
+        if state == "JobComplete":
+            logger.debug("Job '%s' finished with state '%s'", job["id"], state)
+            return job
+        if state in ("Failed", "Aborted"):
+            raise RuntimeError(
+                f"Job '{job['id']}' failed with state '{state}': {job.get('errorMessage')}"
+            )
+        logger.debug(
+            "Job '%s' is in state '%s', sleeping for %s seconds",
+            job["id"],
+            state,
+            interval,
+        )
+        time.sleep(interval)
+
+
+def iter_csv_records(chunks: Iterable[bytes]) -> Iterator[Dict[str, str]]:
+    """
+    Parse CSV arriving in chunks of bytes into one dict per row
+    """
+    lines = iter_lines(chunks)
+    if CSV_REJECTS_NUL:
+        lines = _NulEscaper(lines)
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    for row in reader:
+        if CSV_REJECTS_NUL and lines.seen:
+            row = [value.replace(NUL_PLACEHOLDER, "\0") for value in row]
+        yield dict(zip(header, row))
+
+
+def csv_columns(chunks: Iterable[bytes]) -> Dict[str, List[str]]:
+    """
+    Parse CSV arriving in chunks of bytes into a list of values per column
+    """
+    lines = iter_lines(chunks)
+    if CSV_REJECTS_NUL:
+        lines = _NulEscaper(lines)
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        return dict()
+    columns = [list(values) for values in zip(*reader)] or [[] for _ in header]
+    if CSV_REJECTS_NUL and lines.seen:
+        columns = [
+            [value.replace(NUL_PLACEHOLDER, "\0") for value in values]
+            for values in columns
+        ]
+    return dict(zip(header, columns))
+
+
+def csv_arrow_table(chunks: Iterable[bytes]):
+    """
+    Parse CSV arriving in chunks of bytes into a pyarrow Table of strings
+    """
+    import pyarrow
+    import pyarrow.csv
+
+    data = b"".join(chunks)
+    header = next(
+        csv.reader(io.StringIO(data.split(b"\n", 1)[0].decode("utf-8"))), None
+    )
+    if not header:
+        return pyarrow.table({})
+    return pyarrow.csv.read_csv(
+        io.BytesIO(data),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types={name: pyarrow.string() for name in header},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+        parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+    )
+
+
+def csv_data_frame(chunks: Iterable[bytes]):
+    """
+    Parse CSV arriving in chunks of bytes into a pandas DataFrame of strings
+    """
+    import pandas
+
+    data = b"".join(chunks)
+    if not data.strip():
+        return pandas.DataFrame()
+    return pandas.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+
+
+def write_parquet(path: str, tables: Iterable[Any]):
+    """
+    Write pyarrow Tables sharing one schema into a single Parquet file
+    """
+    import pyarrow.parquet
+
+    writer = None
+    try:
+        for table in tables:
+            if not table.num_columns:
+                continue
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def skip_header(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Drop the first line of CSV arriving in chunks of bytes
+    """
+    chunks = iter(chunks)
+    for chunk in chunks:
+        newline = chunk.find(b"\n")
+        if newline != -1:
+            yield chunk[newline + 1 :]
+            break
+    yield from chunks
+
+
+class _NulEscaper:
+    """
+    Swaps NUL characters out of the lines handed to csv, remembering
+    whether it did so the values can be restored
+    """
+
+    def __init__(self, lines: Iterator[str]):
+        self.lines = lines
+        self.seen = False
+
+    def __iter__(self):
+        for line in self.lines:
+            if "\0" in line:
+                self.seen = True
+                line = line.replace("\0", NUL_PLACEHOLDER)
+            yield line
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decode chunks of bytes into lines that keep their line endings,
+    which lets the csv module handle values with line breaks in them
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def parse_error(error: str) -> dict:
+    """
+    Turn a Bulk 2.0 sf__Error value, e.g. `DUPLICATE_VALUE:duplicate value found:Name`,
+    into the error dict Bulk 1.0 results use
+    """
+    status_code, _, message = error.partition(":")
+    fields = ""
+    if ":" in message:
+        message, fields = message.rsplit(":", 1)
+    return {
+        "statusCode": status_code,
+        "message": message,
+        "fields": [field for field in fields.split(",") if field and field != "--"],
+    }
+
+
+def failed_result(row: Dict[str, str]) -> Tuple[dict, dict]:
+    """
+    Split a row of a job's failed results into the uploaded payload and its error
+    """
+    error = parse_error(row.pop("sf__Error"))
+    row.pop("sf__Id", None)
+    payload = {
+        key: None if value == NULL_VALUE else value
+        for key, value in row.items()
+        if value != ""
+    }
+    return payload, error
+
+
+def _flatten(record: dict) -> Dict[str, object]:
+    """
+    Relationship values, e.g. {"Account__r": {"External_Id__c": "1"}},
+    become dotted columns: {"Account__r.External_Id__c": "1"}
+    """
+    flat = dict()
+    for key, value in record.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                if sub_key != "attributes":
+                    flat[f"{key}.{sub_key}"] = sub_value
+        else:
+            flat[key] = value
+    return flat
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return NULL_VALUE
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
@@ -0,0 +1,148 @@
+"""
+Process-level caches, which survive between invocations of a warm Lambda container
+"""
+
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire ttl seconds after they were set
+
+    With max_size, the least recently used entries make room for new ones
+    """
+
+    def __init__(self, ttl: float, max_size: Optional[int] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        ttl overrides the cache's ttl for this entry
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            if self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DescribeCache:
+    """
+    sObject describes by org, namespace and object, kept for ttl seconds in an LRU
+    cache of max_size entries
+
+    With a path, e.g. under /tmp on Lambda, describes are also kept in a JSON file,
+    so new processes on the same machine don't describe the objects again
+    """
+
+    def __init__(
+        self, ttl: float = 60 * 60, max_size: int = 128, path: Optional[str] = None
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path = path
+        self._memory = TTLCache(ttl, max_size=max_size)
+        # entries of the file by their JSON key, read on the first miss
+        self._stored = None
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key: Tuple[str, ...], fetch: Callable[[], dict]) -> dict:
+        describe = self._memory.get(key)
+        if describe is None:
+            describe = self._load(key)
+        if describe is None:
+            describe = fetch()
+            self._store(key, describe)
+        return describe
+
+    def clear(self):
+        self._memory.clear()
+        with self._lock:
+            self._stored = dict()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _read(self) -> dict:
+        if self._stored is None:
+            try:
+                with open(self.path) as file:
+                    self._stored = json.load(file)
+            except (FileNotFoundError, ValueError):
+                self._stored = dict()
+        return self._stored
+
+    def _load(self, key: Tuple[str, ...]) -> Optional[dict]:
+        if self.path is None:
+            return None
+        with self._lock:
+            entry = self._read().get(json.dumps(key))
+        if entry is None:
+            return None
+        describe, expires_at = entry
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+        self._memory.set(key, describe, ttl=remaining)
+        return describe
+
+    def _store(self, key: Tuple[str, ...], describe: dict):
+        self._memory.set(key, describe)
+        if self.path is None:
+            return
+        with self._lock:
+            now = time.time()
+            stored = {
+                stored_key: entry
+                for stored_key, entry in self._read().items()
+                if entry[1] > now
+            }
+            stored[json.dumps(key)] = [describe, now + self.ttl]
+            # the file keeps the entries expiring last
+            self._stored = dict(
+                sorted(stored.items(), key=lambda item: item[1][1])[-self.max_size :]
+            )
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(f"{self.path}.tmp", "w") as file:
+                json.dump(self._stored, file)
+            os.replace(f"{self.path}.tmp", self.path)
@@ -0,0 +1,223 @@
+"""
+Checkpoints of bulk operations, so a retried step reattaches to the jobs of
+an earlier attempt instead of starting over
+
+An operation is identified by its API, object, operation, upsert key and a hash
+of its data, so repeating the same call with the same data on the same execution
+picks up where the earlier attempt stopped
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from typing import List, Optional, Protocol
+
+
+class CheckpointStore(Protocol):
+    def load(self, execution_id: str) -> dict:
+        """
+        Return the checkpoints saved for the execution, by operation
+        """
+
+    def save(self, execution_id: str, checkpoints: dict):
+        """
+        Replace the checkpoints saved for the execution
+        """
+
+
+class ExecutionPayloadStore:
+    """
+    Keeps checkpoints under a key of the execution payload, next to the
+    payload of the step function
+    """
+
+    def __init__(self, salesforce, key: str = "bulk_checkpoints"):
+        self.salesforce = salesforce
+        self.key = key
+
+    def load(self, execution_id: str) -> dict:
+        execution = self.salesforce.get_execution_object()
+        payload = json.loads(
+            execution[f"{self.salesforce.NAMESPACE}{self.salesforce.EXECUTION_PAYLOAD}"]
+            or "{}"
+        )
+        assert isinstance(payload, dict), "Checkpoints need a dict execution payload"
+        # later saves keep the rest of the payload as it is
+        self.salesforce._execution_payload = payload
+        return payload.get(self.key, {})
+
+    def save(self, execution_id: str, checkpoints: dict):
+        payload = {**self.salesforce._execution_payload, self.key: checkpoints}
+        self.salesforce.update_execution_object_payload(payload)
+        # a checkpoint is only worth something once it's in Salesforce
+        self.salesforce.flush_batch()
+
+
+class LocalCheckpointStore:
+    """
+    Keeps checkpoints in a JSON file per execution, in the system's temporary
+    directory by default. On Lambda, that only helps retries landing on the same
+    warm container
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "kicksaw-integration-checkpoints"
+        )
+
+    def _path(self, execution_id: str) -> str:
+        return os.path.join(self.directory, f"{execution_id}.json")
+
+    def load(self, execution_id: str) -> dict:
+        try:
+            with open(self._path(execution_id)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return dict()
+
+    def save(self, execution_id: str, checkpoints: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(execution_id)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(checkpoints, file)
+        os.replace(f"{path}.tmp", path)
+
+
+def operation_key(
+    api: str,
+    object_name: str,
+    operation: str,
+    external_id_field: Optional[str],
+    data: List[dict],
+) -> str:
+    digest = hashlib.sha256()
+    for record in data:
+        digest.update(json.dumps(record, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\n")
+    return f"{api}:{object_name}:{operation}:{external_id_field or ''}:{digest.hexdigest()[:16]}"
+
+
+class BulkCheckpoints:
+    """
+    The checkpoints of a client's bulk operations, loaded from the store
+    on first use and saved back to it after every step
+    """
+
+    def __init__(self, store: CheckpointStore, salesforce):
+        self.store = store
+        self.salesforce = salesforce
+        self._checkpoints = None
+        self._lock = threading.RLock()
+
+    def get(
+        self,
+        api: str,
+        object_name: str,
+        operation: str,
+        external_id_field: Optional[str],
+        data: List[dict],
+    ) -> "BulkCheckpoint":
+        key = operation_key(api, object_name, operation, external_id_field, data)
+        with self._lock:
+            if self._checkpoints is None:
+                self._checkpoints = self.store.load(self.salesforce.execution_object_id)
+            state = self._checkpoints.setdefault(key, dict())
+        return BulkCheckpoint(self, state, key)
+
+    def update(self, state: dict, **values):
+        """
+        Set values on the state of an operation or job and save every checkpoint
+        """
+        with self._lock:
+            state.update(values)
+            self.store.save(
+                self.salesforce.execution_object_id, copy.deepcopy(self._checkpoints)
+            )
+
+
+class BulkCheckpoint:
+    """
+    What one bulk operation has done so far: the jobs it started and the number
+    of error chunks it pushed
+    """
+
+    def __init__(self, checkpoints: BulkCheckpoints, state: dict, key: str = ""):
+        self.checkpoints = checkpoints
+        self.state = state
+        self.key = key
+
+    def jobs(self, count: int) -> List["JobCheckpoint"]:
+        """
+        Checkpoints of the Bulk 1.0 jobs the operation runs, one per data slice
+        """
+        with self.checkpoints._lock:
+            jobs = self.state.setdefault("jobs", list())
+            jobs.extend(dict() for _ in range(count - len(jobs)))
+        return [JobCheckpoint(self.checkpoints, job) for job in jobs[:count]]
+
+    def stage(self, name: str) -> "BulkCheckpoint":
+        """
+        A checkpoint of its own for a stage of the operation, e.g. its preflight
+        """
+        with self.checkpoints._lock:
+            state = self.state.setdefault(name, dict())
+        return BulkCheckpoint(self.checkpoints, state, f"{self.key}:{name}")
+
+    @property
+    def job_ids(self) -> List[str]:
+        """
+        The Bulk 2.0 jobs uploaded so far
+        """
+        return self.state.get("job_ids", list())
+
+    def set_job_ids(self, job_ids: List[str]):
+        self.checkpoints.update(self.state, job_ids=list(job_ids))
+
+    @property
+    def error_chunks(self) -> int:
+        return self.state.get("error_chunks", 0)
+
+    def count_error_chunk(self):
+        self.checkpoints.update(self.state, error_chunks=self.error_chunks + 1)
+
+    def error_chunk_tag(self, index: int) -> str:
+        """
+        A name for the operation's error chunk at index, safe to use in file names
+        """
+        digest = hashlib.sha256(self.key.encode("utf-8")).hexdigest()[:16]
+        return f"{digest}-{index}"
+
+
+class JobCheckpoint:
+    """
+    A Bulk 1.0 job and the ids of its batches, in the order of the data
+    """
+
+    def __init__(self, checkpoints: BulkCheckpoints, state: dict):
+        self.checkpoints = checkpoints
+        self.state = state
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.state.get("id")
+
+    @property
+    def batches(self) -> List[str]:
+        return self.state.get("batches", list())
+
+    @property
+    def closed(self) -> bool:
+        return self.state.get("closed", False)
+
+    def start(self, job_id: str):
+        self.checkpoints.update(self.state, id=job_id, batches=list(), closed=False)
+
+    def add_batch(self, batch_id: str):
+        self.checkpoints.update(self.state, batches=[*self.batches, batch_id])
+
+    def close(self):
+        self.checkpoints.update(self.state, closed=True)
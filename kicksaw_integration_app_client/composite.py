@@ -0,0 +1,132 @@
+"""
+Batching sObject writes into Composite API requests
+"""
+
+import itertools
+import json
+import re
+import threading
+
+from typing import Any, Dict
+from urllib.parse import quote
+
+from simple_salesforce import Salesforce
+from simple_salesforce.exceptions import SalesforceGeneralError
+
+REFERENCE = re.compile(r"@\{(\w+)\.([^}]+)\}")
+
+
+class CompositeBatch:
+    """
+    Collects sObject writes and sends them through the Composite API
+
+    Every write returns a reference, e.g. `@{record0.id}`, which later writes can use
+    as a field value or record id before the batch is sent. A composite request holds
+    at most 25 subrequests; references to records created by an earlier request are
+    swapped for their actual values before the next request goes out
+
+    Writes and flushes can come from several threads, e.g. a background error upload
+    flushing while the main thread logs. Writes wait for a flush in progress
+    """
+
+    MAX_SUBREQUESTS = 25
+
+    def __init__(self, salesforce: Salesforce):
+        self.salesforce = salesforce
+        self.results = dict()
+        self._subrequests = list()
+        self._counter = itertools.count()
+        # reentrant, a hook logging an http span may add a write mid-flush
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._subrequests)
+
+    def _url(self, path: str) -> str:
+        return f"/services/data/v{self.salesforce.sf_version}/{path}"
+
+    def _add(self, method: str, path: str, body: dict = None, prefix: str = "record"):
+        reference_id = f"{prefix}{next(self._counter)}"
+        subrequest = {
+            "method": method,
+            "url": self._url(path),
+            "referenceId": reference_id,
+        }
+        if body is not None:
+            subrequest["body"] = body
+        with self._lock:
+            self._subrequests.append(subrequest)
+        return reference_id
+
+    def query(self, soql: str) -> str:
+        """
+        Returns the reference id of the query, e.g. for `@{query0.records[0].Id}`
+        """
+        return self._add("GET", f"query?q={quote(soql)}", prefix="query")
+
+    def create(self, object_name: str, data: dict) -> str:
+        """
+        Returns a reference to the id of the record to be created
+        """
+        reference_id = self._add("POST", f"sobjects/{object_name}", data)
+        return f"@{{{reference_id}.id}}"
+
+    def update(self, object_name: str, record_id: str, data: dict):
+        self._add("PATCH", f"sobjects/{object_name}/{record_id}", data)
+
+    def flush(self):
+        """
+        Send every collected write, raising on the first one that failed
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        while self._subrequests:
+            subrequests = self._subrequests[: self.MAX_SUBREQUESTS]
+            self._subrequests = self._subrequests[self.MAX_SUBREQUESTS :]
+
+            response = self.salesforce.restful(
+                "composite",
+                method="POST",
+                data=json.dumps({"allOrNone": False, "compositeRequest": subrequests}),
+            )
+            for subresponse in response["compositeResponse"]:
+                if subresponse["httpStatusCode"] >= 300:
+                    raise SalesforceGeneralError(
+                        self._url("composite"),
+                        subresponse["httpStatusCode"],
+                        subresponse["referenceId"],
+                        subresponse["body"],
+                    )
+                self.results[subresponse["referenceId"]] = subresponse["body"]
+
+            # later requests can't see these references, fill in the actual values
+            self._subrequests = json.loads(self.resolve(json.dumps(self._subrequests)))
+
+    def resolve(self, value: str) -> str:
+        """
+        Replace references to results of sent subrequests with their values
+        """
+
+        def replace(match):
+            reference_id, path = match.groups()
+            if reference_id not in self.results:
+                return match.group(0)
+            return str(_lookup(self.results[reference_id], path))
+
+        return REFERENCE.sub(replace, value)
+
+
+def _lookup(body: Dict[str, Any], path: str) -> Any:
+    """
+    Follow a reference path like `records[0].Id` into a subrequest's response body
+    """
+    value = body
+    for part in path.split("."):
+        name, *indexes = re.split(r"\[(\d+)\]", part)
+        if name:
+            value = value[name]
+        for index in filter(None, indexes):
+            value = value[int(index)]
+    return value
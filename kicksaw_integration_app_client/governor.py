@@ -0,0 +1,184 @@
+"""
+Keeping a client's API usage inside the org's limits
+
+A Governor sits on the session every request of a client goes through, the bulk
+handlers, Bulk 2.0 queries and the job poller included. It reads the org's API
+usage from the Sforce-Limit-Info header of the responses, caps the number of
+concurrent requests, the request rate and the number of concurrent bulk jobs, and
+reports when the budget gets tight, so clients can push their logs in batches
+"""
+
+import logging
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Optional
+
+import requests
+
+from requests.adapters import BaseAdapter
+from simple_salesforce import Salesforce
+
+logger = logging.getLogger(__name__)
+
+
+class Governor:
+    """
+    Paces the requests of one or more clients
+
+    The budget is tight once less than tight_below of the org's daily API requests
+    are left, or of budget, the number of requests these clients may make at most.
+    While it is, requests are sent at most tight_requests_per_second. Otherwise at
+    most max_requests_per_second, if set, and never more than max_concurrent_requests
+    or max_bulk_jobs at a time
+
+    Share one governor between the clients of an org to pace them together
+    """
+
+    def __init__(
+        self,
+        max_requests_per_second: float = None,
+        max_concurrent_requests: int = None,
+        max_bulk_jobs: int = None,
+        budget: int = None,
+        tight_below: float = 0.2,
+        tight_requests_per_second: float = 1.0,
+    ):
+        self.max_requests_per_second = max_requests_per_second
+        self.budget = budget
+        self.tight_below = tight_below
+        self.tight_requests_per_second = tight_requests_per_second
+        self.requests = 0
+        self.active_bulk_jobs = 0
+        # from Sforce-Limit-Info or the limits resource
+        self.api_used = None
+        self.api_max = None
+
+        self._requests = (
+            threading.BoundedSemaphore(max_concurrent_requests)
+            if max_concurrent_requests
+            else None
+        )
+        self._bulk_jobs = (
+            threading.BoundedSemaphore(max_bulk_jobs) if max_bulk_jobs else None
+        )
+        self._lock = threading.Lock()
+        self._next_request = 0.0
+        self._was_tight = False
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """
+        The org's remaining daily API requests, as of the last response reporting them
+        """
+        if self.api_max is None:
+            return None
+        return self.api_max - self.api_used
+
+    @property
+    def tight(self) -> bool:
+        if self.api_max and self.remaining < self.tight_below * self.api_max:
+            return True
+        return bool(self.budget) and (
+            self.budget - self.requests < self.tight_below * self.budget
+        )
+
+    def record_usage(self, used: int, maximum: int):
+        with self._lock:
+            self.api_used, self.api_max = used, maximum
+        tight = self.tight
+        if tight and not self._was_tight:
+            logger.warning(
+                "API budget is tight, %s of %s daily requests used", used, maximum
+            )
+        self._was_tight = tight
+
+    def check_limits(self, salesforce: Salesforce):
+        """
+        Read the org's daily API usage from the limits resource
+        """
+        limits = salesforce.limits()["DailyApiRequests"]
+        self.record_usage(limits["Max"] - limits["Remaining"], limits["Max"])
+
+    def _rate(self) -> Optional[float]:
+        if self.tight:
+            return self.tight_requests_per_second
+        return self.max_requests_per_second
+
+    def _pace(self):
+        """
+        Wait for the request's turn under the current rate
+        """
+        rate = self._rate()
+        with self._lock:
+            self.requests += 1
+            if not rate:
+                return
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            self._next_request = start + 1 / rate
+        if start > now:
+            time.sleep(start - now)
+
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        """
+        Hold one of the request slots while the request is sent
+        """
+        self._pace()
+        with self._requests or nullcontext():
+            yield
+
+    def observe(self, response: requests.Response):
+        limit_info = response.headers.get("Sforce-Limit-Info")
+        if not limit_info:
+            return
+        usage = Salesforce.parse_api_usage(limit_info).get("api-usage")
+        if usage is not None:
+            self.record_usage(usage.used, usage.total)
+
+    @contextmanager
+    def bulk_job(self) -> Iterator[None]:
+        """
+        Hold one of the bulk job slots while a bulk job runs
+        """
+        with self._bulk_jobs or nullcontext():
+            with self._lock:
+                self.active_bulk_jobs += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.active_bulk_jobs -= 1
+
+
+class GovernedAdapter(BaseAdapter):
+    """
+    Sends requests through another transport adapter under a governor
+    """
+
+    def __init__(self, governor: Governor, adapter: BaseAdapter):
+        super().__init__()
+        self.governor = governor
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        with self.governor.request():
+            response = self.adapter.send(request, **kwargs)
+        self.governor.observe(response)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def govern(session: requests.Session, governor: Governor):
+    """
+    Route every request of the session through the governor, keeping the
+    session's transport adapters
+    """
+    for prefix, adapter in list(session.adapters.items()):
+        if isinstance(adapter, GovernedAdapter):
+            adapter = adapter.adapter
+        session.mount(prefix, GovernedAdapter(governor, adapter))
@@ -0,0 +1,127 @@
+"""
+Timings and counters of what a client spends its time and API calls on
+
+A client with instrumentation times every HTTP request and the phases of its bulk
+operations (creating jobs, uploading, waiting, reading results, pushing errors)
+in spans, and counts rows, failed rows, error objects, logs and API calls. The
+totals end up in the execution's response payload, and hooks see every single
+span and count as it happens, e.g. to forward them to a metrics backend
+"""
+
+import logging
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Protocol
+from urllib.parse import urlsplit
+
+import requests
+
+
+class InstrumentationHook(Protocol):
+    def on_span(self, name: str, seconds: float, attributes: dict):
+        """
+        Called when a span ended, with its duration
+        """
+
+    def on_count(self, name: str, value: int, attributes: dict):
+        """
+        Called when a counter was incremented
+        """
+
+
+class LoggingHook:
+    """
+    Logs every span and count, at debug level by default
+    """
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def on_span(self, name, seconds, attributes):
+        self.logger.log(self.level, "%s took %.3fs %s", name, seconds, attributes)
+
+    def on_count(self, name, value, attributes):
+        self.logger.log(self.level, "%s +%s %s", name, value, attributes)
+
+
+class Instrumentation:
+    """
+    Adds up the spans and counts of a client, by name, and passes each of them
+    on to its hooks
+
+    Spans and counts may come from any thread, e.g. parallel bulk jobs,
+    the job poller or background error uploads
+    """
+
+    def __init__(self, hooks: List[InstrumentationHook] = None):
+        self.hooks = list(hooks or ())
+        self.spans = dict()
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: InstrumentationHook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[None]:
+        """
+        Time the block as a span, whether it raises or not
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **attributes)
+
+    def record(self, name: str, seconds: float, **attributes):
+        """
+        Add a span that was timed elsewhere
+        """
+        with self._lock:
+            span = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0})
+            span["count"] += 1
+            span["seconds"] += seconds
+            span["max"] = max(span["max"], seconds)
+        for hook in self.hooks:
+            hook.on_span(name, seconds, attributes)
+
+    def count(self, name: str, value: int = 1, **attributes):
+        with self._lock:
+            self.counters[name] += value
+        for hook in self.hooks:
+            hook.on_count(name, value, attributes)
+
+    def response_hook(self, response: requests.Response, *args, **kwargs):
+        """
+        A requests response hook timing every request of a session as an "http"
+        span and counting it as an API call
+        """
+        attributes = {
+            "method": response.request.method,
+            "path": urlsplit(response.request.url).path,
+            "status": response.status_code,
+        }
+        self.record("http", response.elapsed.total_seconds(), **attributes)
+        self.count("api_calls", **attributes)
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        The totals so far: number, total and longest seconds of every span
+        and the value of every counter
+        """
+        with self._lock:
+            return {
+                "spans": {
+                    name: {
+                        "count": span["count"],
+                        "seconds": round(span["seconds"], 3),
+                        "max_seconds": round(span["max"], 3),
+                    }
+                    for name, span in sorted(self.spans.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
@@ -0,0 +1,288 @@
+"""
+Waiting for bulk jobs through one poller per client
+
+Instead of every waiting thread polling its own job, waiters hand their job to the
+client's JobPoller. A single background thread checks all outstanding jobs, combining
+the checks of jobs of one kind into one request where the API allows it, and wakes
+each waiter as soon as its job is done
+"""
+
+import logging
+import threading
+import time
+
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Protocol
+
+import requests
+
+from simple_salesforce.util import call_salesforce
+
+logger = logging.getLogger(__name__)
+
+# used to guess how long a job of a known size takes before it has shown progress
+EXPECTED_ROWS_PER_SECOND = 2000
+
+BULK_BATCH_DONE_STATES = ("Completed", "Failed", "NotProcessed", "Not Processed")
+BULK2_JOB_DONE_STATES = ("JobComplete", "Failed", "Aborted")
+
+
+class JobKind(Protocol):
+    def fetch(self, keys: List[Hashable]) -> Dict[Hashable, dict]:
+        """
+        Return the current state of every job in keys
+        """
+
+    def is_done(self, info: dict) -> bool:
+        """
+        Whether the job has finished, raising if it failed in a way its waiter can't handle
+        """
+
+    def processed(self, info: dict) -> Optional[int]:
+        """
+        The number of rows processed so far, if the job reports it
+        """
+
+
+class BulkBatches:
+    """
+    Bulk API 1.0 batches, keyed by (job id, batch id)
+
+    The outstanding batches of one job are checked with a single request for
+    the job's batch list
+    """
+
+    def __init__(self, bulk_url: str, headers: Dict[str, str], session):
+        self.bulk_url = bulk_url
+        self.headers = headers
+        self.session = session
+
+    def _get(self, url: str) -> dict:
+        return call_salesforce(
+            url=url, method="GET", session=self.session, headers=self.headers
+        ).json()
+
+    def fetch(self, keys):
+        batch_ids = defaultdict(list)
+        for job_id, batch_id in keys:
+            batch_ids[job_id].append(batch_id)
+
+        infos = dict()
+        for job_id, ids in batch_ids.items():
+            if len(ids) == 1:
+                infos[(job_id, ids[0])] = self._get(
+                    f"{self.bulk_url}job/{job_id}/batch/{ids[0]}"
+                )
+                continue
+            for batch in self._get(f"{self.bulk_url}job/{job_id}/batch")["batchInfo"]:
+                infos[(job_id, batch["id"])] = batch
+        return infos
+
+    def is_done(self, info):
+        return info["state"] in BULK_BATCH_DONE_STATES
+
+    def processed(self, info):
+        return info.get("numberRecordsProcessed")
+
+
+class Bulk2Jobs:
+    """
+    Bulk API 2.0 ingest and query jobs, keyed by their url
+
+    While several jobs of one type are running, a single request for the job list
+    reports their states. Finished jobs are read individually, since only the job
+    itself reports its final row counts
+    """
+
+    def __init__(self, headers: Dict[str, str], session: requests.Session):
+        self.headers = headers
+        self.session = session
+
+    def _get(self, url: str) -> dict:
+        return call_salesforce(
+            url=url, method="GET", session=self.session, headers=self.headers
+        ).json()
+
+    def fetch(self, keys):
+        job_urls = defaultdict(list)
+        for url in keys:
+            job_urls[url.rsplit("/", 1)[0]].append(url)
+
+        infos = dict()
+        for list_url, urls in job_urls.items():
+            if len(urls) > 1:
+                # only the first page, jobs that aren't on it are read one by one
+                listed = {job["id"]: job for job in self._get(list_url)["records"]}
+                for url in urls:
+                    job = listed.get(url.rsplit("/", 1)[1])
+                    if job is not None and job["state"] not in BULK2_JOB_DONE_STATES:
+                        infos[url] = job
+            for url in urls:
+                if url not in infos:
+                    infos[url] = self._get(url)
+        return infos
+
+    def is_done(self, info):
+        state = info["state"]
+        if state in ("Failed", "Aborted"):
+            raise RuntimeError(
+                f"Job '{info['id']}' failed with state '{state}': {info.get('errorMessage')}"
+            )
+        return state == "JobComplete"
+
+    def processed(self, info):
+        return info.get("numberRecordsProcessed")
+
+
+class _PendingJob:
+    def __init__(self, kind: str, key: Hashable, size: Optional[int], wait: float):
+        self.kind = kind
+        self.key = key
+        self.size = size
+        self.max_interval = wait
+        self.interval = None
+        # new jobs are checked right away
+        self.next_check = time.monotonic()
+        self.processed = None
+        self.checked_at = None
+        self.finished = threading.Event()
+        self.info = None
+        self.error = None
+
+
+class JobPoller:
+    """
+    Waits for bulk jobs on behalf of any number of threads
+
+    The pause before a job's next check starts out at the time its size suggests,
+    doubles while the job shows no progress and follows the job's estimated
+    remaining time once it does, within min_interval and the waiter's wait.
+    Jobs due within min_interval of each other are checked together
+    """
+
+    def __init__(self, kinds: Dict[str, JobKind], min_interval: float = 0.5):
+        self.kinds = kinds
+        self.min_interval = min_interval
+        self._pending = list()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def wait(
+        self, kind: str, key: Hashable, size: Optional[int] = None, wait: float = 30
+    ) -> dict:
+        """
+        Block until the job is done and return its final state
+
+        size is the number of rows of the job, if known, and wait
+        the longest pause between two checks of it
+        """
+        job = _PendingJob(kind, key, size, wait)
+        with self._condition:
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+        job.finished.wait()
+        if job.error is not None:
+            raise job.error
+        return job.info
+
+    def _run(self):
+        try:
+            self._poll()
+        except Exception as exception:
+            # the next waiter starts a new thread, the current ones get the error
+            logger.exception("Job poller stopped")
+            with self._condition:
+                pending, self._pending = self._pending, list()
+                self._thread = None
+            for job in pending:
+                job.error = exception
+                job.finished.set()
+
+    def _poll(self):
+        while True:
+            with self._condition:
+                if not self._pending:
+                    # the next waiter starts a new thread
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                next_check = min(job.next_check for job in self._pending)
+                if next_check > now:
+                    # new jobs cut the pause short
+                    self._condition.wait(next_check - now)
+                    continue
+                # checks due shortly are made along with the due ones
+                due = [
+                    job
+                    for job in self._pending
+                    if job.next_check <= now + self.min_interval
+                ]
+
+            finished = self._check(due)
+            with self._condition:
+                self._pending = [job for job in self._pending if job not in finished]
+            for job in finished:
+                job.finished.set()
+
+    def _check(self, due: List[_PendingJob]) -> List[_PendingJob]:
+        """
+        Check the due jobs with as few requests as their kinds allow,
+        returning the ones that are done
+        """
+        jobs_by_kind = defaultdict(list)
+        for job in due:
+            jobs_by_kind[job.kind].append(job)
+
+        finished = list()
+        for kind_name, jobs in jobs_by_kind.items():
+            try:
+                kind = self.kinds[kind_name]
+                infos = kind.fetch([job.key for job in jobs])
+            except Exception as exception:
+                for job in jobs:
+                    job.error = exception
+                finished.extend(jobs)
+                continue
+
+            now = time.monotonic()
+            for job in jobs:
+                # whatever goes wrong with a job is raised in its waiter
+                try:
+                    if job.key not in infos:
+                        raise RuntimeError(f"No state was reported for job '{job.key}'")
+                    job.info = infos[job.key]
+                    done = kind.is_done(job.info)
+                    if not done:
+                        self._reschedule(job, kind.processed(job.info), now)
+                except Exception as exception:
+                    job.error = exception
+                    done = True
+                if done:
+                    finished.append(job)
+        return finished
+
+    def _reschedule(self, job: _PendingJob, processed: Optional[int], now: float):
+        if job.interval is None:
+            interval = (
+                job.size / EXPECTED_ROWS_PER_SECOND if job.size else self.min_interval
+            )
+        elif (
+            job.size
+            and processed is not None
+            and job.processed is not None
+            and processed > job.processed
+        ):
+            rate = (processed - job.processed) / (now - job.checked_at)
+            interval = (job.size - processed) / rate
+        else:
+            interval = job.interval * 2
+
+        job.interval = min(max(interval, self.min_interval), job.max_interval)
+        job.processed = processed
+        job.checked_at = now
+        job.next_check = now + job.interval
+        logger.debug("Checking job '%s' again in %s seconds", job.key, job.interval)
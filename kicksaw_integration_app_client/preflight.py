@@ -0,0 +1,122 @@
+"""
+Finding rows a bulk operation would fail on before they're uploaded
+
+The checks only use an object's describe metadata, so they catch duplicate upsert
+keys, missing required fields and strings longer than their field allows, but
+not e.g. validation rules or triggers
+
+Salesforce only fails rows sharing an upsert key that end up in the same batch, so
+duplicates are looked for batch by batch
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Union
+
+# field types whose values are limited to the field's length
+STRING_TYPES = (
+    "string",
+    "textarea",
+    "email",
+    "url",
+    "phone",
+    "picklist",
+    "multipicklist",
+    "combobox",
+    "encryptedstring",
+)
+
+# the default and largest Bulk 1.0 batch, and the batches Bulk 2.0 splits jobs into
+BATCH_SIZE = 10000
+
+
+def failed_result(errors: List[dict]) -> dict:
+    """
+    A failed row's result, in the shape of Bulk 1.0 results
+    """
+    return {"success": False, "created": False, "id": None, "errors": errors}
+
+
+def find_doomed_rows(
+    records: Iterable[dict],
+    operation: str,
+    external_id_field: Optional[str],
+    describe: dict,
+    batch_size: Union[int, str, None] = BATCH_SIZE,
+) -> Dict[int, List[dict]]:
+    """
+    Return the errors of the rows that would fail, by their position in records
+
+    Every row sharing an upsert key with another row of its batch of batch_size
+    rows fails, or with any other row if batch_size is None. So do inserted rows
+    without a value for a required field, updated or upserted rows setting a
+    required field to null, and strings longer than their field
+
+    batch_size is capped at BATCH_SIZE like simple-salesforce does, and "auto",
+    which lets simple-salesforce size batches, counts as BATCH_SIZE
+    """
+    fields = {field["name"].lower(): field for field in describe["fields"]}
+    required = [
+        field["name"]
+        for field in describe["fields"]
+        if field["createable"]
+        and not field["nillable"]
+        and not field["defaultedOnCreate"]
+        and field["type"] != "boolean"
+    ]
+    check_missing = operation == "insert"
+    if batch_size == "auto":
+        batch_size = BATCH_SIZE
+    elif batch_size is not None:
+        batch_size = min(batch_size, BATCH_SIZE)
+
+    errors = defaultdict(list)
+    rows_by_key = defaultdict(list)
+    for index, record in enumerate(records):
+        if operation == "upsert" and record.get(external_id_field) not in (None, ""):
+            batch = index // batch_size if batch_size else 0
+            rows_by_key[batch, record[external_id_field]].append(index)
+
+        missing = [
+            name
+            for name in required
+            if (check_missing or name in record) and record.get(name) in (None, "")
+        ]
+        if missing:
+            errors[index].append(
+                {
+                    "statusCode": "REQUIRED_FIELD_MISSING",
+                    "message": f"Required fields are missing: [{', '.join(missing)}]",
+                    "fields": missing,
+                }
+            )
+
+        for name, value in record.items():
+            field = fields.get(name.lower())
+            if (
+                field is None
+                or field["type"] not in STRING_TYPES
+                or not field["length"]
+                or not isinstance(value, str)
+                or len(value) <= field["length"]
+            ):
+                continue
+            errors[index].append(
+                {
+                    "statusCode": "STRING_TOO_LONG",
+                    "message": f"{field['label']}: data value too large: {value[:20]}... (max length={field['length']})",
+                    "fields": [field["name"]],
+                }
+            )
+
+    for (_, key), indexes in rows_by_key.items():
+        if len(indexes) < 2:
+            continue
+        for index in indexes:
+            errors[index].append(
+                {
+                    "statusCode": "DUPLICATE_VALUE",
+                    "message": f"Duplicate external id specified: {key}",
+                    "fields": [external_id_field],
+                }
+            )
+    return dict(errors)
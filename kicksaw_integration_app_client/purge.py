@@ -0,0 +1,104 @@
+"""
+Purging old records, e.g. integration errors, with concurrent Bulk 2.0 hard deletes
+"""
+
+import concurrent.futures
+import logging
+import time
+
+from typing import TypedDict
+
+from kicksaw_integration_app_client.bulk2 import SFBulk2Handler
+from kicksaw_integration_app_client.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeReport(TypedDict):
+    queried: int
+    deleted: int
+    failed: int
+    seconds: float
+    rows_per_second: float
+
+
+def purge_records(
+    bulk2: SFBulk2Handler,
+    object_name: str,
+    retention: str = "LAST_N_MONTHS:4",
+    job_size: int = 100_000,
+    max_jobs: int = 4,
+    prefetch: int = 2,
+    hard_delete: bool = True,
+) -> PurgeReport:
+    """
+    Delete every record of object_name created before retention
+
+    The Ids are streamed from a single Bulk 2.0 query while up to max_jobs delete
+    jobs of job_size records each run concurrently, so querying and deleting overlap.
+
+    Parameters
+    ----------
+    bulk2 : SFBulk2Handler
+        Bulk 2.0 handler, use a plain one so failed deletes aren't reported as
+        integration errors.
+    object_name : str
+        API name of the object to purge, including its namespace.
+    retention : str, optional
+        SOQL date literal or datetime, records created before it are deleted,
+        by default "LAST_N_MONTHS:4".
+    job_size : int, optional
+        Number of records per delete job, by default 100,000.
+    max_jobs : int, optional
+        Number of delete jobs running at the same time, by default 4.
+    prefetch : int, optional
+        Number of query result pages downloaded ahead, by default 2.
+    hard_delete : bool, optional
+        Skip the recycle bin, which needs the "Bulk API Hard Delete" permission,
+        by default True.
+
+    Returns
+    -------
+    PurgeReport
+        Record counts and the overall throughput in rows per second.
+
+    """
+    query = f"SELECT Id FROM {object_name} WHERE CreatedDate < {retention}"
+    bulk_type = getattr(bulk2, object_name)
+    delete = bulk_type.hard_delete if hard_delete else bulk_type.delete
+
+    start = time.monotonic()
+    report = PurgeReport(queried=0, deleted=0, failed=0, seconds=0, rows_per_second=0)
+
+    def collect(futures):
+        for future in futures:
+            for job in future.result():
+                failed = job["numberRecordsFailed"]
+                report["deleted"] += job["numberRecordsProcessed"] - failed
+                report["failed"] += failed
+        elapsed = time.monotonic() - start
+        logger.info(
+            "Deleted %s %s records (%s failed), %.0f rows per second",
+            report["deleted"],
+            object_name,
+            report["failed"],
+            report["deleted"] / elapsed if elapsed else 0,
+        )
+
+    ids = ({"Id": record["Id"]} for record in bulk2.query(query, prefetch=prefetch))
+    pending = set()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs) as pool:
+        for chunk in chunked(ids, job_size):
+            report["queried"] += len(chunk)
+            if len(pending) >= max_jobs:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                collect(done)
+            pending.add(pool.submit(delete, chunk))
+        collect(concurrent.futures.wait(pending).done)
+
+    report["seconds"] = time.monotonic() - start
+    if report["seconds"]:
+        report["rows_per_second"] = report["deleted"] / report["seconds"]
+    return report
@@ -0,0 +1,205 @@
+"""
+Spooling error objects to local disk before they're pushed to Salesforce
+
+With a spool, the errors of failed bulk rows survive Salesforce being unavailable or
+throttling the client. Error objects are appended to compressed segments on disk
+first and drained from there in chunks as large as a bulk batch allows. Whatever
+couldn't be pushed stays spooled for the next drain, e.g. in the retry of the step
+"""
+
+import contextlib
+import gzip
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from typing import Callable, Iterator, List, Tuple
+
+import requests
+
+from simple_salesforce.exceptions import (
+    SalesforceGeneralError,
+    SalesforceRefusedRequest,
+)
+
+from kicksaw_integration_app_client.utils import chunked_by_size
+
+logger = logging.getLogger(__name__)
+
+# REQUEST_LIMIT_EXCEEDED comes as a refused request, outages as general errors
+TRANSIENT_ERRORS = (
+    SalesforceRefusedRequest,
+    SalesforceGeneralError,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+
+
+class ErrorSpool:
+    """
+    Error objects of every execution in segments of their own directory, each
+    segment a gzipped JSON lines file written in one go, so a crash never leaves
+    half a segment behind
+
+    Drains push the spooled error objects in order and remember how far they got,
+    so a drain picking up after a failed one doesn't push anything twice, unless
+    the failed one stopped between pushing a chunk and recording it
+
+    Segments can be tagged, to tell whether a chunk is still spooled
+    """
+
+    SEGMENT_SUFFIX = ".jsonl.gz"
+
+    def __init__(
+        self,
+        directory: str = None,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "kicksaw-error-spool"
+        )
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+
+    def _path(self, execution_id: str, *parts: str) -> str:
+        return os.path.join(self.directory, execution_id, *parts)
+
+    def segments(self, execution_id: str) -> List[str]:
+        """
+        Names of the execution's segments, oldest first
+        """
+        try:
+            names = os.listdir(self._path(execution_id))
+        except FileNotFoundError:
+            return list()
+        return sorted(name for name in names if name.endswith(self.SEGMENT_SUFFIX))
+
+    def holds(self, execution_id: str, tag: str) -> bool:
+        """
+        Whether a segment with the given tag wasn't fully drained yet
+        """
+        return any(
+            segment[: -len(self.SEGMENT_SUFFIX)].partition("-")[2] == tag
+            for segment in self.segments(execution_id)
+        )
+
+    def append(self, execution_id: str, error_objects: List[dict], tag: str = None):
+        """
+        Write error objects to a new segment of the execution
+        """
+        lines = "".join(
+            json.dumps(error_object) + "\n" for error_object in error_objects
+        )
+        with self._lock:
+            os.makedirs(self._path(execution_id), exist_ok=True)
+            segments = self.segments(execution_id)
+            number = int(segments[-1][:8]) + 1 if segments else 0
+            name = f"{number:08d}-{tag}" if tag else f"{number:08d}"
+            path = self._path(execution_id, f"{name}{self.SEGMENT_SUFFIX}")
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(gzip.compress(lines.encode("utf-8")))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(f"{path}.tmp", path)
+
+    def _progress(self, execution_id: str) -> dict:
+        try:
+            with open(self._path(execution_id, "progress.json")) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"segment": None, "records": 0}
+
+    def _save_progress(self, execution_id: str, segment: str, records: int):
+        path = self._path(execution_id, "progress.json")
+        with open(f"{path}.tmp", "w") as file:
+            json.dump({"segment": segment, "records": records}, file)
+        os.replace(f"{path}.tmp", path)
+
+    def _records(self, execution_id: str) -> Iterator[Tuple[str, int, str]]:
+        """
+        (segment, position in the segment, JSON line) of every record
+        that wasn't drained yet
+        """
+        progress = self._progress(execution_id)
+        for segment in self.segments(execution_id):
+            if progress["segment"] is not None and segment < progress["segment"]:
+                continue
+            skip = progress["records"] if segment == progress["segment"] else 0
+            with gzip.open(self._path(execution_id, segment), "rt") as file:
+                for index, line in enumerate(file):
+                    if index >= skip:
+                        yield segment, index, line
+
+    def drain(
+        self,
+        execution_id: str,
+        push: Callable[[List[dict]], None],
+        chunk_size: int,
+        chunk_bytes: int,
+    ) -> int:
+        """
+        Push the execution's spooled error objects in chunks of at most chunk_size
+        objects and chunk_bytes of JSON, returning how many were pushed
+
+        Chunks failing with a transient error are retried with exponential
+        backoff. After max_attempts, the rest stays spooled for the next drain
+        """
+        with self._lock:
+            pushed = 0
+            records = self._records(execution_id)
+            # the separator in the JSON array of the batch adds one more
+            chunks = chunked_by_size(
+                records, chunk_size, chunk_bytes, lambda record: len(record[2]) + 1
+            )
+            for chunk in chunks:
+                if not self._push(push, [json.loads(line) for _, _, line in chunk]):
+                    logger.warning(
+                        "Left %s error objects of execution %s spooled",
+                        len(chunk),
+                        execution_id,
+                    )
+                    return pushed
+                segment, index, _ = chunk[-1]
+                self._save_progress(execution_id, segment, index + 1)
+                pushed += len(chunk)
+                for drained in self.segments(execution_id):
+                    if drained >= segment:
+                        break
+                    os.remove(self._path(execution_id, drained))
+
+            for segment in self.segments(execution_id):
+                os.remove(self._path(execution_id, segment))
+            if os.path.exists(self._path(execution_id, "progress.json")):
+                os.remove(self._path(execution_id, "progress.json"))
+            # kept if a crashed append left a temporary file behind
+            with contextlib.suppress(OSError):
+                os.rmdir(self._path(execution_id))
+            return pushed
+
+    def _push(self, push: Callable[[List[dict]], None], error_objects: List[dict]):
+        """
+        Push one chunk, returning whether it went through
+        """
+        for attempt in itertools.count(1):
+            try:
+                push(error_objects)
+                return True
+            except TRANSIENT_ERRORS as exception:
+                if attempt >= self.max_attempts:
+                    logger.warning("Pushing error objects failed: %s", exception)
+                    return False
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                logger.info(
+                    "Pushing error objects failed, retrying in %s seconds: %s",
+                    delay,
+                    exception,
+                )
+                time.sleep(delay)
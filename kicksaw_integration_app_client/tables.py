@@ -0,0 +1,152 @@
+"""
+pandas DataFrames and Arrow tables as the data of bulk operations
+
+Neither library is required (the tables extra installs both),
+tables are recognized by their type's module
+"""
+
+import math
+
+from typing import Any, Iterable, Iterator, List, Tuple
+
+# rows turned into Python values at a time
+CHUNK_ROWS = 10000
+
+
+def is_table(data: Any) -> bool:
+    """
+    Whether data is a pandas DataFrame or an Arrow table or record batch
+    """
+    module = type(data).__module__.split(".")[0]
+    if module == "pandas":
+        return hasattr(data, "iloc") and hasattr(data, "columns")
+    return module == "pyarrow" and hasattr(data, "column_names")
+
+
+def as_records(data: Any) -> Any:
+    """
+    Wrap tables in a TableRecords view and leave lists of dicts as they are
+    """
+    return TableRecords(data) if is_table(data) else data
+
+
+class TableRecords:
+    """
+    A list-like view of the rows of a DataFrame or Arrow table
+
+    Slices are views of the table as well, and rows only become dicts a chunk
+    at a time while they're read. Missing values, i.e. None, NaN and NaT, become
+    None, and dates and times their ISO format, just like in a list of dicts
+    ready for JSON
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._pandas = type(table).__module__.split(".")[0] == "pandas"
+
+    @property
+    def column_names(self) -> List[str]:
+        if self._pandas:
+            return [str(column) for column in self.table.columns]
+        return list(self.table.column_names)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            assert step == 1, "Table records can only be sliced contiguously"
+            return TableRecords(self._slice(start, max(start, stop)))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Table records index out of range")
+        return next(self._rows(self._slice(index, index + 1)))
+
+    def __iter__(self) -> Iterator[dict]:
+        for start in range(0, len(self), CHUNK_ROWS):
+            yield from self._rows(self._slice(start, start + CHUNK_ROWS))
+
+    def iter_tuples(self) -> Iterator[Tuple]:
+        """
+        The values of every row in the order of column_names, without building dicts
+        """
+        for start in range(0, len(self), CHUNK_ROWS):
+            yield from zip(*self._columns(self._slice(start, start + CHUNK_ROWS)))
+
+    def take(self, indexes: Iterable[int]) -> Iterator[dict]:
+        """
+        The rows at the given positions, in their order
+        """
+        indexes = iter(indexes)
+        while True:
+            chunk = [index for _, index in zip(range(CHUNK_ROWS), indexes)]
+            if not chunk:
+                return
+            if self._pandas:
+                yield from self._rows(self.table.iloc[chunk])
+            else:
+                yield from self._rows(self.table.take(chunk))
+
+    def subset(self, indexes: List[int]) -> "TableRecords":
+        """
+        A view of the rows at the given positions, in their order
+        """
+        if self._pandas:
+            return TableRecords(self.table.iloc[indexes])
+        return TableRecords(self.table.take(indexes))
+
+    def _slice(self, start: int, stop: int):
+        if self._pandas:
+            return self.table.iloc[start:stop]
+        return self.table.slice(start, stop - start)
+
+    def _rows(self, table) -> Iterator[dict]:
+        names = self.column_names
+        for values in zip(*self._columns(table)):
+            yield dict(zip(names, values))
+
+    def _columns(self, table) -> List[list]:
+        if self._pandas:
+            columns = [
+                table[column].astype(object).where(table[column].notna(), None)
+                for column in table.columns
+            ]
+            return [
+                [_python_value(value) for value in column.tolist()]
+                for column in columns
+            ]
+        return [
+            [_python_value(value) for value in table.column(index).to_pylist()]
+            for index in range(table.num_columns)
+        ]
+
+
+def iter_rows(data: Any, indexes: Iterable[int]) -> Iterator[dict]:
+    """
+    The records of data at the given positions, in their order
+    """
+    if isinstance(data, TableRecords):
+        return data.take(indexes)
+    return (data[index] for index in indexes)
+
+
+def select(data: Any, indexes: List[int]) -> Any:
+    """
+    The records of data at the given positions, as records of the same kind
+    """
+    if isinstance(data, TableRecords):
+        return data.subset(indexes)
+    return [data[index] for index in indexes]
+
+
+def _python_value(value: Any) -> Any:
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        # numpy scalars
+        return value.item()
+    return value
@@ -0,0 +1,83 @@
+import json
+
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# types orjson writes exactly like json.dumps does, whitespace aside
+_ORJSON_SCALARS = frozenset((str, int, bool, type(None)))
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Split an iterable into lists of at most size items without materializing it
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def chunked_by_size(
+    iterable: Iterable,
+    size: Optional[int],
+    max_bytes: int,
+    measure: Callable[[Any], int],
+) -> Iterator[list]:
+    """
+    Like chunked, but a chunk also ends before the measured sizes of its items
+    exceed max_bytes. An item larger than max_bytes gets a chunk of its own
+
+    With size None, chunks are only limited by max_bytes
+    """
+    chunk = list()
+    chunk_bytes = 0
+    for item in iterable:
+        item_bytes = measure(item)
+        if chunk and (
+            (size is not None and len(chunk) >= size)
+            or chunk_bytes + item_bytes > max_bytes
+        ):
+            yield chunk
+            chunk = list()
+            chunk_bytes = 0
+        chunk.append(item)
+        chunk_bytes += item_bytes
+    if chunk:
+        yield chunk
+
+
+def dumps(value: Any) -> str:
+    """
+    Same output as json.dumps(value), but produced by orjson where it can match it
+    exactly: flat dicts of strings, ints, booleans and None without anything to escape
+
+    Everything else, and everything when orjson isn't installed, goes to json.dumps
+    """
+    if (
+        orjson is not None
+        and type(value) is dict
+        and all(map(_ORJSON_SCALARS.__contains__, map(type, value.values())))
+    ):
+        try:
+            serialized = orjson.dumps(value).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bit or keys that aren't strings
+            return json.dumps(value)
+        # nothing was escaped, every `":` ends a key and every `,"` separates
+        # two items, so adding json.dumps' spaces can't touch a string's contents
+        if (
+            serialized.isascii()
+            and "\\" not in serialized
+            and "\x7f" not in serialized
+            and serialized.count('":') == len(value)
+            and serialized.count(',"') == len(value) - 1
+        ):
+            return serialized.replace('":', '": ').replace(',"', ', "')
+    return json.dumps(value)
@@ -0,0 +1,366 @@
+"""
+Endpoints simple_mockforce doesn't cover yet, registered on top of it with responses
+"""
+
+import csv
+import io
+import json
+import re
+import uuid
+
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+import requests
+import responses
+
+from simple_mockforce.constants import BASE_URL, BATCH_URL, SF_VERSION
+from simple_mockforce.virtual import virtual_salesforce
+
+COMPOSITE_URL = f"{BASE_URL}/services/data/v{SF_VERSION}/composite$"
+COMPOSITE_SOBJECTS_URL = f"{BASE_URL}/services/data/v{SF_VERSION}/composite/sobjects$"
+INGEST_URL = f"{BASE_URL}/services/data/v{SF_VERSION}/jobs/ingest"
+QUERY_JOB_URL = f"{BASE_URL}/services/data/v{SF_VERSION}/jobs/query"
+
+# Bulk 2.0 ingest jobs by id
+ingest_jobs = dict()
+# Bulk 2.0 query jobs by id
+query_jobs = dict()
+
+
+def composite_sobjects_callback(request):
+    body = json.loads(request.body)
+
+    results = list()
+    for record in body["records"]:
+        record = dict(record)
+        sobject = record.pop("attributes")["type"]
+        id_ = virtual_salesforce.create(sobject, record)
+        results.append({"id": id_, "success": True, "errors": []})
+
+    return 200, {}, json.dumps(results)
+
+
+def _resolve_references(value, results):
+    def replace(match):
+        body = results[match.group(1)]
+        # only the reference paths used by the client
+        if match.group(2) == "records[0].Id":
+            return body["records"][0]["Id"]
+        return body[match.group(2)]
+
+    return json.loads(re.sub(r"@\{(\w+)\.([^}]+)\}", replace, json.dumps(value)))
+
+
+def composite_callback(request):
+    """
+    Runs the subrequests in order, resolving references to earlier ones
+    """
+    body = json.loads(request.body)
+
+    results = dict()
+    responses_ = list()
+    for subrequest in body["compositeRequest"]:
+        subrequest = _resolve_references(subrequest, results)
+        path = urlparse(subrequest["url"]).path.split("/")
+        sobject = path[path.index("sobjects") + 1] if "sobjects" in path else None
+
+        if subrequest["method"] == "GET":
+            query = parse_qs(urlparse(subrequest["url"]).query)["q"][0]
+            records = virtual_salesforce.query(query)
+            status, result = 200, {
+                "totalSize": len(records),
+                "done": True,
+                "records": records,
+            }
+        elif subrequest["method"] == "POST":
+            id_ = virtual_salesforce.create(sobject, subrequest["body"])
+            status, result = 201, {"id": id_, "success": True, "errors": []}
+        else:
+            virtual_salesforce.update(sobject, path[-1], subrequest["body"])
+            status, result = 204, None
+
+        results[subrequest["referenceId"]] = result
+        responses_.append(
+            {
+                "body": result,
+                "httpHeaders": {},
+                "httpStatusCode": status,
+                "referenceId": subrequest["referenceId"],
+            }
+        )
+
+    return 200, {}, json.dumps({"compositeResponse": responses_})
+
+
+def mock_composite_endpoints():
+    """
+    Call from inside a test decorated with @mock_salesforce
+    """
+    responses.add_callback(
+        responses.POST,
+        re.compile(COMPOSITE_URL),
+        callback=composite_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.POST,
+        re.compile(COMPOSITE_SOBJECTS_URL),
+        callback=composite_sobjects_callback,
+        content_type="application/json",
+    )
+
+
+def _job_id(request):
+    return re.search(r"jobs/ingest/([^/]+)", request.url).group(1)
+
+
+def ingest_create_callback(request):
+    body = json.loads(request.body)
+    job = {
+        "id": uuid.uuid4().hex[:18],
+        "object": body["object"],
+        "operation": body["operation"],
+        "externalIdFieldName": body.get("externalIdFieldName"),
+        "state": "Open",
+        "numberRecordsProcessed": 0,
+        "numberRecordsFailed": 0,
+    }
+    ingest_jobs[job["id"]] = {"info": job, "csv": "", "failed": list()}
+    return 200, {}, json.dumps(job)
+
+
+def ingest_upload_callback(request):
+    body = request.body
+    ingest_jobs[_job_id(request)]["csv"] = (
+        body.decode("utf-8") if isinstance(body, bytes) else body
+    )
+    return 201, {}, ""
+
+
+def ingest_close_callback(request):
+    """
+    Processes the uploaded rows right away, failing duplicate upsert keys
+    just like simple_mockforce does for Bulk 1.0
+    """
+    job = ingest_jobs[_job_id(request)]
+    info = job["info"]
+    rows = list(csv.DictReader(io.StringIO(job["csv"])))
+    upsert_key = info["externalIdFieldName"]
+    key_counts = Counter(row[upsert_key] for row in rows) if upsert_key else Counter()
+
+    for row in rows:
+        record = {
+            key: None if value == "#N/A" else value
+            for key, value in row.items()
+            if value != ""
+        }
+        if upsert_key and key_counts[row[upsert_key]] > 1:
+            job["failed"].append(
+                {
+                    "sf__Id": "",
+                    "sf__Error": "DUPLICATE_EXTERNAL_ID:A user-specified external ID matches more than one record during an upsert.:--",
+                    **row,
+                }
+            )
+        elif info["operation"] == "upsert":
+            virtual_salesforce.upsert(
+                info["object"], record[upsert_key], record, upsert_key
+            )
+        elif info["operation"] == "insert":
+            virtual_salesforce.create(info["object"], record)
+        elif info["operation"] == "update":
+            virtual_salesforce.update(info["object"], record["Id"], record)
+        elif info["operation"] in ("delete", "hardDelete"):
+            virtual_salesforce.delete(info["object"], record["Id"])
+
+    info["state"] = "JobComplete"
+    info["numberRecordsProcessed"] = len(rows)
+    info["numberRecordsFailed"] = len(job["failed"])
+    return 200, {}, json.dumps(info)
+
+
+def ingest_job_callback(request):
+    return 200, {}, json.dumps(ingest_jobs[_job_id(request)]["info"])
+
+
+def ingest_list_callback(request):
+    jobs = [job["info"] for job in ingest_jobs.values()]
+    return 200, {}, json.dumps({"done": True, "records": jobs, "nextRecordsUrl": None})
+
+
+def ingest_failed_results_callback(request):
+    failed = ingest_jobs[_job_id(request)]["failed"]
+    buffer = io.StringIO()
+    if failed:
+        writer = csv.DictWriter(buffer, fieldnames=list(failed[0].keys()))
+        writer.writeheader()
+        writer.writerows(failed)
+    return 200, {}, buffer.getvalue()
+
+
+def mock_bulk2_endpoints():
+    """
+    Call from inside a test decorated with @mock_salesforce
+    """
+    ingest_jobs.clear()
+    responses.add_callback(
+        responses.POST,
+        re.compile(f"{INGEST_URL}$"),
+        callback=ingest_create_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.PUT,
+        re.compile(f"{INGEST_URL}/[^/]+/batches$"),
+        callback=ingest_upload_callback,
+    )
+    responses.add_callback(
+        responses.PATCH,
+        re.compile(f"{INGEST_URL}/[^/]+$"),
+        callback=ingest_close_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.GET,
+        re.compile(f"{INGEST_URL}/[^/]+$"),
+        callback=ingest_job_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.GET,
+        re.compile(f"{INGEST_URL}$"),
+        callback=ingest_list_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.GET,
+        re.compile(f"{INGEST_URL}/[^/]+/failedResults/$"),
+        callback=ingest_failed_results_callback,
+        content_type="text/csv",
+    )
+
+
+def _query_job_id(request):
+    return re.search(r"jobs/query/([^/?]+)", request.url).group(1)
+
+
+def query_create_callback(request):
+    body = json.loads(request.body)
+    job = {
+        "id": uuid.uuid4().hex[:18],
+        "operation": body["operation"],
+        "query": body["query"],
+        # the first status check reports the job as still running
+        "state": "InProgress",
+    }
+    records = virtual_salesforce.query(
+        body["query"], include_deleted=body["operation"] == "queryAll"
+    )
+    query_jobs[job["id"]] = {"info": job, "records": records, "status_checks": 0}
+    return 200, {}, json.dumps(job)
+
+
+def query_job_callback(request):
+    job = query_jobs[_query_job_id(request)]
+    job["status_checks"] += 1
+    if job["status_checks"] > 1:
+        job["info"]["state"] = "JobComplete"
+    return 200, {}, json.dumps(job["info"])
+
+
+def query_results_callback(request):
+    """
+    Pages through the records, using the offset of the next page as locator
+    """
+    job = query_jobs[_query_job_id(request)]
+    offset = int(request.params.get("locator") or 0)
+    max_records = int(request.params["maxRecords"])
+
+    records = job["records"]
+    page = records[offset : offset + max_records]
+    fields = [
+        field for field in (records[0] if records else {}) if field != "attributes"
+    ]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(fields)
+    for record in page:
+        writer.writerow(
+            ["" if record[field] is None else record[field] for field in fields]
+        )
+
+    next_offset = offset + max_records
+    locator = str(next_offset) if next_offset < len(records) else "null"
+    return 200, {"Sforce-Locator": locator}, buffer.getvalue()
+
+
+def mock_bulk2_query_endpoints():
+    """
+    Call from inside a test decorated with @mock_salesforce
+    """
+    query_jobs.clear()
+    responses.add_callback(
+        responses.POST,
+        re.compile(f"{QUERY_JOB_URL}$"),
+        callback=query_create_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.GET,
+        re.compile(f"{QUERY_JOB_URL}/[^/]+$"),
+        callback=query_job_callback,
+        content_type="application/json",
+    )
+    responses.add_callback(
+        responses.GET,
+        re.compile(f"{QUERY_JOB_URL}/[^/]+/results"),
+        callback=query_results_callback,
+        content_type="text/csv",
+    )
+
+
+def batch_list_callback(request):
+    job_id = re.search(r"job/([^/]+)/batch$", request.url).group(1)
+    batches = [
+        {**batch, "state": "Completed"}
+        for batch in virtual_salesforce.batches.values()
+        if batch["jobId"] == job_id
+    ]
+    return 200, {}, json.dumps({"batchInfo": batches})
+
+
+def mock_batch_list_endpoint():
+    """
+    Call from inside a test decorated with @mock_salesforce
+    """
+    responses.add_callback(
+        responses.GET,
+        re.compile(f"{BATCH_URL}$"),
+        callback=batch_list_callback,
+        content_type="application/json",
+    )
+
+
+def requests_transport():
+    """
+    An httpx transport sending every request through requests,
+    so the mocks registered with responses answer httpx clients too
+    """
+    import httpx
+
+    def handler(request):
+        response = requests.request(
+            request.method,
+            str(request.url),
+            headers=dict(request.headers),
+            data=request.content,
+        )
+        return httpx.Response(
+            response.status_code,
+            headers=dict(response.headers),
+            content=response.content,
+        )
+
+    return httpx.MockTransport(handler)
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from simple_salesforce.exceptions import SalesforceAuthenticationFailed
+
+import kicksaw_integration_app_client
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce, LogLevel
+from kicksaw_integration_app_client.bulk2 import iter_csv_records
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import (
+    mock_bulk2_endpoints,
+    mock_bulk2_query_endpoints,
+    requests_transport,
+)
+
+httpx = pytest.importorskip("httpx")
+
+from kicksaw_integration_app_client.aio import (  # noqa: E402
+    AsyncKicksawSalesforce,
+    AsyncSFBulkType,
+    _login,
+    _session_key,
+    aiter_csv_records,
+    create_http_client,
+)
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+DATA = [
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+    # note, this is a duplicate id, so this and the first row will fail
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+]
+
+
+def _query_errors(salesforce):
+    return salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )
+
+
+@mock_salesforce(fresh=True)
+def test_async_execution_lifecycle_with_bulk_errors():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+
+    async def run():
+        async with create_http_client(transport=requests_transport()) as client:
+            salesforce = await AsyncKicksawSalesforce.connect(
+                CONNECTION_OBJECT, INTEGRATION_NAME, {"step": 1}, client=client
+            )
+            response = await salesforce.bulk.CustomObject__c.upsert(
+                DATA, "UpsertKey__c", wait=0
+            )
+            await salesforce.log("Upserted", LogLevel.INFO)
+            await salesforce.complete_execution({"done": True})
+            return salesforce.execution_object_id, response
+
+    execution_id, response = asyncio.run(run())
+
+    assert len(response) == 3
+    errors = _query_errors(_salesforce)["records"]
+    assert len(errors) == 2
+    for error in errors:
+        assert (
+            error[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"]
+            == execution_id
+        )
+
+    execution = getattr(
+        _salesforce, f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"
+    ).get(execution_id)
+    assert execution[
+        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}"
+    ]
+    logs = _salesforce.query(
+        f"Select Id From {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG}"
+    )
+    assert logs["totalSize"] == 1
+
+
+@mock_salesforce(fresh=True)
+def test_concurrent_async_executions_share_a_pool():
+    mock_bulk2_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+
+    async def run_execution(client):
+        salesforce = await AsyncKicksawSalesforce.connect(
+            CONNECTION_OBJECT, INTEGRATION_NAME, {}, client=client
+        )
+        await salesforce.bulk2.CustomObject__c.upsert(DATA, "UpsertKey__c", wait=0)
+        await salesforce.complete_execution()
+        return salesforce.execution_object_id
+
+    async def run():
+        async with create_http_client(transport=requests_transport()) as client:
+            return await asyncio.gather(*(run_execution(client) for _ in range(3)))
+
+    execution_ids = asyncio.run(run())
+
+    assert len(set(execution_ids)) == 3
+    errors = _query_errors(_salesforce)["records"]
+    assert sorted(
+        error[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"]
+        for error in errors
+    ) == sorted(execution_ids * 2)
+
+
+@mock_salesforce(fresh=True)
+def test_async_bulk_v2_query_streams_and_resumes():
+    mock_bulk2_query_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    for index in range(5):
+        _salesforce.Account.create({"Name": f"Name {index}"})
+
+    async def run():
+        async with create_http_client(transport=requests_transport()) as client:
+            salesforce = await AsyncKicksawSalesforce.connect(
+                CONNECTION_OBJECT,
+                INTEGRATION_NAME,
+                {},
+                execution_object_id="a001",
+                client=client,
+            )
+            checkpoints = list()
+            names = [
+                record["Name"]
+                async for record in salesforce.bulk_v2_query(
+                    "Select Id, Name From Account",
+                    max_records=2,
+                    checkpoint=checkpoints.append,
+                    wait=0,
+                )
+            ]
+            resumed = [
+                record["Name"]
+                async for record in salesforce.bulk_v2_query(
+                    job_id=checkpoints[1]["job_id"],
+                    locator=checkpoints[1]["locator"],
+                    max_records=2,
+                    wait=0,
+                )
+            ]
+            return names, resumed, checkpoints
+
+    names, resumed, checkpoints = asyncio.run(run())
+
+    assert names == [f"Name {index}" for index in range(5)]
+    assert resumed == names[2:]
+    assert [checkpoint["locator"] for checkpoint in checkpoints] == [
+        None,
+        "2",
+        "4",
+        "null",
+    ]
+    assert checkpoints[-1]["done"]
+
+
+def test_async_login_matches_the_sync_client(monkeypatch):
+    attempts = list()
+
+    def login(**config):
+        attempts.append(config)
+        if len(attempts) == 1:
+            raise SalesforceAuthenticationFailed("SERVER_UNAVAILABLE", "Try again")
+        return "session", "instance"
+
+    monkeypatch.setattr(kicksaw_integration_app_client, "SalesforceLogin", login)
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+    connection_object = {**CONNECTION_OBJECT, "domain": "na"}
+    session = asyncio.run(_login(connection_object, use_cache=False))
+
+    assert session == ("session", "instance")
+    # like SfClient, na means the default login domain
+    assert (
+        attempts
+        == [{"username": "fake", "password": "fake", "security_token": "fake"}] * 2
+    )
+
+
+@mock_salesforce(fresh=True)
+def test_async_revoked_cached_session_is_replaced():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    key = _session_key(CONNECTION_OBJECT)
+    KicksawSalesforce.SESSION_CACHE.set(key, ("revoked", "mock.salesforce.com"))
+    transport = requests_transport()
+    rejected = list()
+
+    def handler(request):
+        if request.headers.get("Authorization") == "Bearer revoked":
+            rejected.append(request.url.path)
+            return httpx.Response(
+                401,
+                content=json.dumps(
+                    [
+                        {
+                            "errorCode": "INVALID_SESSION_ID",
+                            "message": "Session expired or invalid",
+                        }
+                    ]
+                ),
+            )
+        return transport.handle_request(request)
+
+    async def run():
+        async with create_http_client(transport=httpx.MockTransport(handler)) as client:
+            salesforce = await AsyncKicksawSalesforce.connect(
+                CONNECTION_OBJECT, INTEGRATION_NAME, {}, use_cache=True, client=client
+            )
+            await salesforce.complete_execution()
+            return salesforce
+
+    try:
+        salesforce = asyncio.run(run())
+    finally:
+        session = KicksawSalesforce.SESSION_CACHE.get(key)
+        KicksawSalesforce.clear_caches()
+
+    assert len(rejected) == 1
+    assert salesforce.session_id != "revoked"
+    assert session == (salesforce.session_id, salesforce.sf_instance)
+
+
+def test_not_processed_batches_are_done():
+    requests = list()
+
+    async def request(method, path, payload=None):
+        requests.append(path)
+        if path.endswith("/result"):
+            return []
+        return {"state": "NotProcessed"}
+
+    bulk_type = AsyncSFBulkType("Account", "url/", {}, client=None)
+    bulk_type._request = request
+
+    assert asyncio.run(bulk_type._batch_results("job", "batch", wait=0)) == []
+    assert requests == ["job/job/batch/batch", "job/job/batch/batch/result"]
+
+
+def test_csv_records_are_parsed_as_chunks_arrive():
+    document = (
+        b'"sf__Id","sf__Error",Name,Description\n'
+        b'"","DUPLICATE_VALUE:duplicate value found:Name","Acme","line\nbreak"\n'
+        b'"","REQUIRED_FIELD_MISSING:Required fields are missing: [Name]:Name",'
+        b'"","has ""quotes"" and \xc3\xa9"\n'
+        b'"","INVALID_FIELD:Bad value:Name","Last","no line break at the end"'
+    )
+    expected = list(iter_csv_records([document]))
+
+    async def parse(size):
+        async def chunks():
+            for start in range(0, len(document), size):
+                yield document[start : start + size]
+
+        return [record async for record in aiter_csv_records(chunks())]
+
+    for size in (1, 2, 7, 64, len(document)):
+        assert asyncio.run(parse(size)) == expected
@@ -0,0 +1,270 @@
+import csv
+import json
+import pytest
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+from kicksaw_integration_app_client.bulk2 import (
+    SFBulk2Type,
+    parse_error,
+    poll_intervals,
+)
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_bulk2_endpoints, mock_bulk2_query_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+@mock_salesforce(fresh=True)
+def test_bulk2_upsert_reports_failed_results():
+    mock_bulk2_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    data = [
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+        # note, this is a duplicate id, so this and the first row will fail
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    ]
+    jobs = salesforce.bulk2.CustomObject__c.upsert(data, "UpsertKey__c", wait=0)
+
+    assert len(jobs) == 1
+    assert jobs[0]["numberRecordsProcessed"] == 3
+    assert jobs[0]["numberRecordsFailed"] == 2
+
+    response = salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OPERATION},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )
+    assert response["totalSize"] == 2
+    for record in response["records"]:
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"]
+            == salesforce.execution_object_id
+        )
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OPERATION}"]
+            == "upsert"
+        )
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE}"]
+            == "DUPLICATE_EXTERNAL_ID"
+        )
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}"]
+            == "1a2b3c"
+        )
+        assert json.loads(
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}"]
+        ) == {"UpsertKey__c": "1a2b3c", "Name": "Name 1"}
+
+
+def test_csv_payloads_split_on_upload_size():
+    bulk_type = SFBulk2Type("Account", "", {}, None)
+    bulk_type.MAX_UPLOAD_SIZE = 60
+
+    data = [
+        {"Name": "First", "Parent__r": {"External_Id__c": "1"}},
+        {"Name": None, "Active__c": True},
+        {"Name": "Third"},
+    ]
+    payloads = [payload.decode("utf-8") for payload in bulk_type._csv_payloads(data)]
+
+    header = "Name,Parent__r.External_Id__c,Active__c\n"
+    assert payloads == [
+        header + "First,1,\n" + "#N/A,,true\n",
+        header + "Third,,\n",
+    ]
+
+
+def test_parse_error():
+    assert parse_error(
+        "REQUIRED_FIELD_MISSING:Required fields are missing: [Name]:Name"
+    ) == {
+        "statusCode": "REQUIRED_FIELD_MISSING",
+        "message": "Required fields are missing: [Name]",
+        "fields": ["Name"],
+    }
+
+
+@mock_salesforce(fresh=True)
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_bulk_v2_query_streams_and_resumes(prefetch):
+    mock_bulk2_query_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    for index in range(5):
+        salesforce.Account.create({"Name": f"Name {index}\nwith a line break"})
+
+    checkpoints = list()
+    records = salesforce.bulk_v2_query(
+        "Select Id, Name From Account",
+        max_records=2,
+        checkpoint=checkpoints.append,
+        wait=0,
+        prefetch=prefetch,
+    )
+    # stop half way, as if the Lambda timed out after the first page
+    first_page = [next(records), next(records)]
+    next(records)
+    records.close()
+
+    assert [record["Name"] for record in first_page] == [
+        "Name 0\nwith a line break",
+        "Name 1\nwith a line break",
+    ]
+    assert checkpoints[-1]["locator"] == "2"
+    assert not checkpoints[-1]["done"]
+
+    resumed = list(
+        salesforce.bulk_v2_query(
+            job_id=checkpoints[-1]["job_id"],
+            locator=checkpoints[-1]["locator"],
+            max_records=2,
+            checkpoint=checkpoints.append,
+            wait=0,
+            prefetch=prefetch,
+        )
+    )
+    assert [record["Name"].split("\n")[0] for record in resumed] == [
+        "Name 2",
+        "Name 3",
+        "Name 4",
+    ]
+    assert checkpoints[-1]["done"]
+
+
+def test_poll_intervals_back_off_exponentially():
+    intervals = poll_intervals(maximum=3, initial=0.5)
+    assert [next(intervals) for _ in range(5)] == [0.5, 1, 2, 3, 3]
+
+
+def _query_client():
+    mock_bulk2_query_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    for index in range(3):
+        salesforce.Account.create({"Name": f"Name {index}\nwith a line break"})
+    return salesforce
+
+
+@mock_salesforce(fresh=True)
+@pytest.mark.parametrize("output", ["columns", "arrow", "pandas"])
+def test_bulk_v2_query_yields_columnar_pages(output):
+    if output == "arrow":
+        pytest.importorskip("pyarrow")
+    if output == "pandas":
+        pytest.importorskip("pandas")
+    salesforce = _query_client()
+
+    pages = list(
+        salesforce.bulk_v2_query(
+            "Select Id, Name From Account", output=output, max_records=2, wait=0
+        )
+    )
+
+    if output == "arrow":
+        pages = [page.to_pydict() for page in pages]
+    elif output == "pandas":
+        pages = [page.to_dict("list") for page in pages]
+    assert [page["Name"] for page in pages] == [
+        ["Name 0\nwith a line break", "Name 1\nwith a line break"],
+        ["Name 2\nwith a line break"],
+    ]
+    assert all(isinstance(value, str) for page in pages for value in page["Id"])
+
+
+@mock_salesforce(fresh=True)
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_bulk_v2_query_to_file(file_format, tmp_path):
+    if file_format == "parquet":
+        pytest.importorskip("pyarrow")
+    salesforce = _query_client()
+    path = str(tmp_path / f"accounts.{file_format}")
+
+    # a new query replaces the file of an earlier one
+    for _ in range(2):
+        salesforce.bulk_v2_query_to_file(
+            path, "Select Id, Name From Account", max_records=2, wait=0
+        )
+
+    if file_format == "csv":
+        with open(path, newline="") as file:
+            records = list(csv.DictReader(file))
+    else:
+        import pyarrow.parquet
+
+        records = pyarrow.parquet.read_table(path).to_pylist()
+    assert [record["Name"] for record in records] == [
+        f"Name {index}\nwith a line break" for index in range(3)
+    ]
+
+
+@mock_salesforce(fresh=True)
+def test_bulk_v2_query_to_file_resumes_csv(tmp_path):
+    salesforce = _query_client()
+    path = str(tmp_path / "accounts.csv")
+    checkpoints = list()
+
+    def checkpoint(state):
+        checkpoints.append(state)
+        # as if the Lambda timed out after writing the first page
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        salesforce.bulk_v2_query_to_file(
+            path,
+            "Select Id, Name From Account",
+            max_records=2,
+            checkpoint=checkpoint,
+            wait=0,
+        )
+    salesforce.bulk_v2_query_to_file(
+        path,
+        job_id=checkpoints[-1]["job_id"],
+        locator=checkpoints[-1]["locator"],
+        max_records=2,
+        wait=0,
+    )
+
+    with open(path, newline="") as file:
+        records = list(csv.DictReader(file))
+    assert [record["Name"] for record in records] == [
+        f"Name {index}\nwith a line break" for index in range(3)
+    ]
+
+    with pytest.raises(AssertionError, match="can't be resumed"):
+        salesforce.bulk_v2_query_to_file(
+            str(tmp_path / "accounts.parquet"),
+            job_id=checkpoints[-1]["job_id"],
+            locator=checkpoints[-1]["locator"],
+            wait=0,
+        )
@@ -0,0 +1,192 @@
+import json
+
+import pytest
+import requests
+import responses
+
+from simple_salesforce.api import SFType
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+from kicksaw_integration_app_client.cache import DescribeCache, TTLCache
+
+from simple_mockforce import mock_salesforce
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    KicksawSalesforce.clear_caches()
+    yield
+    KicksawSalesforce.clear_caches()
+
+
+def _count_calls(path):
+    return sum(path in call.request.url for call in responses.calls)
+
+
+@mock_salesforce(fresh=True)
+def test_warm_instantiation_skips_login_and_integration_query():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+
+    first = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {}, use_cache=True)
+    logins = _count_calls("/services/Soap/u/")
+    queries = _count_calls("/query/")
+
+    second = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {}, use_cache=True)
+
+    assert _count_calls("/services/Soap/u/") == logins
+    assert _count_calls("/query/") == queries
+    assert second.session_id == first.session_id
+    # every instantiation still gets its own execution
+    assert second.execution_object_id != first.execution_object_id
+    response = second.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_INTEGRATION}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}
+        """
+    )
+    assert response["totalSize"] == 2
+    assert (
+        len(
+            {
+                record[
+                    f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_INTEGRATION}"
+                ]
+                for record in response["records"]
+            }
+        )
+        == 1
+    )
+
+
+@mock_salesforce(fresh=True)
+def test_revoked_cached_session_is_replaced():
+    KicksawSalesforce.NAMESPACE = ""
+    SalesforceClient(**CONNECTION_OBJECT).Account.create({"Name": "Name"})
+    key = tuple(sorted(CONNECTION_OBJECT.items()))
+    KicksawSalesforce.SESSION_CACHE.set(key, ("revoked", "mock.salesforce.com"))
+    salesforce = KicksawSalesforce.instantiate_from_id(
+        CONNECTION_OBJECT, execution_object_id="a001", use_cache=True
+    )
+    assert salesforce.session_id == "revoked"
+
+    request = salesforce.session.request
+
+    def reject_revoked(method, url, headers=None, **kwargs):
+        if headers and headers.get("Authorization") == "Bearer revoked":
+            response = requests.Response()
+            response.status_code = 401
+            response.url = url
+            response._content = json.dumps(
+                [
+                    {
+                        "errorCode": "INVALID_SESSION_ID",
+                        "message": "Session expired or invalid",
+                    }
+                ]
+            ).encode()
+            return response
+        return request(method, url, headers=headers, **kwargs)
+
+    salesforce.session.request = reject_revoked
+    logins = _count_calls("/services/Soap/u/")
+
+    assert salesforce.query("Select Id From Account")["totalSize"] == 1
+    assert _count_calls("/services/Soap/u/") == logins + 1
+    session = KicksawSalesforce.SESSION_CACHE.get(key)
+    assert session == (salesforce.session_id, salesforce.sf_instance)
+    assert session[0] != "revoked"
+    assert (
+        salesforce._job_poller.kinds["bulk2"].headers["Authorization"]
+        == f"Bearer {salesforce.session_id}"
+    )
+
+
+def test_ttl_cache_expires(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("time.monotonic", lambda: now)
+
+    cache = TTLCache(ttl=10)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+
+    now = 110.0
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl=10, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_describe_cache_persists_to_disk(tmp_path, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("time.time", lambda: now)
+    path = str(tmp_path / "describes.json")
+    fetched = list()
+
+    def fetch():
+        fetched.append(1)
+        return {"name": "Account", "fields": []}
+
+    key = ("instance", "kicksaw__", "Account")
+    assert (
+        DescribeCache(ttl=60, path=path).get_or_fetch(key, fetch)["name"] == "Account"
+    )
+    # a new process reads the file instead of describing again
+    assert (
+        DescribeCache(ttl=60, path=path).get_or_fetch(key, fetch)["name"] == "Account"
+    )
+    assert len(fetched) == 1
+
+    now = 1060.0
+    DescribeCache(ttl=60, path=path).get_or_fetch(key, fetch)
+    assert len(fetched) == 2
+
+
+@mock_salesforce(fresh=True)
+def test_describes_are_cached_by_org_and_namespace(monkeypatch):
+    KicksawSalesforce.NAMESPACE = ""
+    described = list()
+    monkeypatch.setattr(
+        SFType,
+        "describe",
+        lambda self: described.append(self.name) or {"name": self.name, "fields": []},
+    )
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+
+    for _ in range(2):
+        salesforce = KicksawSalesforce(
+            CONNECTION_OBJECT, INTEGRATION_NAME, {}, use_cache=True
+        )
+        assert salesforce.describe_object("Account")["name"] == "Account"
+        assert salesforce.describe_fields("Contact") == {}
+    assert described == ["Account", "Contact"]
+
+    salesforce.NAMESPACE = "other__"
+    salesforce.describe_object("Account")
+    assert described == ["Account", "Contact", "Account"]
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+import responses
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import (
+    KicksawSalesforce,
+    LocalCheckpointStore,
+    SFBulkType,
+)
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_batch_list_endpoint, mock_bulk2_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+DATA = [
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    # note, this is a duplicate id, so this and the first row will fail
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+    {"UpsertKey__c": "abc789", "Name": "Name 3"},
+]
+
+
+def _count_posts(path):
+    return sum(
+        1
+        for call in responses.calls
+        if call.request.method == "POST" and call.request.url.endswith(path)
+    )
+
+
+def _count_errors(salesforce):
+    return salesforce.query(
+        f"Select Id From {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}"
+    )["totalSize"]
+
+
+@mock_salesforce(fresh=True)
+def test_retried_bulk_operation_reattaches_to_its_job(monkeypatch):
+    mock_batch_list_endpoint()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {"step": 1})
+    salesforce.enable_bulk_checkpoints()
+
+    # the first attempt times out once its batches are uploaded
+    def timeout(*args, **kwargs):
+        raise TimeoutError()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SFBulkType, "worker", timeout)
+        with pytest.raises(TimeoutError):
+            salesforce.bulk.CustomObject__c.upsert(DATA, "UpsertKey__c", batch_size=2)
+
+    assert _count_posts("/job") == 1
+    assert _count_posts("/batch") == 2
+
+    payload = json.loads(
+        salesforce.get_execution_object()[
+            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}"
+        ]
+    )
+    assert payload["step"] == 1
+    (checkpoint,) = payload["bulk_checkpoints"].values()
+    assert len(checkpoint["jobs"][0]["batches"]) == 2
+    assert not checkpoint["jobs"][0]["closed"]
+
+    for _ in range(2):
+        retry = KicksawSalesforce.instantiate_from_id(
+            CONNECTION_OBJECT, salesforce.execution_object_id
+        )
+        retry.enable_bulk_checkpoints()
+        response = retry.bulk.CustomObject__c.upsert(DATA, "UpsertKey__c", batch_size=2)
+        assert [result["success"] for result in response] == [
+            False,
+            False,
+            True,
+            True,
+        ]
+
+    # neither the data nor the errors were uploaded twice
+    assert _count_posts("/job") == 2
+    assert _count_posts("/batch") == 3
+    assert _count_errors(salesforce) == 2
+
+
+@mock_salesforce(fresh=True)
+def test_retried_bulk2_operation_skips_finished_work(tmp_path):
+    mock_bulk2_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    job_ids = set()
+    for _ in range(2):
+        client = KicksawSalesforce.instantiate_from_id(
+            CONNECTION_OBJECT, salesforce.execution_object_id
+        )
+        client.enable_bulk_checkpoints(LocalCheckpointStore(str(tmp_path)))
+        jobs = client.bulk2.CustomObject__c.upsert(DATA, "UpsertKey__c", wait=0)
+        assert jobs[0]["numberRecordsFailed"] == 2
+        job_ids.add(jobs[0]["id"])
+
+    assert len(job_ids) == 1
+    # one job for the data and one for its errors
+    assert _count_posts("/jobs/ingest") == 2
+    assert _count_errors(salesforce) == 2
+    assert (tmp_path / f"{salesforce.execution_object_id}.json").exists()
@@ -0,0 +1,163 @@
+import json
+import threading
+
+import responses
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce, LogLevel
+from kicksaw_integration_app_client.composite import CompositeBatch
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_composite_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+def _count_calls(path):
+    return sum(1 for call in responses.calls if call.request.url.endswith(path))
+
+
+def _query_logs(salesforce):
+    return salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_MESSAGE}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG}
+        """
+    )
+
+
+@mock_salesforce(fresh=True)
+def test_batched_execution_lifecycle_is_one_request():
+    mock_composite_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    calls_before = len(responses.calls)
+
+    salesforce = KicksawSalesforce(
+        CONNECTION_OBJECT, INTEGRATION_NAME, {"step": 1}, batch_writes=True
+    )
+    assert salesforce.execution_object_id.startswith("@{")
+
+    salesforce.log("Started", LogLevel.INFO)
+    salesforce.update_execution_object_payload({"step": 2})
+    salesforce.log("Finished", LogLevel.INFO)
+    salesforce.complete_execution({"done": True})
+
+    # the login and one composite request, nothing else
+    assert len(responses.calls) - calls_before == 2
+    assert _count_calls("/composite") == 1
+
+    execution_id = salesforce.execution_object_id
+    assert not execution_id.startswith("@{")
+
+    execution = salesforce.get_execution_object()
+    assert execution[
+        f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.SUCCESSFUL_COMPLETION}"
+    ]
+    assert json.loads(
+        execution[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION_PAYLOAD}"]
+    ) == {"step": 2}
+
+    response = _query_logs(salesforce)
+    assert response["totalSize"] == 2
+    for record in response["records"]:
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION}"]
+            == execution_id
+        )
+
+
+@mock_salesforce(fresh=True)
+def test_batch_context_splits_requests_and_resolves_references(monkeypatch):
+    mock_composite_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+    monkeypatch.setattr(CompositeBatch, "MAX_SUBREQUESTS", 2)
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    execution_id = salesforce.execution_object_id
+
+    with salesforce.batch() as batch:
+        account = batch.create("Account", {"Name": "Parent"})
+        for index in range(3):
+            salesforce.log(f"Message {index}", LogLevel.INFO)
+        # sent in a later request than the account it points to
+        batch.create("Contact", {"LastName": "Child", "AccountId": account})
+        assert _count_calls("/composite") == 0
+
+    assert _count_calls("/composite") == 3
+    assert _query_logs(salesforce)["totalSize"] == 3
+    assert salesforce.execution_object_id == execution_id
+
+    contact = salesforce.query("Select AccountId From Contact")["records"][0]
+    assert contact["AccountId"] == batch.resolve(account)
+
+
+class SlowComposite:
+    """
+    Answers composite requests once released, recording the reference ids sent
+    """
+
+    sf_version = "59.0"
+
+    def __init__(self):
+        self.sent = list()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def restful(self, path, method, data):
+        self.started.set()
+        self.release.wait(5)
+        subrequests = json.loads(data)["compositeRequest"]
+        self.sent.extend(subrequest["referenceId"] for subrequest in subrequests)
+        return {
+            "compositeResponse": [
+                {
+                    "httpStatusCode": 201,
+                    "referenceId": subrequest["referenceId"],
+                    "body": {"id": "a00"},
+                }
+                for subrequest in subrequests
+            ]
+        }
+
+
+def test_writes_during_a_flush_are_kept():
+    salesforce = SlowComposite()
+    batch = CompositeBatch(salesforce)
+    first = batch.create("Log__c", {"Message__c": "First"})
+
+    flushing = threading.Thread(target=batch.flush)
+    flushing.start()
+    salesforce.started.wait(5)
+    # e.g. the main thread logging while a background upload flushes
+    adding = threading.Thread(
+        target=batch.create, args=("Log__c", {"Message__c": "Second"})
+    )
+    adding.start()
+    # the write waits for the flush instead of racing its reassignments
+    adding.join(0.1)
+    assert adding.is_alive()
+    salesforce.release.set()
+    flushing.join(5)
+    adding.join(5)
+
+    batch.flush()
+    assert salesforce.sent == ["record0", "record1"]
+    assert first == "@{record0.id}"
+    assert len(batch) == 0
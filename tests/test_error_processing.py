@@ -0,0 +1,391 @@
+import concurrent.futures
+import gzip
+import json
+
+from collections import Counter
+
+import pytest
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_utils.salesforce_client import SFBulkType as BaseSFBulkType
+from kicksaw_integration_app_client import (
+    BackgroundWorker,
+    KicksawSalesforce,
+    TRUNCATION_MARKER,
+    SFBulkType,
+    SFBulk2Type,
+)
+from kicksaw_integration_app_client.artifacts import (
+    LocalArtifactStore,
+    S3ArtifactStore,
+)
+from kicksaw_integration_app_client.utils import dumps
+
+from simple_mockforce import mock_salesforce
+from simple_mockforce.virtual import virtual_salesforce
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+DATA = [
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+    # note, this is a duplicate id, so this and the first row will fail
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+]
+
+
+def _query_errors(salesforce):
+    return salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )
+
+
+@mock_salesforce(fresh=True)
+def test_errors_pushed_in_chunks(monkeypatch):
+    KicksawSalesforce.NAMESPACE = ""
+    monkeypatch.setattr(SFBulkType, "ERROR_CHUNK_SIZE", 1)
+
+    inserted_chunks = list()
+    original_insert = BaseSFBulkType.insert
+
+    def insert(self, data, *args, **kwargs):
+        inserted_chunks.append(len(data))
+        return original_insert(self, data, *args, **kwargs)
+
+    monkeypatch.setattr(BaseSFBulkType, "insert", insert)
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    salesforce.bulk.CustomObject__c.upsert(DATA, "UpsertKey__c")
+
+    assert inserted_chunks == [1, 1]
+    response = _query_errors(salesforce)
+    assert response["totalSize"] == 2
+    for record in response["records"]:
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE}"]
+            == "DUPLICATE_EXTERNAL_ID"
+        )
+
+
+def test_iter_error_objects_is_lazy(monkeypatch):
+    KicksawSalesforce.NAMESPACE = ""
+    monkeypatch.setattr(KicksawSalesforce, "execution_object_id", "a001")
+    bulk_type = SFBulkType("CustomObject__c", "", {}, None)
+
+    def response():
+        yield {"success": False, "errors": [{"statusCode": "A", "message": "a"}]}
+        raise AssertionError("Consumed more results than requested")
+
+    error_objects = bulk_type._iter_error_objects(
+        zip(DATA, response()), "upsert", "UpsertKey__c"
+    )
+    error_object = next(error_objects)
+    assert error_object[f"{KicksawSalesforce.ERROR_CODE}"] == "A"
+    assert error_object[f"{KicksawSalesforce.UPSERT_KEY_VALUE}"] == "1a2b3c"
+
+
+@mock_salesforce(fresh=True)
+def test_background_error_upload():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_background_error_upload()
+
+    response = salesforce.bulk.CustomObject__c.upsert(DATA, "UpsertKey__c")
+    assert len(response) == 3
+
+    salesforce.complete_execution()
+
+    assert _query_errors(salesforce)["totalSize"] == 2
+
+
+def test_background_worker_reraises_on_wait():
+    worker = BackgroundWorker()
+
+    def fail():
+        raise ValueError("Upload failed")
+
+    worker.submit(fail)
+    with pytest.raises(ValueError, match="Upload failed"):
+        worker.wait()
+
+    # failures are only reported once
+    worker.wait()
+    worker.shutdown()
+
+
+@mock_salesforce(fresh=True)
+def test_failed_background_upload_still_fails_the_execution():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_background_error_upload()
+
+    def fail():
+        raise ValueError("Upload failed")
+
+    salesforce._error_worker.submit(fail)
+    with pytest.raises(ValueError, match="Upload failed"):
+        salesforce.handle_exception("Code died")
+
+    record = salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.SUCCESSFUL_COMPLETION},
+            {KicksawSalesforce.ERROR_MESSAGE}
+        From
+            {KicksawSalesforce.EXECUTION}
+        """
+    )["records"][0]
+    assert record[KicksawSalesforce.SUCCESSFUL_COMPLETION] == False
+    assert record[KicksawSalesforce.ERROR_MESSAGE] == "Code died"
+
+
+@mock_salesforce(fresh=True)
+def test_parallel_bulk_jobs_keep_row_order():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_parallel_bulk_jobs(jobs=2, min_job_size=1)
+
+    data = [
+        # duplicates within the first job, so both of these fail
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+        {"UpsertKey__c": "abc987", "Name": "Name 3"},
+    ]
+    jobs_before = len(virtual_salesforce.jobs)
+    response = salesforce.bulk.CustomObject__c.upsert(data, "UpsertKey__c")
+
+    # two upsert jobs plus the job pushing the errors
+    assert len(virtual_salesforce.jobs) - jobs_before == 3
+    assert [record["success"] for record in response] == [False, False, True, True]
+
+    records = _query_errors(salesforce)["records"]
+    assert len(records) == 2
+    for record in records:
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}"]
+            == "1a2b3c"
+        )
+
+
+@mock_salesforce(fresh=True)
+def test_concurrent_executions_keep_their_own_errors():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    clients = [
+        KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {}) for _ in range(2)
+    ]
+    assert clients[0].execution_object_id != clients[1].execution_object_id
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        list(
+            pool.map(
+                lambda client: client.bulk.CustomObject__c.upsert(DATA, "UpsertKey__c"),
+                clients,
+            )
+        )
+
+    response = clients[0].query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )
+    executions = Counter(
+        record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.EXECUTION}"]
+        for record in response["records"]
+    )
+    assert executions == {
+        clients[0].execution_object_id: 2,
+        clients[1].execution_object_id: 2,
+    }
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {},
+        {"Name": "Acme, Inc", "Active__c": True, "ParentId": None, "Employees": 12},
+        {"Name,": "ends with a comma,"},
+        {"k": ":)"},
+        {"": ":"},
+        {":x": ""},
+        {"Name": 'has "quotes"'},
+        {"Name": "Société"},
+        {"Name": "line\nbreak", "Amount": 1.5},
+        {"Count": 2**70},
+        {"Nested": {"Id": "1"}},
+    ],
+)
+def test_dumps_matches_json_dumps(payload):
+    assert dumps(payload) == json.dumps(payload)
+
+
+@mock_salesforce(fresh=True)
+def test_error_aggregation_writes_summaries_and_artifact(tmp_path):
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_error_aggregation(
+        LocalArtifactStore(str(tmp_path)), sample_size=1
+    )
+
+    data = [
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+        {"UpsertKey__c": "abc987", "Name": "Name 3"},
+    ]
+    salesforce.bulk.CustomObject__c.upsert(data, "UpsertKey__c")
+
+    response = salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )
+    assert response["totalSize"] == 1
+    record = response["records"][0]
+    assert (
+        record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE}"]
+        == "DUPLICATE_EXTERNAL_ID"
+    )
+    summary = json.loads(
+        record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}"]
+    )
+    assert summary["count"] == 4
+    assert summary["sample_keys"] == ["1a2b3c"]
+    assert (
+        record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}"]
+        == "1a2b3c"
+    )
+
+    with gzip.open(summary["artifact"], "rt") as artifact:
+        details = [json.loads(line) for line in artifact]
+    assert [
+        detail[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE}"]
+        for detail in details
+    ] == ["1a2b3c", "1a2b3c", "xyz123", "xyz123"]
+
+
+def test_s3_artifact_store_uploads_and_cleans_up(tmp_path):
+    uploads = list()
+
+    class FakeS3:
+        def upload_file(self, path, bucket, key):
+            uploads.append((open(path).read(), bucket, key))
+
+    path = tmp_path / "errors.jsonl.gz"
+    path.write_text("detail")
+
+    store = S3ArtifactStore("bucket", prefix="errors/", client=FakeS3())
+    assert store.save(str(path), "a001.jsonl.gz") == "s3://bucket/errors/a001.jsonl.gz"
+    assert uploads == [("detail", "bucket", "errors/a001.jsonl.gz")]
+    assert not path.exists()
+
+
+@mock_salesforce(fresh=True)
+def test_error_chunks_are_sized_by_bytes(monkeypatch):
+    KicksawSalesforce.NAMESPACE = ""
+
+    inserted_chunks = list()
+    original_insert = BaseSFBulkType.insert
+
+    def insert(self, data, *args, **kwargs):
+        inserted_chunks.append((len(data), kwargs["batch_size"]))
+        return original_insert(self, data, *args, **kwargs)
+
+    monkeypatch.setattr(BaseSFBulkType, "insert", insert)
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    data = [{"UpsertKey__c": str(index // 2), "Name": "x" * 100} for index in range(6)]
+    # roughly two error objects fit into a chunk
+    monkeypatch.setattr(SFBulkType, "ERROR_CHUNK_BYTES", 1000)
+    salesforce.bulk.CustomObject__c.upsert(data, "UpsertKey__c", batch_size=6)
+
+    assert inserted_chunks == [(2, 2), (2, 2), (2, 2)]
+    assert _query_errors(salesforce)["totalSize"] == 6
+
+
+def test_bulk2_error_chunks_are_only_limited_by_size(monkeypatch):
+    KicksawSalesforce.NAMESPACE = ""
+    monkeypatch.setattr(KicksawSalesforce, "execution_object_id", "a001")
+    bulk_type = SFBulk2Type("CustomObject__c", "", {}, None)
+    failure = {"success": False, "errors": [{"statusCode": "A", "message": "a"}]}
+
+    def results(count):
+        return (({"UpsertKey__c": str(index)}, failure) for index in range(count))
+
+    # far more than a Bulk 1.0 batch holds, but still one ingest job
+    chunks = bulk_type._error_chunks(results(25000), "upsert", "UpsertKey__c")
+    assert [len(chunk) for chunk in chunks] == [25000]
+
+    monkeypatch.setattr(SFBulk2Type, "ERROR_CHUNK_BYTES", 10000)
+    chunks = list(bulk_type._error_chunks(results(1000), "upsert", "UpsertKey__c"))
+    assert len(chunks) > 1
+    assert sum(map(len, chunks)) == 1000
+
+
+def test_error_payloads_are_projected_and_truncated(monkeypatch):
+    KicksawSalesforce.NAMESPACE = ""
+    monkeypatch.setattr(KicksawSalesforce, "execution_object_id", "a001")
+    bulk_type = SFBulkType("CustomObject__c", "", {}, None)
+    failure = {"success": False, "errors": [{"statusCode": "A", "message": "a"}]}
+    payload = {"UpsertKey__c": "1a2b3c", "Name": "x" * 100, "Description": "y"}
+
+    monkeypatch.setattr(KicksawSalesforce, "_error_payload_fields", ["Description"])
+    (error_object,) = bulk_type._iter_error_objects(
+        [(payload, failure)], "upsert", "UpsertKey__c"
+    )
+    assert json.loads(error_object[KicksawSalesforce.OBJECT_PAYLOAD]) == {
+        "Description": "y"
+    }
+    assert error_object[KicksawSalesforce.UPSERT_KEY_VALUE] == "1a2b3c"
+
+    monkeypatch.setattr(KicksawSalesforce, "_error_payload_fields", None)
+    monkeypatch.setattr(KicksawSalesforce, "_error_payload_length", 50)
+    (error_object,) = bulk_type._iter_error_objects(
+        [(payload, failure)], "upsert", "UpsertKey__c"
+    )
+    assert len(error_object[KicksawSalesforce.OBJECT_PAYLOAD]) == 50
+    assert error_object[KicksawSalesforce.OBJECT_PAYLOAD].endswith(TRUNCATION_MARKER)
@@ -0,0 +1,94 @@
+import re
+import time
+
+import requests
+import responses
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import Governor, KicksawSalesforce, LogLevel
+
+from simple_mockforce import mock_salesforce
+from simple_mockforce.constants import BASE_URL, SF_VERSION
+
+from tests.mock_endpoints import mock_composite_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+def _response(limit_info):
+    response = requests.Response()
+    response.headers["Sforce-Limit-Info"] = limit_info
+    return response
+
+
+def test_governor_tracks_the_budget(monkeypatch):
+    governor = Governor(max_requests_per_second=10, tight_requests_per_second=2)
+    governor.observe(
+        _response("api-usage=1000/5000; per-app-api-usage=17/250(appName=app)")
+    )
+    assert governor.remaining == 4000
+    assert not governor.tight
+
+    # requests are spaced by the current rate
+    now = [100.0]
+    sleeps = list()
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    for _ in range(3):
+        with governor.request():
+            pass
+    assert [round(pause, 3) for pause in sleeps] == [0.1, 0.2]
+
+    governor.observe(_response("api-usage=4500/5000"))
+    assert governor.tight
+    for _ in range(2):
+        with governor.request():
+            pass
+    # the tight rate applies from the next request on
+    assert [round(pause, 3) for pause in sleeps[2:]] == [0.3, 0.8]
+
+    # a budget of its own gets tight as well
+    governor = Governor(budget=10)
+    governor.requests = 8
+    assert not governor.tight
+    governor.requests = 9
+    assert governor.tight
+
+
+@mock_salesforce(fresh=True)
+def test_tight_budget_shifts_logs_to_batches():
+    mock_composite_endpoints()
+    responses.add(
+        responses.GET,
+        re.compile(f"{BASE_URL}/services/data/v{SF_VERSION}/limits/$"),
+        json={"DailyApiRequests": {"Max": 15000, "Remaining": 1000}},
+    )
+    KicksawSalesforce.NAMESPACE = ""
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    governor = Governor(max_bulk_jobs=1, tight_requests_per_second=1000)
+    salesforce.enable_governor(governor, check_limits=True)
+    assert governor.remaining == 1000
+    assert governor.tight
+
+    requests_before = governor.requests
+    salesforce.bulk.CustomObject__c.insert([{"Name": "Name 1"}])
+    assert governor.requests > requests_before
+    assert governor.active_bulk_jobs == 0
+
+    log_query = f"Select Id From {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG}"
+    for index in range(3):
+        salesforce.log(f"Log {index}", LogLevel.INFO)
+    assert salesforce._log_buffer is not None
+    salesforce.complete_execution()
+    assert salesforce.query(log_query)["totalSize"] == 3
@@ -70,6 +70,38 @@ def test_kicksaw_salesforce_client_instantiation(namespace):
     )
 
 
+@mock_salesforce(fresh=True)
+def test_missing_integration_is_created_in_the_clients_namespace():
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    # so that the object exists in mockforce
+    _salesforce.KicksawEng__Integration__c.create({"Name": "randomname"})
+    salesforce = KicksawSalesforce(
+        CONNECTION_OBJECT,
+        INTEGRATION_NAME,
+        {},
+        create_missing_integration=True,
+        namespace="KicksawEng__",
+    )
+
+    response = salesforce.query(
+        f"Select Id From KicksawEng__Integration__c Where Name = '{INTEGRATION_NAME}'"
+    )
+    assert response["totalSize"] == 1
+    integration = response["records"][0]
+
+    response = salesforce.query(
+        f"Select Id, KicksawEng__{KicksawSalesforce.EXECUTION_INTEGRATION} From KicksawEng__{KicksawSalesforce.EXECUTION}"
+    )
+    execution = response["records"][0]
+    assert execution["Id"] == salesforce.execution_object_id
+    assert (
+        execution[f"KicksawEng__{KicksawSalesforce.EXECUTION_INTEGRATION}"]
+        == integration["Id"]
+    )
+
+
 @mock_salesforce(fresh=True)
 def test_kicksaw_salesforce_client():
     _salesforce = SalesforceClient(**CONNECTION_OBJECT)
@@ -0,0 +1,106 @@
+import json
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import (
+    Instrumentation,
+    KicksawSalesforce,
+    LogLevel,
+)
+
+from simple_mockforce import mock_salesforce
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+class RecordingHook:
+    def __init__(self):
+        self.spans = list()
+        self.counts = list()
+
+    def on_span(self, name, seconds, attributes):
+        self.spans.append((name, attributes))
+
+    def on_count(self, name, value, attributes):
+        self.counts.append((name, value, attributes))
+
+
+def test_instrumentation_adds_up_spans_and_counts():
+    hook = RecordingHook()
+    instrumentation = Instrumentation(hooks=[hook])
+    for seconds in (0.5, 1.5):
+        instrumentation.record("bulk.wait", seconds, object="Account")
+    with instrumentation.span("log"):
+        pass
+    instrumentation.count("rows", 10, object="Account")
+    instrumentation.count("rows", 5, object="Contact")
+
+    summary = instrumentation.summary()
+    assert summary["spans"]["bulk.wait"] == {
+        "count": 2,
+        "seconds": 2.0,
+        "max_seconds": 1.5,
+    }
+    assert summary["spans"]["log"]["count"] == 1
+    assert summary["counters"] == {"rows": 15}
+    assert hook.spans[0] == ("bulk.wait", {"object": "Account"})
+    assert hook.counts[-1] == ("rows", 5, {"object": "Contact"})
+
+
+@mock_salesforce(fresh=True)
+def test_execution_summary_in_response_payload():
+    KicksawSalesforce.NAMESPACE = ""
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    hook = RecordingHook()
+    salesforce.enable_instrumentation(hooks=[hook])
+
+    data = [
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        # note, this is a duplicate id, so this and the first row will fail
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+    ]
+    salesforce.bulk.CustomObject__c.upsert(data, "UpsertKey__c")
+    # a query's SOQL isn't counted as rows
+    salesforce.bulk.CustomObject__c.query("Select Id From CustomObject__c")
+    salesforce.log("Loaded", LogLevel.INFO)
+    salesforce.complete_execution({"next": "done"})
+
+    execution = salesforce.get_execution_object()
+    payload = json.loads(
+        execution[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.RESPONSE_PAYLOAD}"]
+    )
+    assert payload["next"] == "done"
+
+    summary = payload["instrumentation"]
+    for name in (
+        "bulk.operation",
+        "bulk.create_job",
+        "bulk.add_batch",
+        "bulk.wait",
+        "errors.insert",
+        "http",
+        "log",
+    ):
+        assert summary["spans"][name]["count"] >= 1, name
+    counters = summary["counters"]
+    assert counters["rows"] == 3
+    assert counters["failed_rows"] == 2
+    assert counters["error_objects"] == 2
+    assert counters["logs"] == 1
+    assert counters["api_calls"] == summary["spans"]["http"]["count"]
+
+    assert ("bulk.operation", {"object": "CustomObject__c"}) in hook.spans
+    assert ("rows", 3, {"object": "CustomObject__c", "operation": "upsert"}) in (
+        hook.counts
+    )
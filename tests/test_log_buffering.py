@@ -0,0 +1,140 @@
+import logging
+
+import pytest
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import (
+    IntegrationLogHandler,
+    KicksawSalesforce,
+    LogBuffer,
+    LogLevel,
+)
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_composite_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+def _query_logs(salesforce):
+    return salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_MESSAGE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_LEVEL}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG}
+        """
+    )
+
+
+@mock_salesforce(fresh=True)
+def test_buffered_logs_flush_on_completion():
+    mock_composite_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_log_buffering(max_size=100)
+
+    for index in range(3):
+        salesforce.log(f"Message {index}", LogLevel.INFO)
+
+    # nothing has been sent yet
+    assert len(salesforce._log_buffer) == 3
+
+    salesforce.complete_execution()
+
+    assert len(salesforce._log_buffer) == 0
+    response = _query_logs(salesforce)
+    assert response["totalSize"] == 3
+    for record in response["records"]:
+        assert (
+            record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.PARENT_EXECUTION}"]
+            == salesforce.execution_object_id
+        )
+
+
+@mock_salesforce(fresh=True)
+def test_buffered_logs_flush_when_full():
+    mock_composite_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_log_buffering(max_size=2)
+
+    salesforce.log("First", LogLevel.INFO)
+    salesforce.log("Second", LogLevel.INFO)
+    salesforce.log("Third", LogLevel.INFO)
+
+    assert _query_logs(salesforce)["totalSize"] == 2
+    assert len(salesforce._log_buffer) == 1
+
+
+def test_failed_flush_keeps_the_records():
+    pushed = list()
+
+    def push(records):
+        if not pushed:
+            pushed.append(None)
+            raise TimeoutError("push timed out")
+        pushed.append(records)
+
+    log_buffer = LogBuffer(push, max_size=2)
+    log_buffer.add({"message": "First"})
+    with pytest.raises(TimeoutError):
+        log_buffer.add({"message": "Second"})
+    assert len(log_buffer) == 2
+
+    log_buffer.add({"message": "Third"})
+    assert pushed[1] == [
+        {"message": "First"},
+        {"message": "Second"},
+        {"message": "Third"},
+    ]
+    assert len(log_buffer) == 0
+
+
+@mock_salesforce(fresh=True)
+def test_logging_handler():
+    mock_composite_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_log_buffering()
+
+    logger = logging.getLogger("test_logging_handler")
+    logger.setLevel(logging.DEBUG)
+    handler = IntegrationLogHandler(salesforce)
+    logger.addHandler(handler)
+    try:
+        logger.warning("Careful")
+        logger.error("Broken")
+    finally:
+        logger.removeHandler(handler)
+
+    salesforce.flush_logs()
+
+    records = _query_logs(salesforce)["records"]
+    levels = {
+        record[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_MESSAGE}"]: record[
+            f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.LOG_LEVEL}"
+        ]
+        for record in records
+    }
+    assert levels == {"Careful": "WARNING", "Broken": "ERROR"}
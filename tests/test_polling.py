@@ -0,0 +1,161 @@
+import threading
+
+import responses
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+from kicksaw_integration_app_client.polling import Bulk2Jobs, JobPoller
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_batch_list_endpoint, mock_bulk2_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+class CountingKind:
+    """
+    Jobs are done the second time they're checked
+    """
+
+    def __init__(self):
+        self.fetches = list()
+        self.checks = dict()
+        self.first_fetch = threading.Event()
+
+    def fetch(self, keys):
+        self.fetches.append(sorted(keys))
+        self.first_fetch.set()
+        for key in keys:
+            self.checks[key] = self.checks.get(key, 0) + 1
+        return {key: {"key": key, "checks": self.checks[key]} for key in keys}
+
+    def is_done(self, info):
+        return info["checks"] > 1
+
+    def processed(self, info):
+        return None
+
+
+def test_poller_checks_outstanding_jobs_together():
+    kind = CountingKind()
+    poller = JobPoller({"fake": kind}, min_interval=0.05)
+
+    results = dict()
+    waiter = threading.Thread(
+        target=lambda: results.update(a=poller.wait("fake", "a", wait=1))
+    )
+    waiter.start()
+    kind.first_fetch.wait()
+    results["b"] = poller.wait("fake", "b", wait=1)
+    waiter.join()
+
+    assert results == {"a": {"key": "a", "checks": 2}, "b": {"key": "b", "checks": 2}}
+    # the second check of a was made along with the first one of b
+    assert kind.fetches == [["a"], ["a", "b"], ["b"]]
+
+
+def test_poller_raises_failed_jobs_in_their_waiter():
+    class FailingKind(CountingKind):
+        def is_done(self, info):
+            raise RuntimeError(f"Job '{info['key']}' failed")
+
+    poller = JobPoller({"fake": FailingKind()}, min_interval=0.05)
+    try:
+        poller.wait("fake", "a")
+    except RuntimeError as exception:
+        assert str(exception) == "Job 'a' failed"
+    else:
+        assert False, "the failed job didn't raise"
+
+
+def test_poller_raises_missing_jobs_in_their_waiter():
+    class ForgetfulKind(CountingKind):
+        def fetch(self, keys):
+            return dict()
+
+    poller = JobPoller({"fake": ForgetfulKind()}, min_interval=0.05)
+    try:
+        poller.wait("fake", "a")
+    except RuntimeError as exception:
+        assert str(exception) == "No state was reported for job 'a'"
+    else:
+        assert False, "the missing job didn't raise"
+
+
+def test_stopped_poller_releases_its_waiters(monkeypatch):
+    kind = CountingKind()
+    poller = JobPoller({"fake": kind}, min_interval=0.05)
+
+    def broken(due):
+        raise ValueError("poller bug")
+
+    monkeypatch.setattr(poller, "_check", broken)
+    try:
+        poller.wait("fake", "a")
+    except ValueError as exception:
+        assert str(exception) == "poller bug"
+    else:
+        assert False, "the waiter wasn't released"
+    assert poller._thread is None
+
+    # the next waiter gets a working poller again
+    monkeypatch.undo()
+    assert poller.wait("fake", "b", wait=1) == {"key": "b", "checks": 2}
+
+
+@mock_salesforce(fresh=True)
+def test_bulk2_jobs_share_one_status_request():
+    mock_bulk2_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    bulk_type = salesforce.bulk2.CustomObject__c
+    urls = [
+        bulk_type._url(bulk_type._create_job("insert", None)["id"]) for _ in range(3)
+    ]
+    calls_before = len(responses.calls)
+
+    jobs = Bulk2Jobs(salesforce.bulk2.headers, salesforce.session)
+    infos = jobs.fetch(urls)
+
+    assert len(responses.calls) - calls_before == 1
+    assert responses.calls[-1].request.url.endswith("/jobs/ingest")
+    assert [infos[url]["state"] for url in urls] == ["Open"] * 3
+
+
+@mock_salesforce(fresh=True)
+def test_bulk_batches_wait_through_the_poller():
+    mock_batch_list_endpoint()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    data = [{"UpsertKey__c": str(index), "Name": f"Name {index}"} for index in range(6)]
+    response = salesforce.bulk.CustomObject__c.upsert(
+        data, "UpsertKey__c", batch_size=2
+    )
+
+    assert [result["success"] for result in response] == [True] * 6
+    status_checks = [
+        call
+        for call in responses.calls
+        if call.request.method == "GET"
+        and "/batch" in call.request.url
+        and "/result" not in call.request.url
+    ]
+    # at most one check per batch, fewer when batches were checked together
+    assert 1 <= len(status_checks) <= 3
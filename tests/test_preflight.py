@@ -0,0 +1,182 @@
+import json
+
+from simple_salesforce.api import SFType
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+from kicksaw_integration_app_client.preflight import find_doomed_rows
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_batch_list_endpoint, mock_bulk2_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+def _field(name, type_="string", length=0, required=False):
+    return {
+        "name": name,
+        "label": name.replace("__c", "").replace("_", " "),
+        "type": type_,
+        "length": length,
+        "nillable": not required,
+        "createable": True,
+        "defaultedOnCreate": False,
+    }
+
+
+DESCRIBE = {
+    "name": "CustomObject__c",
+    "fields": [
+        _field("Id", "id", 18),
+        _field("Name", length=10, required=True),
+        _field("UpsertKey__c", length=20),
+        _field("Active__c", "boolean", required=True),
+        _field("Amount__c", "double"),
+    ],
+}
+
+DATA = [
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    # note, this is a duplicate id, so this and the first row will fail
+    {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+    {"UpsertKey__c": "xyz123", "Name": "Way too long a name"},
+    {"UpsertKey__c": "abc789", "Name": "Name 3"},
+    {"UpsertKey__c": "def456", "Name": None},
+]
+
+
+def test_find_doomed_rows():
+    doomed = find_doomed_rows(DATA, "upsert", "UpsertKey__c", DESCRIBE)
+
+    assert {
+        index: [error["statusCode"] for error in errors]
+        for index, errors in doomed.items()
+    } == {
+        0: ["DUPLICATE_VALUE"],
+        1: ["DUPLICATE_VALUE"],
+        2: ["STRING_TOO_LONG"],
+        4: ["REQUIRED_FIELD_MISSING"],
+    }
+    assert doomed[2][0]["fields"] == ["Name"]
+
+    # duplicates only fail within a batch, unless every row counts as one batch
+    data = [{"UpsertKey__c": "1a2b3c", "Name": "Name"} for _ in range(3)]
+    doomed = find_doomed_rows(data, "upsert", "UpsertKey__c", DESCRIBE, batch_size=2)
+    assert sorted(doomed) == [0, 1]
+    doomed = find_doomed_rows(data, "upsert", "UpsertKey__c", DESCRIBE, None)
+    assert sorted(doomed) == [0, 1, 2]
+
+    # like simple-salesforce, batches hold at most 10,000 rows
+    data = [{"UpsertKey__c": "1a2b3c", "Name": "Name"}] + [
+        {"UpsertKey__c": str(index), "Name": "Name"} for index in range(9999)
+    ]
+    data.append(data[0])
+    for batch_size in (50000, "auto"):
+        doomed = find_doomed_rows(data, "upsert", "UpsertKey__c", DESCRIBE, batch_size)
+        assert not doomed
+
+    # inserts need every required field, booleans default to false
+    doomed = find_doomed_rows(
+        [{"Amount__c": 1}, {"Name": "", "Amount__c": 2}, {"Name": "Name"}],
+        "insert",
+        None,
+        DESCRIBE,
+    )
+    assert sorted(doomed) == [0, 1]
+    assert doomed[0][0]["message"] == "Required fields are missing: [Name]"
+
+
+def _query_errors(salesforce):
+    return salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OPERATION},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR_CODE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )["records"]
+
+
+@mock_salesforce(fresh=True)
+def test_preflight_keeps_doomed_rows_out_of_the_upload(monkeypatch):
+    # the batches of an operation may be checked together
+    mock_batch_list_endpoint()
+    KicksawSalesforce.NAMESPACE = ""
+    describes = list()
+    monkeypatch.setattr(
+        SFType, "describe", lambda self: describes.append(self.name) or DESCRIBE
+    )
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_preflight()
+
+    response = salesforce.bulk.CustomObject__c.upsert(DATA, "UpsertKey__c")
+    assert [result["success"] for result in response] == [
+        False,
+        False,
+        False,
+        True,
+        False,
+    ]
+    assert response[2]["errors"][0]["statusCode"] == "STRING_TOO_LONG"
+
+    # only the valid row reached Salesforce
+    records = salesforce.query("Select UpsertKey__c From CustomObject__c")["records"]
+    assert [record["UpsertKey__c"] for record in records] == ["abc789"]
+
+    errors = _query_errors(salesforce)
+    assert [
+        error[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OPERATION}"]
+        for error in errors
+    ] == ["preflight"] * 4
+    assert (
+        json.loads(
+            errors[2][
+                f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}"
+            ]
+        )
+        == DATA[2]
+    )
+
+    salesforce.bulk.CustomObject__c.upsert(DATA[3:], "UpsertKey__c")
+    assert describes == ["CustomObject__c"]
+
+    # in batches of their own, the rows sharing an upsert key are uploaded
+    errors = len(_query_errors(salesforce))
+    response = salesforce.bulk.CustomObject__c.upsert(
+        DATA[:2], "UpsertKey__c", batch_size=1
+    )
+    assert [result["success"] for result in response] == [True, True]
+    assert len(_query_errors(salesforce)) == errors
+
+
+@mock_salesforce(fresh=True)
+def test_preflight_of_bulk2_operations(monkeypatch):
+    mock_bulk2_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+    monkeypatch.setattr(SFType, "describe", lambda self: DESCRIBE)
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_preflight()
+
+    jobs = salesforce.bulk2.CustomObject__c.upsert(DATA, "UpsertKey__c", wait=0)
+    assert jobs[0]["numberRecordsProcessed"] == 1
+    assert jobs[0]["numberRecordsFailed"] == 0
+    assert len(_query_errors(salesforce)) == 4
+
+    assert salesforce.bulk2.CustomObject__c.upsert(DATA[:2], "UpsertKey__c") == []
@@ -0,0 +1,47 @@
+import datetime
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+
+from simple_mockforce import mock_salesforce
+from simple_mockforce.virtual import virtual_salesforce
+
+from tests.mock_endpoints import mock_bulk2_endpoints, mock_bulk2_query_endpoints
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+@mock_salesforce(fresh=True)
+def test_purge_errors():
+    mock_bulk2_endpoints()
+    mock_bulk2_query_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    error_object = f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}"
+    for index in range(7):
+        getattr(salesforce, error_object).create({"ErrorCode__c": str(index)})
+    # age all but the last two errors
+    for index, record in enumerate(virtual_salesforce.data[error_object]):
+        record["CreatedDate"] = (
+            "2020-01-01" if index < 5 else str(datetime.date.today())
+        )
+
+    report = salesforce.purge_errors("TODAY", job_size=2, max_jobs=2)
+
+    assert report["queried"] == 5
+    assert report["deleted"] == 5
+    assert report["failed"] == 0
+    remaining = salesforce.query(f"Select ErrorCode__c From {error_object}")
+    assert [record["ErrorCode__c"] for record in remaining["records"]] == ["5", "6"]
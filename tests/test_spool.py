@@ -0,0 +1,168 @@
+import os
+
+from simple_salesforce.exceptions import (
+    SalesforceMalformedRequest,
+    SalesforceRefusedRequest,
+)
+
+import pytest
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+from kicksaw_integration_app_client.checkpoints import LocalCheckpointStore
+from kicksaw_integration_app_client.spool import ErrorSpool
+
+from simple_mockforce import mock_salesforce
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+
+def _limit_exceeded():
+    return SalesforceRefusedRequest(
+        "url",
+        403,
+        "IntegrationError__c",
+        [
+            {
+                "errorCode": "REQUEST_LIMIT_EXCEEDED",
+                "message": "TotalRequests Limit exceeded.",
+            }
+        ],
+    )
+
+
+class FlakyPush:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.pushed = list()
+
+    def __call__(self, error_objects):
+        if self.failures and self.failures.pop(0):
+            raise _limit_exceeded()
+        self.pushed.append([error["id"] for error in error_objects])
+
+
+def test_drain_retries_and_coalesces_segments(tmp_path):
+    spool = ErrorSpool(str(tmp_path), max_attempts=3, backoff=0)
+    spool.append("execution", [{"id": 1}, {"id": 2}])
+    spool.append("execution", [{"id": 3}])
+
+    push = FlakyPush([True, True])
+    assert spool.drain("execution", push, 10, 1000) == 3
+    assert push.pushed == [[1, 2, 3]]
+    assert not os.path.exists(tmp_path / "execution")
+
+
+def test_drain_resumes_where_it_stopped(tmp_path):
+    spool = ErrorSpool(str(tmp_path), max_attempts=2, backoff=0)
+    spool.append("execution", [{"id": 1}, {"id": 2}, {"id": 3}])
+    spool.append("execution", [{"id": 4}])
+
+    # the first chunk goes through, the second one runs out of attempts
+    push = FlakyPush([False, True, True])
+    assert spool.drain("execution", push, 2, 1000) == 2
+    assert push.pushed == [[1, 2]]
+
+    # e.g. the retry of the step, with a spool of its own
+    push = FlakyPush([])
+    assert ErrorSpool(str(tmp_path)).drain("execution", push, 2, 1000) == 2
+    assert push.pushed == [[3, 4]]
+
+    # other errors aren't retried, and nothing is lost
+    spool.append("execution", [{"id": 5}])
+
+    def malformed(error_objects):
+        raise SalesforceMalformedRequest("url", 400, "IntegrationError__c", "")
+
+    with pytest.raises(SalesforceMalformedRequest):
+        spool.drain("execution", malformed, 2, 1000)
+    assert spool.segments("execution") == ["00000000.jsonl.gz"]
+
+
+@mock_salesforce(fresh=True)
+def test_errors_survive_a_throttled_push(monkeypatch, tmp_path):
+    KicksawSalesforce.NAMESPACE = ""
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    salesforce.enable_error_spool(str(tmp_path), max_attempts=2, backoff=0)
+
+    insert_error_chunk = KicksawSalesforce._insert_error_chunk
+
+    def throttled(self, error_objects):
+        raise _limit_exceeded()
+
+    monkeypatch.setattr(KicksawSalesforce, "_insert_error_chunk", throttled)
+    data = [
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        # note, this is a duplicate id, so this and the first row will fail
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+    ]
+    # the bulk operation itself still succeeds
+    response = salesforce.bulk.CustomObject__c.upsert(data, "UpsertKey__c")
+    assert [result["success"] for result in response] == [False, False, True]
+    assert salesforce._error_spool.segments(salesforce.execution_object_id)
+
+    monkeypatch.setattr(KicksawSalesforce, "_insert_error_chunk", insert_error_chunk)
+    salesforce.complete_execution()
+
+    errors = salesforce.query(
+        f"Select UpsertKeyValue__c From {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}"
+    )["records"]
+    assert [error["UpsertKeyValue__c"] for error in errors] == ["1a2b3c", "1a2b3c"]
+    assert not salesforce._error_spool.segments(salesforce.execution_object_id)
+
+
+@mock_salesforce(fresh=True)
+@pytest.mark.parametrize("same_container", [True, False])
+def test_spooled_error_chunks_only_count_once_drained(
+    monkeypatch, tmp_path, same_container
+):
+    KicksawSalesforce.NAMESPACE = ""
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    store = LocalCheckpointStore(str(tmp_path / "checkpoints"))
+    data = [
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        # note, this is a duplicate id, so this and the first row will fail
+        {"UpsertKey__c": "1a2b3c", "Name": "Name 1"},
+        {"UpsertKey__c": "xyz123", "Name": "Name 2"},
+    ]
+
+    def run_step(salesforce, spool_directory):
+        salesforce.enable_error_spool(str(spool_directory), max_attempts=1, backoff=0)
+        salesforce.enable_bulk_checkpoints(store)
+        salesforce.bulk.CustomObject__c.upsert(data, "UpsertKey__c")
+        (checkpoint,) = store.load(salesforce.execution_object_id).values()
+        return checkpoint.get("error_chunks", 0)
+
+    insert_error_chunk = KicksawSalesforce._insert_error_chunk
+
+    def throttled(self, error_objects):
+        raise _limit_exceeded()
+
+    monkeypatch.setattr(KicksawSalesforce, "_insert_error_chunk", throttled)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+    assert run_step(salesforce, tmp_path / "a") == 0
+
+    # the retry of the step, on the same Lambda container or another one
+    monkeypatch.setattr(KicksawSalesforce, "_insert_error_chunk", insert_error_chunk)
+    retry = KicksawSalesforce.instantiate_from_id(
+        CONNECTION_OBJECT, salesforce.execution_object_id
+    )
+    assert run_step(retry, tmp_path / ("a" if same_container else "b")) == 1
+
+    errors = retry.query(
+        f"Select UpsertKeyValue__c From {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}"
+    )["records"]
+    assert [error["UpsertKeyValue__c"] for error in errors] == ["1a2b3c", "1a2b3c"]
+    assert not retry._error_spool.segments(retry.execution_object_id)
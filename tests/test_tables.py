@@ -0,0 +1,126 @@
+import datetime
+import json
+
+import pytest
+
+from kicksaw_integration_utils import SalesforceClient
+from kicksaw_integration_app_client import KicksawSalesforce
+from kicksaw_integration_app_client.tables import TableRecords, as_records
+
+from simple_mockforce import mock_salesforce
+
+from tests.mock_endpoints import mock_batch_list_endpoint, mock_bulk2_endpoints
+
+pandas = pytest.importorskip("pandas")
+pyarrow = pytest.importorskip("pyarrow")
+
+INTEGRATION_NAME = "example-integration"
+LAMBDA_NAME = "example-lambda"
+
+CONNECTION_OBJECT = {
+    "username": "fake",
+    "password": "fake",
+    "security_token": "fake",
+    "domain": "fake",
+}
+
+COLUMNS = {
+    # note, the first two ids are duplicates, so these rows will fail
+    "UpsertKey__c": ["1a2b3c", "1a2b3c", "xyz123", "abc789"],
+    "Amount__c": [1.5, float("nan"), 3.0, None],
+    "Date__c": [datetime.date(2024, 1, 31), None, None, datetime.date(2024, 2, 1)],
+}
+
+
+def _query_errors(salesforce):
+    return salesforce.query(
+        f"""
+        Select
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.UPSERT_KEY_VALUE},
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}
+        From
+            {KicksawSalesforce.NAMESPACE}{KicksawSalesforce.ERROR}
+        """
+    )["records"]
+
+
+@pytest.mark.parametrize(
+    "table",
+    [
+        lambda: pandas.DataFrame(COLUMNS),
+        lambda: pyarrow.table(COLUMNS),
+        lambda: pyarrow.RecordBatch.from_pydict(COLUMNS),
+    ],
+)
+def test_table_records_read_like_a_list_of_dicts(table, monkeypatch):
+    monkeypatch.setattr("kicksaw_integration_app_client.tables.CHUNK_ROWS", 3)
+    records = as_records(table())
+
+    assert isinstance(records, TableRecords)
+    assert len(records) == 4
+    assert list(records) == [
+        {"UpsertKey__c": "1a2b3c", "Amount__c": 1.5, "Date__c": "2024-01-31"},
+        {"UpsertKey__c": "1a2b3c", "Amount__c": None, "Date__c": None},
+        {"UpsertKey__c": "xyz123", "Amount__c": 3.0, "Date__c": None},
+        {"UpsertKey__c": "abc789", "Amount__c": None, "Date__c": "2024-02-01"},
+    ]
+    assert list(records[1:3]) == list(records)[1:3]
+    assert records[-1]["UpsertKey__c"] == "abc789"
+    assert [record["UpsertKey__c"] for record in records.take([3, 0])] == [
+        "abc789",
+        "1a2b3c",
+    ]
+    assert list(records.iter_tuples())[2] == ("xyz123", 3.0, None)
+
+
+@mock_salesforce(fresh=True)
+def test_bulk_upsert_of_a_dataframe():
+    mock_batch_list_endpoint()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    response = salesforce.bulk.CustomObject__c.upsert(
+        pandas.DataFrame(COLUMNS), "UpsertKey__c", batch_size=2
+    )
+    assert [result["success"] for result in response] == [False, False, True, True]
+
+    errors = _query_errors(salesforce)
+    assert len(errors) == 2
+    payloads = [
+        json.loads(
+            error[f"{KicksawSalesforce.NAMESPACE}{KicksawSalesforce.OBJECT_PAYLOAD}"]
+        )
+        for error in errors
+    ]
+    assert payloads == [
+        {"UpsertKey__c": "1a2b3c", "Amount__c": 1.5, "Date__c": "2024-01-31"},
+        {"UpsertKey__c": "1a2b3c", "Amount__c": None, "Date__c": None},
+    ]
+
+
+@mock_salesforce(fresh=True)
+def test_bulk2_upsert_of_an_arrow_table():
+    mock_bulk2_endpoints()
+    KicksawSalesforce.NAMESPACE = ""
+
+    _salesforce = SalesforceClient(**CONNECTION_OBJECT)
+    KicksawSalesforce.create_integration(_salesforce, INTEGRATION_NAME, LAMBDA_NAME)
+    salesforce = KicksawSalesforce(CONNECTION_OBJECT, INTEGRATION_NAME, {})
+
+    bulk_type = salesforce.bulk2.CustomObject__c
+    (payload,) = bulk_type._csv_payloads(as_records(pyarrow.table(COLUMNS)))
+    assert payload.decode("utf-8").splitlines() == [
+        "UpsertKey__c,Amount__c,Date__c",
+        "1a2b3c,1.5,2024-01-31",
+        "1a2b3c,#N/A,#N/A",
+        "xyz123,3.0,#N/A",
+        "abc789,#N/A,2024-02-01",
+    ]
+
+    jobs = bulk_type.upsert(pyarrow.table(COLUMNS), "UpsertKey__c", wait=0)
+    assert jobs[0]["numberRecordsProcessed"] == 4
+    assert jobs[0]["numberRecordsFailed"] == 2
+    assert len(_query_errors(salesforce)) == 2